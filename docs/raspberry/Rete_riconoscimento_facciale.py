@@ -1,9 +1,15 @@
 import cv2
 import mediapipe as mp
 import numpy as np
-import pyautogui
 import time
 import sys
+import os
+
+# Backend del puntatore condivisi con i controller in src/mouse_facciale/v2
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'mouse_facciale', 'v2'))
+from pointer_backends import best_available_backend
+
+DEFAULT_SCREEN_SIZE = (1920, 1080) # Se il backend non conosce lo schermo
 
 class HeadMouseController:
     def __init__(self):
@@ -15,10 +21,10 @@ class HeadMouseController:
             min_tracking_confidence=0.8
         )
 
-        pyautogui.FAILSAFE = False
-        pyautogui.PAUSE = 0.001
-
-        self.screen_w, self.screen_h = pyautogui.size()
+        # Il cursore segue la posizione del naso: serve il posizionamento assoluto
+        self.pointer = best_available_backend(require_absolute=True)
+        print(f"[SYSTEM] Backend puntatore: {self.pointer.name}")
+        self.screen_w, self.screen_h = self.pointer.screen_size() or DEFAULT_SCREEN_SIZE
         self.screen_center = np.array([self.screen_w // 2, self.screen_h // 2], dtype=np.float64)
 
         self.pos_filter = self.screen_center.copy()
@@ -166,17 +172,18 @@ class HeadMouseController:
         is_mouth_open = self._is_mouth_open(self.mouth_history)
 
         if is_left_blinking and not is_right_blinking and (current_time - self.last_left_click_time > self.CLICK_COOLDOWN):
-            pyautogui.click()
+            self.pointer.click('left')
             self.last_left_click_time = current_time
             print("[ACTION] Left click")
 
         elif is_right_blinking and not is_left_blinking and (current_time - self.last_right_click_time > self.CLICK_COOLDOWN):
-            pyautogui.click(button='right')
+            self.pointer.click('right')
             self.last_right_click_time = current_time
             print("[ACTION] Right click")
 
         elif is_mouth_open and (current_time - self.last_double_click_time > self.CLICK_COOLDOWN):
-            pyautogui.doubleClick()
+            self.pointer.click('left')
+            self.pointer.click('left')
             self.last_double_click_time = current_time
             print("[ACTION] Double click")
 
@@ -259,7 +266,7 @@ def main():
 
                     target_pos = np.array([norm_x, norm_y], dtype=np.float64)
                     smooth_pos = controller.smooth_movement(target_pos)
-                    pyautogui.moveTo(smooth_pos[0], smooth_pos[1])
+                    controller.pointer.move_to(int(smooth_pos[0]), int(smooth_pos[1]))
                     controller.prev_pos = smooth_pos
 
                 left_ear = controller._get_ear(landmarks_np, controller.LEFT_EYE_POINTS)
@@ -280,6 +287,7 @@ def main():
     finally:
         cap.release()
         cv2.destroyAllWindows()
+        controller.pointer.close()
         print("[SYSTEM] Disattivazione completata.")
 
 if __name__ == "__main__":
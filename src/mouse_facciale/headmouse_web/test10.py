@@ -1,12 +1,18 @@
 import cv2
 import mediapipe as mp
 import numpy as np
-import pyautogui
 import time
 import sys
+import os
 from collections import deque
 import threading
 
+# I backend del puntatore sono condivisi con i controller v2
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'v2'))
+from pointer_backends import best_available_backend
+
+DEFAULT_SCREEN_SIZE = (1920, 1080) # Se il backend non conosce lo schermo
+
 
 class BaseEvent:
     """Classe base per tutti gli eventi"""
@@ -227,14 +233,15 @@ class SwitchMode_action(BaseAction):
 
 class MouseCursor_action(BaseAction):
     """Classe per tradurre il movimento del naso in movimento del cursore"""
-    def __init__(self, screen_w, screen_h):
+    def __init__(self, pointer, screen_w, screen_h):
+        self.pointer = pointer # Backend del puntatore con posizionamento assoluto
         self.screen_w = screen_w
         self.screen_h = screen_h
         self.current_mouse_pos = np.array([screen_w // 2, screen_h // 2], dtype=float)
         self.position_history = deque(maxlen=5) # Usato per lo smoothing del movimento
         self.mouse_lock = threading.Lock() # Lock per thread safety
         self.base_sensitivity = 4.0
-        pyautogui.moveTo(self.current_mouse_pos[0], self.current_mouse_pos[1])
+        self.pointer.move_to(int(self.current_mouse_pos[0]), int(self.current_mouse_pos[1]))
 
     def update_position(self, direction, acceleration_factor, effective_distance):
         """Aggiorna la posizione del cursore"""
@@ -262,7 +269,7 @@ class MouseCursor_action(BaseAction):
 
             # Muovi il mouse
             try:
-                pyautogui.moveTo(int(self.current_mouse_pos[0]), int(self.current_mouse_pos[1]))
+                self.pointer.move_to(int(self.current_mouse_pos[0]), int(self.current_mouse_pos[1]))
             except Exception as e:
                 print(f"Errore movimento: {e}")
 
@@ -270,22 +277,21 @@ class MouseCursor_action(BaseAction):
         """Blocca la posizione corrente del cursore"""
         with self.mouse_lock:
             # Sincronizza la posizione interna con quella reale del sistema
-            system_pos = pyautogui.position()
-            self.current_mouse_pos = np.array([system_pos.x, system_pos.y], dtype=float)
+            system_pos = self.pointer.position()
+            if system_pos is not None: # Backend che non conoscono la posizione: resta quella interna
+                self.current_mouse_pos = np.array(system_pos, dtype=float)
 
     def set_position(self, new_position):
         """Imposta direttamente una nuova posizione"""
         with self.mouse_lock:
             self.current_mouse_pos = new_position.copy()
-            # Use ctypes to set the cursor position
-            import ctypes
-            ctypes.windll.user32.SetCursorPos(int(new_position[0]), int(new_position[1]))
+            self.pointer.move_to(int(new_position[0]), int(new_position[1]))
 
     def enforce_position(self):
         """Mantiene forzatamente la posizione corrente"""
         with self.mouse_lock:
             try:
-                pyautogui.moveTo(int(self.current_mouse_pos[0]), int(self.current_mouse_pos[1]))
+                self.pointer.move_to(int(self.current_mouse_pos[0]), int(self.current_mouse_pos[1]))
             except Exception as e:
                 print(f"Errore enforcement posizione: {e}")
 
@@ -306,7 +312,8 @@ class MouseCursor_action(BaseAction):
 
 class Scroll_action(BaseAction):
     """Classe per eseguire lo scrolling"""
-    def __init__(self, scroll_cooldown=0.03):
+    def __init__(self, pointer, scroll_cooldown=0.03):
+        self.pointer = pointer
         self.scroll_cooldown = scroll_cooldown
         self.last_scroll_time = 0
         self.scroll_lock = threading.Lock()
@@ -329,7 +336,7 @@ class Scroll_action(BaseAction):
                 # Scrolling verticale con controllo più preciso
                 scroll_value = int(smoothed_scroll)
                 if abs(scroll_value) > 0:  # Solo se c'è movimento significativo
-                    pyautogui.scroll(scroll_value)
+                    self.pointer.scroll(scroll_value)
                     self.last_scroll_time = current_time
                     return True
         except Exception as e:
@@ -410,7 +417,8 @@ class LeftEye_event(BaseEvent):
 
 class LeftClick_action(BaseAction):
     """Classe per eseguire click sinistro"""
-    def __init__(self, click_cooldown=0.5):
+    def __init__(self, pointer, click_cooldown=0.5):
+        self.pointer = pointer
         self.click_cooldown = click_cooldown
         self.last_click_time = 0
         self.mouse_lock = threading.Lock()
@@ -425,7 +433,8 @@ class LeftClick_action(BaseAction):
             with self.mouse_lock:
                 x, y = int(mouse_position[0]), int(mouse_position[1])
             
-            pyautogui.click(x=x, y=y, button='left')
+            self.pointer.move_to(x, y)
+            self.pointer.click('left')
             print(f"Click SINISTRO: ({x}, {y})")
             self.last_click_time = current_time
             return True
@@ -502,7 +511,8 @@ class RightEye_event(BaseEvent):
 
 class RightClick_action(BaseAction):
     """Classe per eseguire click destro"""
-    def __init__(self, click_cooldown=0.5):
+    def __init__(self, pointer, click_cooldown=0.5):
+        self.pointer = pointer
         self.click_cooldown = click_cooldown
         self.last_click_time = 0
         self.mouse_lock = threading.Lock()
@@ -517,7 +527,8 @@ class RightClick_action(BaseAction):
             with self.mouse_lock:
                 x, y = int(mouse_position[0]), int(mouse_position[1])
             
-            pyautogui.click(x=x, y=y, button='right')
+            self.pointer.move_to(x, y)
+            self.pointer.click('right')
             print(f"Click DESTRO: ({x}, {y})")
             self.last_click_time = current_time
             return True
@@ -530,7 +541,7 @@ class RightClick_action(BaseAction):
         return self.perform_click(mouse_position)
 
 class HeadMouseController:
-    def __init__(self, show_window=True):
+    def __init__(self, show_window=True, pointer=None):
         # MediaPipe setup
         self.mp_face_mesh = mp.solutions.face_mesh
         self.face_mesh = self.mp_face_mesh.FaceMesh(
@@ -540,10 +551,10 @@ class HeadMouseController:
             min_tracking_confidence=0.8
         )
 
-        # PyAutoGUI setup
-        pyautogui.FAILSAFE = False
-        pyautogui.PAUSE = 0.001
-        self.screen_w, self.screen_h = pyautogui.size()
+        # Uscita verso il puntatore: serve il posizionamento assoluto (niente uinput)
+        self.pointer = pointer if pointer is not None else best_available_backend(require_absolute=True)
+        print(f"Backend puntatore: {self.pointer.name}")
+        self.screen_w, self.screen_h = self.pointer.screen_size() or DEFAULT_SCREEN_SIZE
         
         # Landmark indices
         self.NOSE_TIP = 4
@@ -553,8 +564,8 @@ class HeadMouseController:
         # Inizializzazione delle classi
         self.calibration = Calibration_action()
         self.nose_joystick = NoseJoystick_event()
-        self.mouse_cursor = MouseCursor_action(self.screen_w, self.screen_h)
-        self.scroll_action = Scroll_action()
+        self.mouse_cursor = MouseCursor_action(self.pointer, self.screen_w, self.screen_h)
+        self.scroll_action = Scroll_action(self.pointer)
         self.open_mouth_event = OpenMouth_event(self.UPPER_LIP, self.LOWER_LIP)
         self.switch_mode_action = SwitchMode_action()
         
@@ -673,18 +684,23 @@ class HeadMouseController:
                         self.mouse_cursor.position_history.clear()
                         # Forza l'aggiornamento della posizione
                         try:
-                            pyautogui.moveTo(int(self.mouse_cursor.current_mouse_pos[0]), 
-                                        int(self.mouse_cursor.current_mouse_pos[1]))
+                            self.pointer.move_to(int(self.mouse_cursor.current_mouse_pos[0]),
+                                                 int(self.mouse_cursor.current_mouse_pos[1]))
                         except Exception as e:
                             print(f"Errore movimento: {e}")
 
         # Processa eventi specifici per modalità
         if self.current_mode == 'pointer':
             # Eventi di click solo in modalità puntatore
+            # Ogni evento viene valutato una sola volta per frame anche se ha più azioni
+            fired = {}
             for mapping in self.event_action_mappings:
-                if isinstance(mapping['event'], (LeftEye_event, RightEye_event)):
-                    event_args = mapping['event_args_mapper'](tracking_point, landmarks, current_mouse_pos)
-                    if mapping['event'].check_event(*event_args):
+                event = mapping['event']
+                if isinstance(event, (LeftEye_event, RightEye_event)):
+                    if id(event) not in fired:
+                        event_args = mapping['event_args_mapper'](tracking_point, landmarks, current_mouse_pos)
+                        fired[id(event)] = event.check_event(*event_args)
+                    if fired[id(event)]:
                         action_args = mapping['action_args_mapper'](tracking_point, landmarks, current_mouse_pos)
                         mapping['action'].execute(*action_args)
         elif self.current_mode == 'scroll':
@@ -806,14 +822,14 @@ def main():
     # Aggiungi mappature solo per la modalità puntatore (click)
     controller.add_event_action_mapping(
         event=LeftEye_event(),
-        action=LeftClick_action(),
+        action=LeftClick_action(controller.pointer),
         event_args_mapper=lambda tp, lm, mp: (lm,),
         action_args_mapper=lambda tp, lm, mp: (mp,)
     )
     
     controller.add_event_action_mapping(
         event=RightEye_event(),
-        action=RightClick_action(),
+        action=RightClick_action(controller.pointer),
         event_args_mapper=lambda tp, lm, mp: (lm,),
         action_args_mapper=lambda tp, lm, mp: (mp,)
     )
@@ -896,6 +912,7 @@ def main():
     finally:
         cap.release()
         cv2.destroyAllWindows()
+        controller.pointer.close()
         print("Controller chiuso")
 
 
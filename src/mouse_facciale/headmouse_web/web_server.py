@@ -4,88 +4,171 @@ import numpy as np
 import threading
 import time
 import json
+import os
+import sys
 from test10 import HeadMouseController, LeftEye_event, RightEye_event, LeftClick_action, RightClick_action, SwitchMode_action, OpenMouth_event
 
+# Shared pipeline modules live next to the v2 controllers
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'v2'))
+from landmarks import LandmarkAdapter
+from face_roi import FaceRoiTracker
+from profiler import StageProfiler
+from frame_broadcaster import FrameBroadcaster
+from preview_encoder import PreviewEncoder
+from status_channel import StatusChannel
+from command_queue import CommandQueue
+from async_server import AsyncWebApp, AsyncFanout, mjpeg_stream, sse_stream, run as run_async
+
+# Per-stage timings (set HEADMOUSE_PROFILE=1); when off no profiler exists and nothing is timed
+WEB_STAGES = ('capture', 'preprocess', 'facemesh', 'landmarks', 'actions', 'events', 'encode')
+PROFILE_STAGES = os.environ.get('HEADMOUSE_PROFILE') == '1'
+# FaceMesh only on the region around the last face (HEADMOUSE_FACE_ROI=0 to always use the full frame)
+FACE_ROI = os.environ.get('HEADMOUSE_FACE_ROI', '1') != '0'
+
 app = Flask(__name__)
 
 class WebHeadMouseController(HeadMouseController):
     def __init__(self):
         super().__init__(show_window=False)
+        self.profiler = StageProfiler(stages=WEB_STAGES) if PROFILE_STAGES else None
+        self.roi_tracker = FaceRoiTracker(enabled=FACE_ROI)
         
-        # Web-specific attributes
-        self.current_status = {
+        # Web-specific attributes: status is pushed to the page over SSE (/events) on change
+        self.status_channel = StatusChannel({
             'mode': self.current_mode,
             'paused': self.paused,
             'calibrated': False,
             'calibration_progress': 0,
             'sensitivity': self.mouse_cursor.base_sensitivity,
             'scroll_sensitivity': self.scroll_action.scroll_sensitivity,
-            'face_detected': False
-        }
+            'face_detected': False,
+            'fps': 0
+        })
+        self.last_frame_time = None
+        self.fps = 0.0
         
         # Setup event mappings
         self.setup_event_mappings()
+
+        # Convert only the landmarks used by the nose, mouth and mapped eye events
+        landmark_indices = [self.NOSE_TIP, self.UPPER_LIP, self.LOWER_LIP]
+        for mapping in self.event_action_mappings:
+            event = mapping['event']
+            if isinstance(event, LeftEye_event):
+                landmark_indices += [event.LEFT_EYE_TOP, event.LEFT_EYE_BOTTOM]
+            elif isinstance(event, RightEye_event):
+                landmark_indices += [event.RIGHT_EYE_TOP, event.RIGHT_EYE_BOTTOM]
+        # Frames are not flipped before FaceMesh: the mirror is applied to the landmarks
+        self.landmark_adapter = LandmarkAdapter(landmark_indices, mirror=True)
     
     def setup_event_mappings(self):
         """Setup event mappings like in the original main function"""
         # Click events for pointer mode
         self.add_event_action_mapping(
             event=LeftEye_event(),
-            action=LeftClick_action(),
+            action=LeftClick_action(self.pointer),
             event_args_mapper=lambda tp, lm, mp: (lm,),
             action_args_mapper=lambda tp, lm, mp: (mp,)
         )
         
         self.add_event_action_mapping(
             event=RightEye_event(),
-            action=RightClick_action(),
+            action=RightClick_action(self.pointer),
             event_args_mapper=lambda tp, lm, mp: (lm,),
             action_args_mapper=lambda tp, lm, mp: (mp,)
         )
     
-    def process_frame(self, frame):
-        """Process frame and return it with all visual elements"""
-        frame = cv2.flip(frame, 1)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(rgb_frame)
+    def process_frame(self, frame, render=True):
+        """Process frame; with render, return it mirrored with all visual elements"""
+        profiler = self.profiler
+        if profiler is not None:
+            start = profiler.start()
+        # RGB conversion (into a reused buffer) and FaceMesh, on the face region only when enabled
+        results = self.roi_tracker.process(self.face_mesh, frame)
+        if profiler is not None:
+            profiler.record('facemesh', start)
+            start = profiler.start()
+        frame_w = frame.shape[1]
+        if render:
+            # Only the preview is mirrored, the landmarks already are
+            frame = cv2.flip(frame, 1)
+        if profiler is not None:
+            profiler.record('preprocess', start)
 
         face_detected = False
         if results.multi_face_landmarks:
-            h, w = frame.shape[:2]
-            landmarks_np = np.array(
-                [[lm.x * w, lm.y * h] for lm in results.multi_face_landmarks[0].landmark],
-                dtype=np.float64
-            )
+            if profiler is not None:
+                start = profiler.start()
+            x0, y0, region_w, region_h = self.roi_tracker.region
+            landmarks_np = self.landmark_adapter.update(results.multi_face_landmarks[0], region_w, region_h, (x0, y0), frame_w)
             tracking_point = landmarks_np[self.NOSE_TIP]
             face_detected = True
+            if profiler is not None:
+                profiler.record('landmarks', start)
 
             # Update status
             self.update_status(tracking_point)
 
             if not self.paused:
-                self.process_nose_movement(tracking_point)
-                self.process_events(tracking_point, landmarks_np)
+                if profiler is None:
+                    self.process_nose_movement(tracking_point)
+                    self.process_events(tracking_point, landmarks_np)
+                else:
+                    start = profiler.start()
+                    self.process_nose_movement(tracking_point)
+                    profiler.record('actions', start)
+                    start = profiler.start()
+                    self.process_events(tracking_point, landmarks_np)
+                    profiler.record('events', start)
 
             # Draw minimal interface for web
-            self.draw_minimal_interface(frame, tracking_point, landmarks_np)
+            if render:
+                self.draw_minimal_interface(frame, tracking_point, landmarks_np)
         else:
             # Update status for no face detected
             self.update_status(None)
 
         return frame
     
+    def draw_minimal_interface(self, frame, tracking_point, landmarks=None):
+        """Preview overlay: tracking point and deadzone only, status is shown by the page"""
+        point = tuple(tracking_point.astype(int))
+        if not self.calibration.center_calculated:
+            cv2.circle(frame, point, 15, (0, 165, 255), 3)
+            return
+
+        color = (128, 128, 128) if self.paused else (0, 255, 0)
+        cv2.circle(frame, point, 8, color, -1)
+        if self.calibration.center_position is not None:
+            center_pt = tuple(self.calibration.center_position.astype(int))
+            cv2.circle(frame, center_pt, int(self.nose_joystick.deadzone_radius), (255, 255, 0), 2)
+            if not self.paused and self.nose_joystick.is_outside_deadzone(tracking_point, self.calibration.center_position):
+                cv2.arrowedLine(frame, center_pt, point, (0, 255, 255), 3)
+
+    @property
+    def current_status(self):
+        return self.status_channel.snapshot()
+
     def update_status(self, tracking_point):
-        """Update current status for web interface"""
-        face_detected = tracking_point is not None
-        self.current_status.update({
-            'mode': self.current_mode,
-            'paused': self.paused,
-            'calibrated': self.calibration.center_calculated,
-            'calibration_progress': int((len(self.calibration.center_samples) / self.calibration.max_center_samples * 100),
-            'sensitivity': self.mouse_cursor.base_sensitivity,
-            'scroll_sensitivity': self.scroll_action.scroll_sensitivity,
-            'face_detected': face_detected
-        })
+        """Update current status for web interface (clients are notified only on change)"""
+        now = time.monotonic()
+        if self.last_frame_time is not None and now > self.last_frame_time:
+            # Smoothed FPS, rounded so that it does not trigger an update on every frame
+            self.fps = 0.9 * self.fps + 0.1 / (now - self.last_frame_time)
+        self.last_frame_time = now
+
+        self.status_channel.update(
+            mode=self.current_mode,
+            paused=self.paused,
+            calibrated=self.calibration.center_calculated,
+            calibration_progress=int(len(self.calibration.center_samples) / self.calibration.max_center_samples * 100),
+            sensitivity=self.mouse_cursor.base_sensitivity,
+            scroll_sensitivity=self.scroll_action.scroll_sensitivity,
+            face_detected=tracking_point is not None,
+            fps=round(self.fps)
+        )
+        if self.profiler is not None:
+            self.status_channel.update(timings=self.profiler.get_cached_summary())
 
 # Initialize controller
 controller = WebHeadMouseController()
@@ -101,31 +184,63 @@ cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
 cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
 cap.set(cv2.CAP_PROP_FPS, 30)
 
-def generate_frames():
-    """Generate frames for video streaming"""
+# Every frame is processed and encoded once, then fanned out to all /video clients
+broadcaster = FrameBroadcaster()
+# Preview size/quality/rate are independent of tracking (tune for the Pi via env vars)
+preview_encoder = PreviewEncoder(
+    scale=float(os.environ.get('HEADMOUSE_PREVIEW_SCALE', 0.5)),
+    quality=int(os.environ.get('HEADMOUSE_PREVIEW_QUALITY', 70)),
+    max_fps=float(os.environ.get('HEADMOUSE_PREVIEW_FPS', 15))
+)
+
+def vision_loop():
+    """Single producer: reads the webcam, drives the controller and publishes the JPEG"""
+    profiler = controller.profiler
     while True:
+        if profiler is not None:
+            start = profiler.start()
         success, frame = cap.read()
         if not success:
             print("Error: Could not read frame from camera")
-            break
+            time.sleep(0.1)
+            continue
+        if profiler is not None:
+            profiler.record('capture', start)
 
         try:
-            # Process frame with minimal visual elements
-            processed_frame = controller.process_frame(frame)
+            # Web commands are applied here, between two frames
+            command_queue.apply_pending()
+
+            # Process frame; the preview is only flipped and drawn when it will be encoded
+            # (skipped when nobody watches or above the preview rate)
+            render = preview_encoder.is_due(broadcaster.has_clients())
+            processed_frame = controller.process_frame(frame, render)
 
             # Encode as JPEG
-            ret, buffer = cv2.imencode('.jpg', processed_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            if not ret:
-                continue
-            frame_bytes = buffer.tobytes()
-
-            # Yield frame for streaming
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+            if profiler is not None:
+                start = profiler.start()
+            jpeg_bytes = preview_encoder.encode(processed_frame, render)
+            if profiler is not None:
+                if jpeg_bytes is not None:
+                    profiler.record('encode', start)
+                profiler.frame_done()
+
+            if jpeg_bytes is not None:
+                broadcaster.publish(jpeg_bytes)
         except Exception as e:
             print(f"Error processing frame: {e}")
             continue
 
+def start_vision_thread():
+    vision_thread = threading.Thread(target=vision_loop)
+    vision_thread.daemon = True
+    vision_thread.start()
+    return vision_thread
+
+def generate_frames():
+    """Generate frames for video streaming (the latest shared frame, never re-encoded)"""
+    return broadcaster.stream()
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -140,37 +255,95 @@ def status():
     """Return current status as JSON"""
     return jsonify(controller.current_status)
 
-@app.route('/toggle_pause')
-def toggle_pause():
-    """Toggle pause state"""
+@app.route('/events')
+def events():
+    """Push status changes to the page (Server-Sent Events)"""
+    return Response(controller.status_channel.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Controller state is changed only by the vision loop: handlers enqueue commands that
+# are applied between two frames, so requests never contend with the hot path
+COMMAND_WAIT = 0.5  # seconds a request waits for its command before answering 202
+
+def apply_toggle_pause():
     controller.toggle_pause()
-    return jsonify({'paused': controller.paused})
+    return {'paused': controller.paused}
 
-@app.route('/adjust_sensitivity/<direction>')
-def adjust_sensitivity(direction):
-    """Adjust sensitivity up or down"""
+def apply_adjust_sensitivity(direction):
     amount = 0.2 if direction == 'up' else -0.2
     if controller.current_mode == 'pointer':
         controller.mouse_cursor.adjust_sensitivity(amount)
     else:
         controller.scroll_action.adjust_sensitivity(amount * 2.5)  # Larger increments for scroll
-    
-    return jsonify(controller.current_status)
+    return {'sensitivity': controller.mouse_cursor.base_sensitivity,
+            'scroll_sensitivity': controller.scroll_action.scroll_sensitivity}
 
-@app.route('/reset_calibration')
-def reset_calibration():
-    """Reset calibration"""
+def apply_reset_calibration():
     controller.calibration.reset_calibration()
+    controller.roi_tracker.reset()
     controller.nose_joystick.reset_outside_timer()
     controller.reset_mouse_position()
-    return jsonify({'success': True})
+    return {'success': True}
+
+def apply_force_mode_switch():
+    old_mode = controller.current_mode
+    controller.current_mode = 'scroll' if old_mode == 'pointer' else 'pointer'
+    return {'old_mode': old_mode, 'new_mode': controller.current_mode}
+
+command_queue = CommandQueue({
+    'toggle_pause': apply_toggle_pause,
+    'adjust_sensitivity': apply_adjust_sensitivity,
+    'reset_calibration': apply_reset_calibration,
+    'force_mode_switch': apply_force_mode_switch,
+})
+
+def run_command(name, *args):
+    """Enqueue a command; answer with its result, or 202 + command id if not applied yet"""
+    command = command_queue.submit(name, *args)
+    if command.wait(COMMAND_WAIT):
+        if command.error is not None:
+            return jsonify(command.to_dict()), 500
+        return jsonify(command.result)
+    return jsonify(command.to_dict()), 202
+
+@app.route('/command/<int:command_id>')
+def command_status(command_id):
+    """Acknowledgement of a previously enqueued command"""
+    command = command_queue.get(command_id)
+    if command is None:
+        return jsonify({'command_id': command_id, 'status': 'unknown'}), 404
+    return jsonify(command.to_dict())
+
+@app.route('/toggle_pause')
+def toggle_pause():
+    """Toggle pause state"""
+    return run_command('toggle_pause')
+
+@app.route('/adjust_sensitivity/<direction>')
+def adjust_sensitivity(direction):
+    """Adjust sensitivity up or down"""
+    return run_command('adjust_sensitivity', direction)
+
+@app.route('/reset_calibration')
+def reset_calibration():
+    """Reset calibration"""
+    return run_command('reset_calibration')
 
 @app.route('/force_mode_switch')
 def force_mode_switch():
     """Force mode switch for testing"""
-    old_mode = controller.current_mode
-    controller.current_mode = 'scroll' if old_mode == 'pointer' else 'pointer'
-    return jsonify({'old_mode': old_mode, 'new_mode': controller.current_mode})
+    return run_command('force_mode_switch')
+
+def create_asgi_app():
+    """Same routes on asyncio: /video and /events as async tasks, the rest via the Flask views"""
+    asgi_app = AsyncWebApp(app)
+    frame_fanout = AsyncFanout()
+    broadcaster.add_listener(frame_fanout)
+    status_fanout = AsyncFanout(controller.current_status)
+    controller.status_channel.add_listener(status_fanout)
+    asgi_app.add_stream('/video', mjpeg_stream, 'multipart/x-mixed-replace; boundary=frame', frame_fanout)
+    asgi_app.add_stream('/events', sse_stream, 'text/event-stream', status_fanout)
+    return asgi_app
 
 if __name__ == '__main__':
     try:
@@ -178,10 +351,17 @@ if __name__ == '__main__':
         print("📹 Webcam initialized")
         print("🎮 Controller ready")
         print("🔗 Access at: http://localhost:5000")
-        
-        app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
+        start_vision_thread()
+
+        if '--async' in sys.argv:
+            print("⚡ Async (ASGI) mode")
+            run_async(create_asgi_app(), host='0.0.0.0', port=5000)
+        else:
+            app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
     except KeyboardInterrupt:
         print("\n🛑 Shutting down server...")
     finally:
+        broadcaster.close()
+        controller.status_channel.close()
         cap.release()
         print("✅ Server closed")
\ No newline at end of file
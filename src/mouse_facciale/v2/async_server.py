@@ -0,0 +1,164 @@
+"""
+Modalità server asincrona (ASGI) per le app Flask di controllo.
+
+Con app.run(threaded=True) ogni client dello stream video (o degli eventi di
+stato) occupa un thread del sistema operativo bloccato in un generatore.
+AsyncWebApp serve le stesse route su asyncio:
+
+- le route di streaming (/video, /events...) sono task asincroni che leggono
+  l'ultimo frame / stato da un AsyncFanout alimentato dal thread di visione:
+  un solo buffer condiviso, memoria costante anche con molti client;
+- tutte le altre route (/status, /toggle_pause, /update_config, ...) passano
+  all'app Flask esistente tramite un adattatore WSGI -> ASGI vero (a2wsgi,
+  con il suo pool di thread): environ WSGI completo (remote_addr, host,
+  schema) e risposta inviata a pezzi, così la logica resta in un solo posto.
+
+Servono un server ASGI e l'adattatore (pip install uvicorn a2wsgi); le app lo
+avviano con --async.
+"""
+import asyncio
+import json
+
+
+class AsyncFanout:
+    """
+    Ponte thread -> asyncio: publish() può essere chiamato da qualsiasi thread,
+    stream() restituisce ai task sempre l'ultimo valore (i client lenti saltano
+    i valori intermedi).
+    """
+    def __init__(self, initial=None):
+        self.loop = None
+        self.value = initial
+        self.sequence = 1 if initial is not None else 0
+        self.event = None # Creato in bind(), dentro il loop del server
+        self.clients = 0
+
+    def bind(self, loop):
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    def publish(self, value):
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._set_value, value)
+
+    def _set_value(self, value):
+        self.value = value
+        self.sequence += 1
+        event, self.event = self.event, asyncio.Event()
+        event.set()
+
+    async def stream(self, timeout=None):
+        """Generatore asincrono dei valori; con timeout restituisce None se non arriva nulla"""
+        last_sequence = 0
+        self.clients += 1
+        try:
+            while True:
+                if self.sequence == last_sequence:
+                    try:
+                        await asyncio.wait_for(self.event.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        yield None
+                        continue
+                last_sequence = self.sequence
+                yield self.value
+        finally:
+            self.clients -= 1
+
+
+async def mjpeg_stream(fanout):
+    """Parti multipart già pronte (pubblicate da FrameBroadcaster)"""
+    async for part in fanout.stream():
+        yield part
+
+
+async def sse_stream(fanout, min_interval=0.1, keepalive=15.0):
+    """Server-Sent Events: un messaggio per stato, al massimo uno ogni min_interval secondi"""
+    async for state in fanout.stream(timeout=keepalive):
+        if state is None:
+            yield b": keepalive\n\n"
+            continue
+        yield f"data: {json.dumps(state)}\n\n".encode()
+        await asyncio.sleep(min_interval)
+
+
+class AsyncWebApp:
+    """Applicazione ASGI: route di streaming native, le altre delegate all'app Flask"""
+    def __init__(self, flask_app, max_workers=4):
+        try:
+            from a2wsgi import WSGIMiddleware
+        except ImportError:
+            print("La modalità asincrona richiede a2wsgi: pip install a2wsgi")
+            raise
+        self.flask_app = flask_app
+        self.wsgi_app = WSGIMiddleware(flask_app, workers=max_workers)
+        self.streams = {}
+        self.fanouts = []
+        self.loop = None
+
+    def add_stream(self, path, stream_factory, content_type, fanout):
+        """Registra una route servita da stream_factory(fanout) come task asincrono"""
+        self.streams[path] = (stream_factory, content_type, fanout)
+        if fanout not in self.fanouts:
+            self.fanouts.append(fanout)
+
+    def _bind(self):
+        self.loop = asyncio.get_running_loop()
+        for fanout in self.fanouts:
+            fanout.bind(self.loop)
+
+    async def __call__(self, scope, receive, send):
+        if self.loop is None:
+            self._bind()
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            stream = self.streams.get(scope['path'])
+            if stream is not None:
+                await self._send_stream(stream, receive, send)
+            else:
+                await self.wsgi_app(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _send_stream(self, stream, receive, send):
+        stream_factory, content_type, fanout = stream
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', content_type.encode()), (b'cache-control', b'no-cache')],
+        })
+
+        async def pump():
+            async for chunk in stream_factory(fanout):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+        async def wait_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        # Il client può chiudere mentre lo stream aspetta un nuovo frame: vince il primo che termina
+        tasks = {asyncio.ensure_future(pump()), asyncio.ensure_future(wait_disconnect())}
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                print(f"Errore stream {content_type}: {task.exception()}")
+
+
+def run(asgi_app, host='0.0.0.0', port=5000):
+    """Avvia l'app ASGI con uvicorn"""
+    try:
+        import uvicorn
+    except ImportError:
+        print("La modalità asincrona richiede uvicorn: pip install uvicorn")
+        raise
+    uvicorn.run(asgi_app, host=host, port=port, log_level='warning')
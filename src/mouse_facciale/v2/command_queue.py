@@ -0,0 +1,74 @@
+import itertools
+import threading
+from collections import OrderedDict, deque
+
+
+class Command:
+    """Comando web in attesa di essere applicato dal loop di visione"""
+    __slots__ = ('command_id', 'name', 'args', 'done', 'result', 'error')
+
+    def __init__(self, command_id, name, args):
+        self.command_id = command_id
+        self.name = name
+        self.args = args
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout):
+        """Attende l'applicazione del comando (True se applicato entro il timeout)"""
+        return self.done.wait(timeout)
+
+    def to_dict(self):
+        if not self.done.is_set():
+            return {'command_id': self.command_id, 'command': self.name, 'status': 'queued'}
+        if self.error is not None:
+            return {'command_id': self.command_id, 'command': self.name, 'status': 'error', 'message': self.error}
+        return {'command_id': self.command_id, 'command': self.name, 'status': 'applied', 'result': self.result}
+
+
+class CommandQueue:
+    """
+    Piano di controllo tra le richieste HTTP e il loop di visione.
+
+    Gli handler HTTP non toccano più lo stato del controller: accodano un
+    comando (deque.append, atomico, nessun lock condiviso con il loop) e il
+    loop di visione li applica tutti con apply_pending() tra un frame e
+    l'altro, quindi ogni frame vede uno stato coerente. Il risultato arriva in
+    modo asincrono: chi ha accodato può aspettare command.wait() per un breve
+    timeout oppure interrogare get(command_id) in seguito.
+    """
+    def __init__(self, handlers, history_size=256):
+        self.handlers = handlers # nome comando -> funzione(*args) che restituisce il risultato
+        self.pending = deque()
+        self.history = OrderedDict()
+        self.history_size = history_size
+        self.history_lock = threading.Lock() # Solo tra thread HTTP, il loop non lo usa mai
+        self.ids = itertools.count(1)
+
+    def submit(self, name, *args):
+        if name not in self.handlers:
+            raise KeyError(f"Unknown command: {name}")
+        with self.history_lock:
+            command = Command(next(self.ids), name, args)
+            self.history[command.command_id] = command
+            while len(self.history) > self.history_size:
+                self.history.popitem(last=False)
+        self.pending.append(command)
+        return command
+
+    def get(self, command_id):
+        with self.history_lock:
+            return self.history.get(command_id)
+
+    def apply_pending(self):
+        """Applica i comandi in coda (chiamato dal loop di visione al confine tra due frame)"""
+        pending = self.pending
+        while pending:
+            command = pending.popleft()
+            try:
+                command.result = self.handlers[command.name](*command.args)
+            except Exception as e:
+                command.error = str(e)
+                print(f"Errore comando {command.name}: {e}")
+            command.done.set()
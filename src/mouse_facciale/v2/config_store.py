@@ -0,0 +1,137 @@
+import copy
+import json
+import os
+import tempfile
+import threading
+
+
+class ConfigStore:
+    """
+    Configurazione in memoria con salvataggio su file differito e atomico.
+
+    update() cambia subito lo stato in memoria e avvisa i listener con le sole
+    chiavi modificate, ma non tocca il disco: il salvataggio viene fatto da un
+    thread in background dopo save_delay secondi senza nuove modifiche (una
+    raffica di +/- produce una sola scrittura). Il file viene scritto in un
+    temporaneo nella stessa cartella e poi sostituito con os.replace(), così chi
+    lo legge vede sempre o la versione vecchia o quella nuova, mai mezza.
+    """
+    def __init__(self, path, defaults, save_delay=0.5):
+        self.path = path
+        self.defaults = defaults
+        self.save_delay = save_delay
+        self.data = self.load()
+        self.listeners = [] # funzione(chiavi_cambiate, config) chiamata nel thread di update()
+
+        self.condition = threading.Condition()
+        self.dirty = False
+        self.version = 0       # Incrementata ad ogni modifica
+        self.saved_version = 0
+        self.closed = False
+        self.flush_requested = False
+        self.save_errors = 0
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer.start()
+
+    def load(self):
+        """Legge il file di configurazione completandolo con i valori di default"""
+        config = copy.deepcopy(self.defaults)
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    config.update(json.load(f))
+        except Exception as e:
+            print(f"Errore lettura configurazione: {e}")
+        return config
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def get(self, key):
+        return self.data[key]
+
+    def snapshot(self):
+        return self.data
+
+    def update(self, changes=None, **fields):
+        """Applica le modifiche; restituisce l'insieme delle chiavi effettivamente cambiate"""
+        fields = {**(changes or {}), **fields}
+        data = self.data
+        changed = {key: value for key, value in fields.items() if data.get(key) != value}
+        if not changed:
+            return set()
+
+        # Nuovo dict ad ogni modifica: chi ha letto uno snapshot non lo vede mutare
+        self.data = {**data, **copy.deepcopy(changed)}
+        with self.condition:
+            self.version += 1
+            self.dirty = True
+            self.condition.notify_all()
+
+        changed_keys = set(changed)
+        for listener in self.listeners:
+            listener(changed_keys, self.data)
+        return changed_keys
+
+    def _writer_loop(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.dirty or self.closed)
+                if not self.dirty:
+                    return
+                # Debounce: aspetta che le modifiche smettano di arrivare
+                while not (self.closed or self.flush_requested):
+                    version = self.version
+                    self.condition.wait(self.save_delay)
+                    if self.version == version:
+                        break
+                self.dirty = False
+                self.flush_requested = False
+                version = self.version
+                data = self.data
+            self._write(data, version)
+
+    def _write(self, data, version):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.config-', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except Exception as e:
+            print(f"Errore salvataggio configurazione: {e}")
+            with self.condition:
+                self.save_errors += 1
+                self.condition.notify_all()
+            return
+        with self.condition:
+            self.saved_version = max(self.saved_version, version)
+            self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Scrive subito le modifiche in sospeso; True se sono arrivate su disco"""
+        with self.condition:
+            target = self.version
+            if self.saved_version >= target:
+                return True
+            errors = self.save_errors
+            self.flush_requested = True # Interrompe il debounce in corso
+            self.condition.notify_all()
+            self.condition.wait_for(
+                lambda: self.saved_version >= target or self.save_errors != errors, timeout)
+            return self.saved_version >= target
+
+    def close(self):
+        """Salva le ultime modifiche e ferma il thread di scrittura"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.writer.join(timeout=2.0)
+        if self.saved_version < self.version:
+            self._write(self.data, self.version)
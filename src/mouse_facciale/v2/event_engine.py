@@ -0,0 +1,91 @@
+import time
+
+import numpy as np
+
+
+class GestureEngine:
+    """
+    Valuta tutti i gesti a soglia (occhi, bocca) in un unico passo vettoriale.
+
+    Ogni gesto registrato è una riga degli array dell'engine: i rapporti
+    (distanza verticale tra due landmark / 25) finiscono in un unico ring buffer
+    numpy, la media mobile viene calcolata per tutti insieme e le macchine a
+    stati soglia/durata lavorano su array booleani. La semantica è la stessa dei
+    vecchi detect_blink/detect_open_mouth: l'evento scatta una sola volta dopo
+    che il gesto è stato mantenuto per la durata richiesta e si riarma solo
+    quando il gesto viene rilasciato.
+    """
+    def __init__(self, history_size=3):
+        self.history_size = history_size
+        self.setup([])
+
+    def setup(self, events):
+        """
+        (Ri)costruisce gli array a partire dagli eventi. Gli eventi devono avere
+        già ricevuto il binding sulle righe dell'array compatto dei landmark.
+        """
+        self.events = list(events)
+        count = len(self.events)
+
+        self.top_slots = np.array([event.top_slot for event in self.events], dtype=np.intp)
+        self.bottom_slots = np.array([event.bottom_slot for event in self.events], dtype=np.intp)
+        self.thresholds = np.array([event.threshold for event in self.events], dtype=np.float64)
+        self.durations = np.array([event.duration_required for event in self.events], dtype=np.float64)
+        self.active_below = np.array([event.active_below for event in self.events], dtype=bool)
+
+        # Ring buffer condiviso: una riga per gesto, una colonna per campione
+        self.history = np.zeros((count, self.history_size), dtype=np.float64)
+        self.history_pos = 0
+        self.history_count = 0
+
+        # Stato delle macchine a stati
+        self.engaged = np.zeros(count, dtype=bool)   # gesto in corso (occhio chiuso / bocca aperta)
+        self.detected = np.zeros(count, dtype=bool)  # evento già registrato per questo gesto
+        self.start_times = np.full(count, np.nan)
+        self.fired = np.zeros(count, dtype=bool)     # eventi scattati nell'ultimo step
+        self.released = np.zeros(count, dtype=bool)  # gesti rilasciati nell'ultimo step
+
+        for slot, event in enumerate(self.events):
+            event.attach_engine(self, slot)
+
+    def step(self, landmarks, current_time=None):
+        """Aggiorna tutti i gesti con i landmark (compatti) del frame corrente"""
+        if not self.events:
+            return self.fired
+        if current_time is None:
+            current_time = time.time()
+
+        ratios = np.abs(landmarks[self.top_slots, 1] - landmarks[self.bottom_slots, 1]) / 25.0
+        self.history[:, self.history_pos] = ratios
+        self.history_pos = (self.history_pos + 1) % self.history_size
+        self.history_count = min(self.history_count + 1, self.history_size)
+
+        # Media mobile di tutti i gesti in un colpo solo (le colonne vuote valgono 0)
+        stable = self.history.sum(axis=1) / self.history_count
+        triggered = np.where(self.active_below, stable < self.thresholds, stable > self.thresholds)
+
+        starting = triggered & ~self.engaged & ~self.detected
+        self.fired = (triggered & self.engaged & ~self.detected &
+                      (current_time - self.start_times >= self.durations))
+        self.released = ~triggered & self.engaged
+
+        self.start_times[starting] = current_time
+        self.engaged |= starting
+        self.detected |= self.fired
+        self.engaged &= ~self.released
+        self.detected &= ~self.released
+        self.start_times[self.released] = np.nan
+
+        if self.released.any():
+            for slot in np.flatnonzero(self.released):
+                self.events[slot].on_release()
+
+        return self.fired
+
+    def has_fired(self, slot):
+        """True se il gesto ha generato l'evento nell'ultimo step"""
+        return bool(self.fired[slot])
+
+    def is_engaged(self, slot):
+        """True se il gesto è attualmente in corso"""
+        return bool(self.engaged[slot])
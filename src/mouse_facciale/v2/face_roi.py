@@ -0,0 +1,87 @@
+from preprocess import RgbConverter, SLOT_ROI
+
+# Landmark del contorno del viso usati per il riquadro: fronte, mento, guance
+FACE_BOX_INDICES = (10, 152, 234, 454)
+
+
+class FaceRoiTracker:
+    """
+    Passa a FaceMesh solo la regione attorno al viso del frame precedente.
+
+    Il riquadro dei landmark del frame precedente, allargato di margin per
+    lato, diventa la regione di interesse: si convertono in RGB e si elaborano
+    solo quei pixel. La regione viene spostata solo quando il viso si avvicina
+    al bordo (recenter), così per la maggior parte dei frame il sistema di
+    coordinate visto dal tracking interno di FaceMesh resta lo stesso. Se nel
+    ritaglio il viso non viene trovato si rielabora subito il frame intero.
+    Con enabled=False elabora sempre il frame intero.
+
+    I landmark restituiti sono normalizzati rispetto al ritaglio: region
+    (x0, y0, larghezza, altezza) serve per riportarli nel frame intero, ad
+    esempio con LandmarkAdapter.update(face_landmarks, w, h, origin).
+    La conversione in RGB usa i buffer riutilizzati di RgbConverter.
+    """
+    def __init__(self, margin=0.35, recenter=0.15, min_size=160, enabled=True):
+        self.enabled = enabled
+        self.margin = margin       # Bordo aggiunto per lato, in frazioni della dimensione del viso
+        self.recenter = recenter   # Distanza minima del viso dal bordo prima di spostare la regione
+        self.min_size = min_size   # Lato minimo della regione in pixel
+        self.roi = None            # (x0, y0, x1, y1) usata per il prossimo frame, None = frame intero
+        self.region = (0, 0, 0, 0) # Regione dell'ultimo process()
+        self.roi_frames = 0
+        self.full_frames = 0
+        self.losses = 0            # Visi persi nel ritaglio (con ripiego sul frame intero)
+        self.converter = RgbConverter()
+
+    def process(self, face_mesh, frame):
+        """Elabora il frame BGR; i landmark dei risultati sono relativi a self.region"""
+        h, w = frame.shape[:2]
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            results = face_mesh.process(self.converter.convert(frame[y0:y1, x0:x1], SLOT_ROI))
+            if results.multi_face_landmarks:
+                self.roi_frames += 1
+                self.region = (x0, y0, x1 - x0, y1 - y0)
+                self.update_roi(results.multi_face_landmarks[0], w, h)
+                return results
+            self.losses += 1
+            self.roi = None
+
+        self.full_frames += 1
+        self.region = (0, 0, w, h)
+        results = face_mesh.process(self.converter.convert(frame))
+        if self.enabled and results.multi_face_landmarks:
+            self.update_roi(results.multi_face_landmarks[0], w, h)
+        return results
+
+    def update_roi(self, face_landmarks, w, h):
+        """Ricalcola la regione se il viso è troppo vicino al bordo di quella attuale"""
+        rx, ry, rw, rh = self.region
+        landmark_list = face_landmarks.landmark
+        xs = [rx + landmark_list[i].x * rw for i in FACE_BOX_INDICES]
+        ys = [ry + landmark_list[i].y * rh for i in FACE_BOX_INDICES]
+        fx0, fx1, fy0, fy1 = min(xs), max(xs), min(ys), max(ys)
+        face_w, face_h = fx1 - fx0, fy1 - fy0
+
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            border_x = self.recenter * face_w
+            border_y = self.recenter * face_h
+            if (fx0 - x0 >= border_x and x1 - fx1 >= border_x and
+                    fy0 - y0 >= border_y and y1 - fy1 >= border_y):
+                return
+
+        # Regione quadrata centrata sul viso, limitata al frame
+        side = max(face_w, face_h) * (1.0 + 2.0 * self.margin)
+        side = int(min(max(side, self.min_size), w, h))
+        cx, cy = (fx0 + fx1) / 2.0, (fy0 + fy1) / 2.0
+        x0 = int(min(max(cx - side / 2.0, 0), w - side))
+        y0 = int(min(max(cy - side / 2.0, 0), h - side))
+        self.roi = (x0, y0, x0 + side, y0 + side)
+
+    def reset(self):
+        """Torna al frame intero (es. dopo una ricalibrazione)"""
+        self.roi = None
+
+    def get_stats(self):
+        return {'roi_frames': self.roi_frames, 'full_frames': self.full_frames, 'losses': self.losses}
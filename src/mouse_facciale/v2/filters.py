@@ -0,0 +1,111 @@
+"""
+Filtri di smoothing a bassa latenza per il movimento del cursore e lo scroll.
+
+La media mobile su 5 campioni aggiunge circa 2,5 frame di ritardo a ogni
+movimento. Questi filtri lavorano su un solo valore scalare per volta, con lo
+stato in pochi float e senza allocare array ad ogni frame (per il movimento 2D
+si usa un filtro per asse):
+
+- OneEuroFilter: passa-basso con frequenza di taglio che cresce con la
+  velocità del segnale; fermo il cursore resta stabile, nei movimenti rapidi
+  il ritardo sparisce (Casiez et al., "1€ Filter", CHI 2012).
+- KalmanFilter: Kalman scalare a passeggiata casuale (stima + varianza).
+- PassthroughFilter: nessuno smoothing.
+
+Tutti espongono filter(valore, istante) e reset().
+"""
+import math
+
+FILTER_ONE_EURO = 'one_euro'
+FILTER_KALMAN = 'kalman'
+FILTER_PASSTHROUGH = 'passthrough'
+FILTER_KINDS = (FILTER_ONE_EURO, FILTER_KALMAN, FILTER_PASSTHROUGH)
+
+
+class PassthroughFilter:
+    def filter(self, value, timestamp):
+        return value
+
+    def reset(self):
+        pass
+
+
+class OneEuroFilter:
+    """
+    min_cutoff: frequenza di taglio (Hz) da fermo, più bassa = più stabile
+    beta: quanto la frequenza di taglio cresce con la velocità, più alta = meno ritardo
+    d_cutoff: frequenza di taglio (Hz) della stima della velocità
+    """
+    def __init__(self, min_cutoff=1.5, beta=0.01, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.derivative = 0.0
+        self.timestamp = None
+
+    @staticmethod
+    def alpha(cutoff, dt):
+        tau = 1.0 / (2.0 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def filter(self, value, timestamp):
+        if self.value is None:
+            self.value = float(value)
+            self.timestamp = timestamp
+            return self.value
+
+        dt = timestamp - self.timestamp
+        if dt <= 0.0:
+            return self.value
+        self.timestamp = timestamp
+
+        derivative = (value - self.value) / dt
+        a_d = self.alpha(self.d_cutoff, dt)
+        self.derivative = a_d * derivative + (1.0 - a_d) * self.derivative
+
+        cutoff = self.min_cutoff + self.beta * abs(self.derivative)
+        a = self.alpha(cutoff, dt)
+        self.value = a * value + (1.0 - a) * self.value
+        return self.value
+
+
+class KalmanFilter:
+    """
+    process_noise: quanto ci si aspetta che il valore vero cambi tra due campioni
+    measurement_noise: rumore della misura, più alto = più smoothing
+    """
+    def __init__(self, process_noise=4.0, measurement_noise=10.0):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.variance = 0.0
+
+    def filter(self, value, timestamp):
+        if self.value is None:
+            self.value = float(value)
+            self.variance = self.measurement_noise
+            return self.value
+
+        variance = self.variance + self.process_noise
+        gain = variance / (variance + self.measurement_noise)
+        self.value += gain * (value - self.value)
+        self.variance = (1.0 - gain) * variance
+        return self.value
+
+
+def create_filter(kind=FILTER_ONE_EURO, **params):
+    """Crea un filtro scalare; params sono i parametri del costruttore (da user_config)"""
+    if kind == FILTER_ONE_EURO:
+        return OneEuroFilter(**params)
+    if kind == FILTER_KALMAN:
+        return KalmanFilter(**params)
+    if kind == FILTER_PASSTHROUGH:
+        return PassthroughFilter()
+    raise ValueError(f"Filtro sconosciuto: {kind}")
@@ -0,0 +1,74 @@
+import threading
+
+
+class FrameBroadcaster:
+    """
+    Distribuisce a tutti i client MJPEG l'ultimo frame JPEG pubblicato.
+
+    Un solo produttore (il thread di visione) elabora e codifica ogni frame una
+    volta sola e lo pubblica con publish(): non aspetta mai i client. Ogni
+    client legge con stream() sempre il frame più recente; se è lento i frame
+    intermedi vengono saltati per lui (e contati), senza rallentare gli altri.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.part = None    # Frame corrente già impacchettato come parte multipart
+        self.sequence = 0
+        self.clients = 0
+        self.closed = False
+        self.published_frames = 0
+        self.skipped_frames = 0 # Frame saltati dai client lenti (totale)
+        self.listeners = [] # Altri consumatori (es. AsyncFanout) con publish() e clients
+
+    def publish(self, jpeg_bytes):
+        """Pubblica un frame JPEG (chiamato dal thread di visione)"""
+        part = (b'--frame\r\n'
+                b'Content-Type: image/jpeg\r\n\r\n' + jpeg_bytes + b'\r\n')
+        with self.condition:
+            self.part = part
+            self.sequence += 1
+            self.published_frames += 1
+            self.condition.notify_all()
+        for listener in self.listeners:
+            listener.publish(part)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def has_clients(self):
+        return self.clients > 0 or any(listener.clients for listener in self.listeners)
+
+    def stream(self, timeout=1.0):
+        """Generatore per un client: restituisce le parti multipart man mano che arrivano"""
+        with self.condition:
+            self.clients += 1
+        last_sequence = 0
+        try:
+            while True:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.sequence != last_sequence or self.closed, timeout)
+                    if self.closed:
+                        return
+                    if self.sequence == last_sequence:
+                        continue
+                    if last_sequence:
+                        self.skipped_frames += self.sequence - last_sequence - 1
+                    last_sequence = self.sequence
+                    part = self.part
+                yield part # Fuori dal lock: un client lento non blocca il produttore
+        finally:
+            with self.condition:
+                self.clients -= 1
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                'clients': self.clients + sum(listener.clients for listener in self.listeners),
+                'published': self.published_frames,
+                'skipped': self.skipped_frames,
+            }
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
@@ -0,0 +1,95 @@
+import threading
+import time
+
+
+class FrameCapture:
+    """
+    Thread di acquisizione dedicato con buffer a uno slot ("vince l'ultimo frame").
+
+    Il thread legge continuamente dalla webcam e sovrascrive lo slot con il frame
+    più recente: chi consuma (il loop del HeadMouseController) riceve sempre il
+    frame più fresco e i frame non ancora letti vengono scartati e contati.
+    Espone la stessa interfaccia di cv2.VideoCapture.read() -> (ret, frame).
+    Con un profiler il thread registra come fase 'capture' la durata di
+    cap.read(), cioè il costo reale di acquisizione e decodifica.
+    """
+    def __init__(self, cap, read_timeout=1.0, profiler=None):
+        self.cap = cap
+        self.read_timeout = read_timeout
+        self.profiler = profiler
+        self.condition = threading.Condition() # Protegge lo slot condiviso
+        self.frame = None
+        self.frame_time = None
+        self.frame_id = 0
+        self.last_read_id = 0
+        self.captured_frames = 0
+        self.dropped_frames = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Avvia il thread di acquisizione"""
+        if self.running:
+            return self
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop)
+        self.thread.daemon = True # Il thread si chiuderà con il programma principale
+        self.thread.start()
+        return self
+
+    def _capture_loop(self):
+        profiler = self.profiler
+        while self.running:
+            if profiler is not None:
+                start = profiler.start()
+            ret, frame = self.cap.read()
+            if profiler is not None and ret:
+                profiler.record('capture', start)
+            if not ret:
+                time.sleep(0.005)
+                continue
+
+            capture_time = time.monotonic()
+            with self.condition:
+                # Il frame precedente non è mai stato letto: viene scartato
+                if self.frame is not None:
+                    self.dropped_frames += 1
+                self.frame = frame
+                self.frame_time = capture_time
+                self.frame_id += 1
+                self.captured_frames += 1
+                self.condition.notify()
+
+    def read(self):
+        """
+        Restituisce il frame più recente non ancora letto, attendendo al massimo
+        read_timeout secondi. Ritorna (False, None) se non arriva nessun frame.
+        """
+        with self.condition:
+            has_frame = self.condition.wait_for(
+                lambda: self.frame is not None or not self.running, self.read_timeout
+            )
+            if not has_frame or self.frame is None:
+                return False, None
+            frame = self.frame
+            self.frame = None # Lo slot torna libero
+            self.last_read_id = self.frame_id
+            return True, frame
+
+    def get_frame_age(self):
+        """Restituisce l'età (in secondi) dell'ultimo frame acquisito"""
+        if self.frame_time is None:
+            return None
+        return time.monotonic() - self.frame_time
+
+    def stop(self):
+        """Ferma il thread di acquisizione (non rilascia la webcam)"""
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    def get_stats(self):
+        return {'captured_frames': self.captured_frames, 'dropped_frames': self.dropped_frames}
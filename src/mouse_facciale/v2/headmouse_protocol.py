@@ -0,0 +1,167 @@
+"""
+Protocollo binario v2 tra HeadMouseController e il ricevitore embedded.
+
+Questo modulo viene usato da entrambi i lati (trasmettitore e ricevitore) così
+che il formato resti sempre allineato.
+
+Ogni pacchetto è composto da un header fisso di 10 byte (little endian):
+    [magic 0xA5][versione][tipo][sequenza u16][timestamp ms u32][lunghezza payload]
+seguito dal payload del tipo indicato:
+    0x01 Movimento cursore : dx int8, dy int8, velocità u8, movimenti accorpati u8
+    0x02 Scroll            : quantità int16 (positivo = giù)
+    0x03 Click sinistro    : nessun payload
+    0x04 Click destro      : nessun payload
+    0x05 Cambio modalità   : modalità u8 (0x00 = puntatore, 0x01 = scroll)
+    0x06 Movimento esteso  : dx int16, dy int16, velocità u8, movimenti accorpati u8
+
+Il movimento esteso (come il MouseReport c_int16 di rusi/mouseEmuServer.py)
+porta spostamenti fino a ±32767 in un solo pacchetto; PacketEncoder.move() lo
+usa solo quando dx o dy non stanno in un int8 e il ricevitore lo supporta.
+
+La sequenza (u16, ciclica) permette al ricevitore di contare i pacchetti persi;
+il timestamp è l'orologio di sistema in millisecondi modulo 2^32.
+"""
+import struct
+import time
+from collections import namedtuple
+
+PROTOCOL_MAGIC = 0xA5
+PROTOCOL_VERSION = 2
+
+PACKET_MOVE = 0x01
+PACKET_SCROLL = 0x02
+PACKET_LEFT_CLICK = 0x03
+PACKET_RIGHT_CLICK = 0x04
+PACKET_MODE_SWITCH = 0x05
+PACKET_MOVE_WIDE = 0x06
+
+MODE_POINTER = 0x00
+MODE_SCROLL = 0x01
+
+HEADER = struct.Struct('<BBBHIB')
+
+PAYLOADS = {
+    PACKET_MOVE: struct.Struct('<bbBB'),
+    PACKET_SCROLL: struct.Struct('<h'),
+    PACKET_LEFT_CLICK: struct.Struct('<'),
+    PACKET_RIGHT_CLICK: struct.Struct('<'),
+    PACKET_MODE_SWITCH: struct.Struct('<B'),
+    PACKET_MOVE_WIDE: struct.Struct('<hhBB'),
+}
+
+PACKET_NAMES = {
+    PACKET_MOVE: 'move',
+    PACKET_SCROLL: 'scroll',
+    PACKET_LEFT_CLICK: 'left_click',
+    PACKET_RIGHT_CLICK: 'right_click',
+    PACKET_MODE_SWITCH: 'mode_switch',
+    PACKET_MOVE_WIDE: 'move_wide',
+}
+
+Packet = namedtuple('Packet', ['packet_type', 'sequence', 'timestamp_ms', 'fields'])
+
+
+def current_timestamp_ms():
+    """Orologio di sistema in millisecondi, ridotto a 32 bit"""
+    return int(time.time() * 1000) & 0xFFFFFFFF
+
+
+def timestamp_age_ms(timestamp_ms, now_ms=None):
+    """Millisecondi trascorsi da timestamp_ms (gestisce il giro dei 32 bit)"""
+    if now_ms is None:
+        now_ms = current_timestamp_ms()
+    return (now_ms - timestamp_ms) & 0xFFFFFFFF
+
+
+def clamp(value, low, high):
+    return max(low, min(high, int(value)))
+
+
+class PacketEncoder:
+    """
+    Costruisce i pacchetti v2 assegnando numero di sequenza e timestamp.
+    Con wide_moves=False (ricevitori che non conoscono 0x06) gli spostamenti
+    vengono limitati a ±127 come prima.
+    """
+    def __init__(self, wide_moves=True):
+        self.sequence = 0
+        self.wide_moves = wide_moves
+
+    def encode(self, packet_type, *fields):
+        payload = PAYLOADS[packet_type].pack(*fields)
+        header = HEADER.pack(PROTOCOL_MAGIC, PROTOCOL_VERSION, packet_type,
+                             self.sequence, current_timestamp_ms(), len(payload))
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        return header + payload
+
+    def move(self, dx, dy, speed, merged=1):
+        if self.wide_moves and not (-127 <= dx <= 127 and -127 <= dy <= 127):
+            return self.encode(PACKET_MOVE_WIDE, clamp(dx, -32768, 32767), clamp(dy, -32768, 32767),
+                               clamp(speed, 0, 255), clamp(merged, 1, 255))
+        return self.encode(PACKET_MOVE, clamp(dx, -127, 127), clamp(dy, -127, 127),
+                           clamp(speed, 0, 255), clamp(merged, 1, 255))
+
+    def scroll(self, amount):
+        return self.encode(PACKET_SCROLL, clamp(amount, -32768, 32767))
+
+    def left_click(self):
+        return self.encode(PACKET_LEFT_CLICK)
+
+    def right_click(self):
+        return self.encode(PACKET_RIGHT_CLICK)
+
+    def mode_switch(self, mode):
+        return self.encode(PACKET_MODE_SWITCH, mode)
+
+
+class PacketDecoder:
+    """
+    Decodifica lo stream di byte ricevuto dal socket (anche frammentato) in Packet.
+    In caso di byte non validi si risincronizza cercando il prossimo magic.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+        self.expected_sequence = None
+        self.received_packets = 0
+        self.dropped_packets = 0
+        self.invalid_bytes = 0
+
+    def feed(self, data):
+        """Aggiunge i byte ricevuti e restituisce la lista dei pacchetti completi"""
+        self.buffer.extend(data)
+        packets = []
+
+        while True:
+            start = self.buffer.find(bytes([PROTOCOL_MAGIC]))
+            if start < 0:
+                self.invalid_bytes += len(self.buffer)
+                self.buffer.clear()
+                break
+            if start > 0:
+                self.invalid_bytes += start
+                del self.buffer[:start]
+            if len(self.buffer) < HEADER.size:
+                break
+
+            _, version, packet_type, sequence, timestamp_ms, length = HEADER.unpack_from(self.buffer)
+            payload_struct = PAYLOADS.get(packet_type)
+            if version != PROTOCOL_VERSION or payload_struct is None or length != payload_struct.size:
+                # Header non valido: scarta il magic e cerca il prossimo
+                self.invalid_bytes += 1
+                del self.buffer[:1]
+                continue
+            if len(self.buffer) < HEADER.size + length:
+                break
+
+            fields = payload_struct.unpack_from(self.buffer, HEADER.size)
+            del self.buffer[:HEADER.size + length]
+            self._track_sequence(sequence)
+            packets.append(Packet(packet_type, sequence, timestamp_ms, fields))
+
+        return packets
+
+    def _track_sequence(self, sequence):
+        if self.expected_sequence is not None:
+            self.dropped_packets += (sequence - self.expected_sequence) & 0xFFFF
+        self.expected_sequence = (sequence + 1) & 0xFFFF
+        self.received_packets += 1
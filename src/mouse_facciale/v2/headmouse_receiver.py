@@ -0,0 +1,135 @@
+"""
+Ricevitore di prova per il protocollo v2 (pacchetti 0x01-0x06).
+
+Sta dall'altra parte del BluetoothTransmitter: decodifica lo stream, conta i
+pacchetti per tipo e misura throughput e latenza (timestamp del pacchetto ->
+arrivo). Con i trasporti TCP/UNIX permette di misurare il protocollo di
+movimento su qualsiasi macchina Linux, senza adattatore Bluetooth. La latenza
+è significativa solo se i due lati condividono l'orologio (stessa macchina).
+
+Esempi:
+    python headmouse_receiver.py --transport unix --connect
+    python headmouse_receiver.py --transport tcp --listen --port 5555
+"""
+import argparse
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+from headmouse_protocol import PacketDecoder, PACKET_NAMES, timestamp_age_ms
+from transports import create_transport, TRANSPORT_RFCOMM, TRANSPORT_TCP, TRANSPORT_UNIX
+
+
+class ReceiverStats:
+    """Contatori e campioni di latenza di una sessione di ricezione"""
+    def __init__(self, latency_samples=5000):
+        self.decoder = PacketDecoder()
+        self.latencies = deque(maxlen=latency_samples) # millisecondi
+        self.packet_counts = Counter()
+        self.received_bytes = 0
+        self.start_time = time.monotonic()
+        self.last_report_time = self.start_time
+        self.last_report_packets = 0
+
+    def feed(self, data):
+        """Decodifica i byte ricevuti e registra i tempi dei pacchetti completi"""
+        self.received_bytes += len(data)
+        packets = self.decoder.feed(data)
+        for packet in packets:
+            self.packet_counts[PACKET_NAMES[packet.packet_type]] += 1
+            self.latencies.append(timestamp_age_ms(packet.timestamp_ms))
+        return packets
+
+    def report(self):
+        """Restituisce un riepilogo e azzera la finestra del rate istantaneo"""
+        now = time.monotonic()
+        received = self.decoder.received_packets
+        window = max(now - self.last_report_time, 1e-6)
+        elapsed = max(now - self.start_time, 1e-6)
+        rate = (received - self.last_report_packets) / window
+        self.last_report_time = now
+        self.last_report_packets = received
+
+        summary = {
+            'packets': received,
+            'packets_per_s': rate,
+            'bytes_per_s': self.received_bytes / elapsed,
+            'lost': self.decoder.dropped_packets,
+            'invalid_bytes': self.decoder.invalid_bytes,
+            'by_type': dict(self.packet_counts),
+        }
+        if self.latencies:
+            p50, p95, p99 = np.percentile(np.fromiter(self.latencies, dtype=np.float64), (50, 95, 99))
+            summary.update(latency_p50_ms=p50, latency_p95_ms=p95, latency_p99_ms=p99)
+        return summary
+
+
+def format_report(summary):
+    line = (f"pacchetti: {summary['packets']} ({summary['packets_per_s']:.0f}/s, "
+            f"{summary['bytes_per_s'] / 1024:.1f} KiB/s) | persi: {summary['lost']} | "
+            f"byte non validi: {summary['invalid_bytes']}")
+    if 'latency_p50_ms' in summary:
+        line += (f" | latenza p50/p95/p99: {summary['latency_p50_ms']:.1f}/"
+                 f"{summary['latency_p95_ms']:.1f}/{summary['latency_p99_ms']:.1f} ms")
+    return line + f" | {summary['by_type']}"
+
+
+def run_receiver(transport, report_interval=1.0, verbose=False):
+    """Riceve finché non si preme Ctrl+C; se il trasmettitore si scollega riattende"""
+    stats = ReceiverStats()
+    try:
+        while True:
+            try:
+                transport.connect()
+            except OSError as e:
+                print(f"Connessione non riuscita ({e}), nuovo tentativo tra 1 secondo...")
+                transport.close()
+                time.sleep(1.0)
+                continue
+
+            while True:
+                try:
+                    data = transport.recv(4096)
+                except OSError as e:
+                    print(f"Errore ricezione: {e}")
+                    data = b''
+                if not data:
+                    print("Trasmettitore scollegato")
+                    transport.disconnect()
+                    break
+                for packet in stats.feed(data):
+                    if verbose:
+                        print(f"#{packet.sequence} {PACKET_NAMES[packet.packet_type]} {packet.fields}")
+                if time.monotonic() - stats.last_report_time >= report_interval:
+                    print(format_report(stats.report()))
+    except KeyboardInterrupt:
+        print("\nInterruzione da tastiera")
+    finally:
+        transport.close()
+        print(format_report(stats.report()))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ricevitore di prova per il protocollo HeadMouse v2")
+    parser.add_argument('--transport', choices=[TRANSPORT_TCP, TRANSPORT_UNIX, TRANSPORT_RFCOMM],
+                        default=TRANSPORT_UNIX)
+    role = parser.add_mutually_exclusive_group()
+    role.add_argument('--connect', dest='listen', action='store_false',
+                      help="connettiti al controller avviato come Server (default)")
+    role.add_argument('--listen', dest='listen', action='store_true',
+                      help="attendi il controller avviato come Client")
+    parser.set_defaults(listen=False)
+    parser.add_argument('--address', help="host TCP, percorso socket UNIX o MAC Bluetooth")
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--interval', type=float, default=1.0, help="secondi tra un riepilogo e l'altro")
+    parser.add_argument('--verbose', action='store_true', help="stampa ogni pacchetto ricevuto")
+    args = parser.parse_args()
+
+    transport = create_transport(args.transport, is_server=args.listen, address=args.address, port=args.port)
+    run_receiver(transport, report_interval=args.interval, verbose=args.verbose)
+
+
+if __name__ == "__main__":
+    main()
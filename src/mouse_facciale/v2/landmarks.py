@@ -0,0 +1,113 @@
+from itertools import chain
+
+import numpy as np
+
+# Numero di landmark restituiti da FaceMesh con refine_landmarks=True
+NUM_FACE_LANDMARKS = 478
+
+# Coppie di landmark simmetrici (destra <-> sinistra del viso) usate dai controller:
+# palpebre superiori/inferiori, angoli degli occhi, guance, angoli della bocca.
+# I landmark sulla linea mediana (naso, labbra centrali) sono simmetrici di sé stessi.
+MIRROR_PAIRS = ((159, 386), (145, 374), (33, 263), (133, 362), (234, 454), (61, 291))
+MIRROR_INDEX = {**dict(MIRROR_PAIRS), **{b: a for a, b in MIRROR_PAIRS}}
+
+
+class LandmarkAdapter:
+    """
+    Converte i landmark normalizzati di MediaPipe in coordinate pixel dentro un
+    buffer numpy float32 (478, 2) preallocato e riutilizzato ad ogni frame.
+
+    Se viene passato un sottoinsieme di indici vengono convertite solo quelle
+    righe (naso, labbra, occhi...): le altre righe del buffer non vengono
+    aggiornate e non vanno lette.
+
+    Le coordinate vengono lette con un solo passaggio sugli indici richiesti
+    (np.fromiter su x, y appiattiti, senza liste intermedie); scala e origine
+    sono poi applicate in place. Il costo che resta è l'accesso agli attributi
+    .x/.y dei messaggi protobuf di MediaPipe, uno per coordinata: per questo
+    conviene chiedere solo gli indici che servono.
+
+    Con mirror=True i punti sono quelli che si otterrebbero con FaceMesh sul
+    frame specchiato (cv2.flip(frame, 1)) senza doverlo specchiare: x diventa
+    larghezza - x e, poiché nell'immagine specchiata FaceMesh scambia destra e
+    sinistra del viso, l'indice i viene letto da MIRROR_INDEX[i]. Gli indici
+    laterali non presenti in MIRROR_PAIRS vanno aggiunti lì prima di usarli.
+    """
+    def __init__(self, indices=None, num_landmarks=NUM_FACE_LANDMARKS, mirror=False):
+        self.num_landmarks = num_landmarks
+        self.mirror = mirror
+        self.points = np.zeros((num_landmarks, 2), dtype=np.float32)
+        self.scale = np.ones(2, dtype=np.float32) # (larghezza, altezza) del frame
+        self.origin = np.zeros(2, dtype=np.float32) # Angolo della regione elaborata (FaceRoiTracker)
+        self.set_indices(indices)
+
+    def set_indices(self, indices):
+        """Imposta gli indici da estrarre (None = tutti i landmark)"""
+        if indices is None:
+            self.indices = None
+            self.index_array = None
+            self.compact = None
+            self.slot_map = None
+            self.source_indices = [self.source_index(i) for i in range(self.num_landmarks)]
+            return
+
+        self.indices = sorted(set(int(i) for i in indices))
+        self.source_indices = [self.source_index(i) for i in self.indices]
+        self.index_array = np.array(self.indices, dtype=np.intp)
+        # Array compatto: riga k = landmark self.indices[k]
+        self.compact = np.zeros((len(self.indices), 2), dtype=np.float32)
+        self.slot_map = {index: slot for slot, index in enumerate(self.indices)}
+
+    def set_mirror(self, mirror):
+        """Attiva/disattiva lo specchio mantenendo gli indici attuali"""
+        self.mirror = mirror
+        self.set_indices(self.indices)
+
+    def source_index(self, index):
+        """Indice del landmark di FaceMesh da cui leggere il punto index"""
+        return MIRROR_INDEX.get(index, index) if self.mirror else index
+
+    def update(self, face_landmarks, w, h, origin=None, frame_w=None):
+        """
+        Aggiorna il buffer con i landmark del frame corrente e lo restituisce.
+        Il buffer è condiviso tra i frame: copiare i punti che devono sopravvivere.
+        Se FaceMesh ha elaborato solo una regione, w e h sono le sue dimensioni
+        e origin il suo angolo (x0, y0) nel frame intero; con mirror=True
+        frame_w è la larghezza del frame intero (default w).
+        """
+        landmark_list = face_landmarks.landmark
+        self.scale[0] = w
+        self.scale[1] = h
+        if origin is None:
+            self.origin[:] = 0
+        else:
+            self.origin[:] = origin
+        if self.mirror:
+            # x specchiata = frame_w - (x0 + x * w): stessa moltiplicazione e somma, senza passaggi extra
+            self.scale[0] = -w
+            self.origin[0] = (w if frame_w is None else frame_w) - self.origin[0]
+
+        if self.indices is None:
+            count = min(len(landmark_list), self.num_landmarks)
+            full = self.points[:count]
+            sources = self.source_indices
+            self._fill(full, landmark_list, sources if count == len(sources) else sources[:count])
+            full *= self.scale
+            full += self.origin
+            return self.points
+
+        self._fill(self.compact, landmark_list, self.source_indices)
+        self.compact *= self.scale
+        self.compact += self.origin
+        self.points[self.index_array] = self.compact
+        return self.points
+
+    @staticmethod
+    def _fill(buffer, landmark_list, sources):
+        """Scrive x, y dei landmark sources nelle righe di buffer (contiguo, float32)"""
+        coordinates = chain.from_iterable((lm.x, lm.y) for lm in map(landmark_list.__getitem__, sources))
+        buffer.reshape(-1)[:] = np.fromiter(coordinates, dtype=np.float32, count=2 * len(sources))
+
+    def get_compact(self):
+        """Restituisce l'array compatto (len(indices), 2) dell'ultimo update"""
+        return self.compact
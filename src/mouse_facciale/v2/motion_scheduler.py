@@ -0,0 +1,119 @@
+import threading
+import time
+
+MIN_RATE_HZ = 60
+MAX_RATE_HZ = 250
+
+
+class MotionScheduler:
+    """
+    Genera i movimenti del cursore ad alta frequenza tra un frame e l'altro.
+
+    La webcam aggiorna il movimento a circa 30 Hz: inviato così com'è il
+    cursore remoto avanza a scatti di 33 ms. Il loop di visione passa a
+    set_motion() lo spostamento calcolato per il frame, che diventa una
+    velocità (unità al secondo, usando l'intervallo misurato tra i frame);
+    un thread dedicato la integra a rate_hz e chiama send_move(dx, dy, speed)
+    con la parte intera accumulata, portando avanti i resti frazionari.
+
+    stop() azzera velocità e resti subito (ingresso nella zona morta, pausa,
+    cambio modalità); se i frame smettono di arrivare per stale_after secondi
+    il movimento si ferma da solo. I tick in ritardo non vengono recuperati
+    con raffiche di pacchetti: dt è limitato a due periodi e, se il ritardo
+    supera un periodo, il clock si riallinea (jitter limitato).
+    """
+    def __init__(self, send_move, rate_hz=120, stale_after=0.1):
+        self.send_move = send_move
+        self.rate_hz = min(max(rate_hz, MIN_RATE_HZ), MAX_RATE_HZ)
+        self.period = 1.0 / self.rate_hz
+        self.stale_after = stale_after
+
+        self.lock = threading.Lock()
+        self.velocity_x = 0.0
+        self.velocity_y = 0.0
+        self.speed = 0
+        self.last_update = None
+        self.frame_interval = 1.0 / 30 # Media mobile esponenziale dell'intervallo tra frame
+        self.residual_x = 0.0
+        self.residual_y = 0.0
+
+        self.ticks = 0
+        self.sent_moves = 0
+        self.late_ticks = 0     # Tick con più di un periodo di ritardo (clock riallineato)
+        self.max_lateness = 0.0
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def set_motion(self, dx, dy, speed):
+        """Spostamento del frame corrente (stesse unità di send_move)"""
+        now = time.monotonic()
+        with self.lock:
+            if self.last_update is not None:
+                interval = min(max(now - self.last_update, 1.0 / 120), 0.1)
+                self.frame_interval += 0.2 * (interval - self.frame_interval)
+            self.last_update = now
+            self.velocity_x = dx / self.frame_interval
+            self.velocity_y = dy / self.frame_interval
+            self.speed = speed
+
+    def stop(self):
+        """Ferma subito il movimento e scarta i resti frazionari"""
+        with self.lock:
+            self.velocity_x = self.velocity_y = 0.0
+            self.residual_x = self.residual_y = 0.0
+            self.last_update = None
+
+    def _run(self):
+        period = self.period
+        next_tick = time.monotonic() + period
+        last_tick = time.monotonic()
+        while not self.stop_event.is_set():
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+
+            now = time.monotonic()
+            lateness = now - next_tick
+            if lateness > self.max_lateness:
+                self.max_lateness = lateness
+            if lateness > period:
+                self.late_ticks += 1
+                next_tick = now # Riallinea invece di recuperare i tick persi
+            next_tick += period
+            dt = min(now - last_tick, 2 * period)
+            last_tick = now
+            self.ticks += 1
+
+            with self.lock:
+                if self.last_update is None:
+                    continue
+                if now - self.last_update > self.stale_after:
+                    # Nessun frame recente (viso perso, loop bloccato): niente movimento
+                    self.velocity_x = self.velocity_y = 0.0
+                    continue
+                self.residual_x += self.velocity_x * dt
+                self.residual_y += self.velocity_y * dt
+                move_x = int(self.residual_x)
+                move_y = int(self.residual_y)
+                self.residual_x -= move_x
+                self.residual_y -= move_y
+                speed = self.speed
+
+            if move_x or move_y:
+                self.send_move(move_x, move_y, speed)
+                self.sent_moves += 1
+
+    def get_stats(self):
+        return {
+            'rate_hz': self.rate_hz,
+            'ticks': self.ticks,
+            'sent_moves': self.sent_moves,
+            'late_ticks': self.late_ticks,
+            'max_lateness_ms': self.max_lateness * 1000.0,
+        }
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(timeout=1.0)
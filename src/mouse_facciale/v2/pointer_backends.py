@@ -0,0 +1,344 @@
+"""
+Backend di uscita verso il puntatore del sistema operativo.
+
+I controller usano pyautogui (test10, prova) o pynput (test11), con costi per
+chiamata molto diversi: pyautogui di default aspetta PAUSE secondi dopo ogni
+chiamata, pynput passa da un thread di backend. Qui tutti i backend espongono
+la stessa interfaccia:
+
+    move_relative(dx, dy)   spostamento relativo del cursore
+    move_to(x, y)           posizione assoluta (non disponibile con uinput)
+    position()              posizione attuale (None se non disponibile)
+    screen_size()           (larghezza, altezza) dello schermo (None se non disponibile)
+    click(button)           'left' o 'right'
+    scroll(amount)          positivo = su, come pyautogui
+    close()
+
+Implementazioni: uinput (scrive direttamente su /dev/uinput, nessuna
+dipendenza, un solo write() per evento), xtest (python-xlib, estensione XTest
+di X11), pynput, pyautogui e null (registra le chiamate, per i test).
+best_available_backend() sceglie il primo disponibile in ordine di costo.
+
+Benchmark della latenza per chiamata dei backend disponibili:
+
+    python pointer_backends.py --benchmark [--calls 500] [--backend uinput ...]
+"""
+import argparse
+import fcntl
+import os
+import struct
+import time
+
+BACKEND_UINPUT = 'uinput'
+BACKEND_XTEST = 'xtest'
+BACKEND_PYNPUT = 'pynput'
+BACKEND_PYAUTOGUI = 'pyautogui'
+BACKEND_NULL = 'null'
+# Ordine di preferenza: dal più economico per chiamata al più costoso
+BACKEND_ORDER = (BACKEND_UINPUT, BACKEND_XTEST, BACKEND_PYNPUT, BACKEND_PYAUTOGUI)
+
+
+class BasePointerBackend:
+    name = 'base'
+
+    def move_relative(self, dx, dy):
+        raise NotImplementedError
+
+    def move_to(self, x, y):
+        raise NotImplementedError(f"{self.name}: posizionamento assoluto non supportato")
+
+    def position(self):
+        return None
+
+    def screen_size(self):
+        return None
+
+    def click(self, button='left'):
+        raise NotImplementedError
+
+    def scroll(self, amount):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class NullBackend(BasePointerBackend):
+    """Non muove nulla: registra le chiamate (per test e replay senza display)"""
+    name = BACKEND_NULL
+
+    def __init__(self, record=True):
+        self.record = record
+        self.calls = []
+        self.x = 0
+        self.y = 0
+
+    def move_relative(self, dx, dy):
+        self.x += dx
+        self.y += dy
+        if self.record:
+            self.calls.append(('move_relative', dx, dy))
+
+    def move_to(self, x, y):
+        self.x, self.y = x, y
+        if self.record:
+            self.calls.append(('move_to', x, y))
+
+    def position(self):
+        return (self.x, self.y)
+
+    def click(self, button='left'):
+        if self.record:
+            self.calls.append(('click', button))
+
+    def scroll(self, amount):
+        if self.record:
+            self.calls.append(('scroll', amount))
+
+
+class PyAutoGuiBackend(BasePointerBackend):
+    name = BACKEND_PYAUTOGUI
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+        pyautogui.FAILSAFE = False
+        pyautogui.PAUSE = 0 # La pausa di default (0.1 s) dopo ogni chiamata domina il costo
+
+    def move_relative(self, dx, dy):
+        self.pyautogui.moveRel(dx, dy, _pause=False)
+
+    def move_to(self, x, y):
+        self.pyautogui.moveTo(x, y, _pause=False)
+
+    def position(self):
+        return tuple(self.pyautogui.position())
+
+    def screen_size(self):
+        return tuple(self.pyautogui.size())
+
+    def click(self, button='left'):
+        self.pyautogui.click(button=button, _pause=False)
+
+    def scroll(self, amount):
+        self.pyautogui.scroll(amount, _pause=False)
+
+
+class PynputBackend(BasePointerBackend):
+    name = BACKEND_PYNPUT
+
+    def __init__(self):
+        from pynput import mouse
+        self.controller = mouse.Controller()
+        self.buttons = {'left': mouse.Button.left, 'right': mouse.Button.right}
+
+    def move_relative(self, dx, dy):
+        self.controller.move(dx, dy)
+
+    def move_to(self, x, y):
+        self.controller.position = (x, y)
+
+    def position(self):
+        return tuple(self.controller.position)
+
+    def click(self, button='left'):
+        self.controller.click(self.buttons[button])
+
+    def scroll(self, amount):
+        self.controller.scroll(0, amount)
+
+
+class XTestBackend(BasePointerBackend):
+    """Eventi sintetici tramite l'estensione XTest di X11 (python-xlib)"""
+    name = BACKEND_XTEST
+    BUTTONS = {'left': 1, 'right': 3}
+
+    def __init__(self, display_name=None):
+        from Xlib import X, display
+        from Xlib.ext import xtest
+        self.X = X
+        self.xtest = xtest
+        self.display = display.Display(display_name)
+        if not self.display.has_extension('XTEST'):
+            self.display.close()
+            raise OSError("Estensione XTEST non disponibile")
+        self.root = self.display.screen().root
+
+    def move_relative(self, dx, dy):
+        self.xtest.fake_input(self.display, self.X.MotionNotify, detail=True, x=dx, y=dy)
+        self.display.flush()
+
+    def move_to(self, x, y):
+        self.xtest.fake_input(self.display, self.X.MotionNotify, x=x, y=y)
+        self.display.flush()
+
+    def position(self):
+        pointer = self.root.query_pointer()
+        return (pointer.root_x, pointer.root_y)
+
+    def screen_size(self):
+        screen = self.display.screen()
+        return (screen.width_in_pixels, screen.height_in_pixels)
+
+    def click(self, button='left'):
+        code = self.BUTTONS[button]
+        self.xtest.fake_input(self.display, self.X.ButtonPress, code)
+        self.xtest.fake_input(self.display, self.X.ButtonRelease, code)
+        self.display.flush()
+
+    def scroll(self, amount):
+        # Pulsanti 4 (su) e 5 (giù), un clic per unità
+        code = 4 if amount > 0 else 5
+        for _ in range(abs(int(amount))):
+            self.xtest.fake_input(self.display, self.X.ButtonPress, code)
+            self.xtest.fake_input(self.display, self.X.ButtonRelease, code)
+        self.display.flush()
+
+    def close(self):
+        if self.display is not None:
+            self.display.close()
+            self.display = None
+
+
+# Costanti di linux/input-event-codes.h e linux/uinput.h
+EV_SYN, EV_KEY, EV_REL = 0x00, 0x01, 0x02
+SYN_REPORT = 0
+REL_X, REL_Y, REL_WHEEL = 0x00, 0x01, 0x08
+BTN_LEFT, BTN_RIGHT = 0x110, 0x111
+BUS_USB = 0x03
+UI_SET_EVBIT = 0x40045564
+UI_SET_KEYBIT = 0x40045565
+UI_SET_RELBIT = 0x40045566
+UI_DEV_CREATE = 0x5501
+UI_DEV_DESTROY = 0x5502
+INPUT_EVENT = struct.Struct('llHHi') # struct input_event: timeval, type, code, value
+UINPUT_USER_DEV = struct.Struct('80sHHHHi' + '64i' * 4)
+
+
+class UinputBackend(BasePointerBackend):
+    """
+    Mouse virtuale del kernel Linux scrivendo su /dev/uinput (servono i
+    permessi di scrittura sul device). Ogni operazione è un solo write() con
+    tutti gli eventi e il SYN_REPORT. Solo movimenti relativi: il kernel non
+    conosce la posizione del cursore.
+    """
+    name = BACKEND_UINPUT
+    BUTTONS = {'left': BTN_LEFT, 'right': BTN_RIGHT}
+
+    def __init__(self, path='/dev/uinput', device_name=b'headmouse-virtual-pointer'):
+        self.fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            fcntl.ioctl(self.fd, UI_SET_EVBIT, EV_KEY)
+            fcntl.ioctl(self.fd, UI_SET_EVBIT, EV_REL)
+            for code in (BTN_LEFT, BTN_RIGHT):
+                fcntl.ioctl(self.fd, UI_SET_KEYBIT, code)
+            for code in (REL_X, REL_Y, REL_WHEEL):
+                fcntl.ioctl(self.fd, UI_SET_RELBIT, code)
+            zeros = (0,) * 256
+            os.write(self.fd, UINPUT_USER_DEV.pack(device_name, BUS_USB, 0x1209, 0x0001, 1, 0, *zeros))
+            fcntl.ioctl(self.fd, UI_DEV_CREATE)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def _emit(self, *events):
+        data = b''.join(INPUT_EVENT.pack(0, 0, ev_type, code, value) for ev_type, code, value in events)
+        os.write(self.fd, data + INPUT_EVENT.pack(0, 0, EV_SYN, SYN_REPORT, 0))
+
+    def move_relative(self, dx, dy):
+        self._emit((EV_REL, REL_X, int(dx)), (EV_REL, REL_Y, int(dy)))
+
+    def click(self, button='left'):
+        code = self.BUTTONS[button]
+        self._emit((EV_KEY, code, 1))
+        self._emit((EV_KEY, code, 0))
+
+    def scroll(self, amount):
+        self._emit((EV_REL, REL_WHEEL, int(amount)))
+
+    def close(self):
+        if self.fd is not None:
+            fd, self.fd = self.fd, None
+            try:
+                fcntl.ioctl(fd, UI_DEV_DESTROY)
+            finally:
+                os.close(fd)
+
+
+BACKENDS = {
+    BACKEND_UINPUT: UinputBackend,
+    BACKEND_XTEST: XTestBackend,
+    BACKEND_PYNPUT: PynputBackend,
+    BACKEND_PYAUTOGUI: PyAutoGuiBackend,
+    BACKEND_NULL: NullBackend,
+}
+
+
+def create_backend(kind):
+    """Crea il backend indicato; ImportError/OSError se non è disponibile qui"""
+    if kind not in BACKENDS:
+        raise ValueError(f"Backend sconosciuto: {kind}")
+    return BACKENDS[kind]()
+
+
+def best_available_backend(order=BACKEND_ORDER, require_absolute=False):
+    """Primo backend che si riesce ad aprire (con require_absolute salta quelli senza move_to)"""
+    for kind in order:
+        if require_absolute and kind == BACKEND_UINPUT:
+            continue
+        try:
+            return create_backend(kind)
+        except Exception as e: # Modulo mancante, nessun display, permessi su /dev/uinput...
+            print(f"Backend {kind} non disponibile: {e}")
+    return NullBackend(record=False)
+
+
+def benchmark(backend, calls=500):
+    """Latenza per chiamata di move_relative (avanti e indietro, il cursore non si sposta)"""
+    samples = []
+    for i in range(calls):
+        step = 1 if i % 2 == 0 else -1
+        start = time.perf_counter()
+        backend.move_relative(step, 0)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+
+    def percentile(p):
+        return samples[min(int(p * len(samples)), len(samples) - 1)] * 1e6
+
+    return {'calls': calls, 'p50_us': percentile(0.5), 'p95_us': percentile(0.95),
+            'p99_us': percentile(0.99), 'max_us': samples[-1] * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend del puntatore del sistema operativo")
+    parser.add_argument('--benchmark', action='store_true', help="misura la latenza per chiamata")
+    parser.add_argument('--backend', action='append', choices=sorted(BACKENDS),
+                        help="backend da provare (ripetibile, default: tutti)")
+    parser.add_argument('--calls', type=int, default=500)
+    args = parser.parse_args()
+
+    kinds = args.backend or list(BACKEND_ORDER) + [BACKEND_NULL]
+    if not args.benchmark:
+        backend = best_available_backend(kinds)
+        print(f"Backend scelto: {backend.name}")
+        backend.close()
+        return 0
+
+    for kind in kinds:
+        try:
+            backend = create_backend(kind)
+        except Exception as e:
+            print(f"{kind:10s} non disponibile: {e}")
+            continue
+        try:
+            result = benchmark(backend, args.calls)
+        finally:
+            backend.close()
+        print(f"{kind:10s} p50 {result['p50_us']:8.1f} us  p95 {result['p95_us']:8.1f} us  "
+              f"p99 {result['p99_us']:8.1f} us  max {result['max_us']:8.1f} us  ({result['calls']} chiamate)")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
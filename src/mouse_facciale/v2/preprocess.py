@@ -0,0 +1,36 @@
+import cv2
+import numpy as np
+
+SLOT_FULL = 'full'
+SLOT_ROI = 'roi'
+
+
+class RgbConverter:
+    """
+    Conversione BGR -> RGB in buffer preallocati e riutilizzati.
+
+    cv2.cvtColor senza dst alloca un'immagine nuova ad ogni frame; qui il
+    risultato viene scritto in un buffer per slot, marcato read-only così
+    MediaPipe lo usa senza copiarlo. Lo slot SLOT_FULL (frame intero) resta
+    allocato per tutta la sessione; SLOT_ROI (regione del viso di
+    FaceRoiTracker) viene sostituito solo quando la regione cambia dimensione.
+    Il buffer restituito vale fino alla conversione successiva nello stesso
+    slot: face_mesh.process() è sincrono, quindi non serve copiarlo.
+    """
+    def __init__(self):
+        self.buffers = {} # slot -> buffer RGB
+        self.allocations = 0
+
+    def convert(self, frame, slot=SLOT_FULL):
+        """Converte il frame (o una sua vista ritagliata) e restituisce il buffer RGB read-only"""
+        shape = frame.shape[:2] + (3,)
+        buffer = self.buffers.get(slot)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            self.buffers[slot] = buffer
+            self.allocations += 1
+
+        buffer.flags.writeable = True
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buffer)
+        buffer.flags.writeable = False
+        return buffer
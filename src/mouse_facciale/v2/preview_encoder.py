@@ -0,0 +1,63 @@
+import time
+
+import cv2
+
+
+class PreviewEncoder:
+    """
+    Codifica JPEG dell'anteprima web, separata dal tracking.
+
+    - scale riduce la risoluzione prima della codifica (0.5 = 320x240 da 640x480)
+    - max_fps limita i frame di anteprima indipendentemente dagli FPS del tracking
+    - senza client collegati non codifica nulla
+    - se la codifica supera encode_budget_ms la qualità scende a passi di
+      quality_step fino a min_quality, e risale quando torna sotto metà budget:
+      sul Pi la codifica JPEG compete con FaceMesh per gli stessi core.
+    """
+    def __init__(self, scale=0.5, quality=70, max_fps=15.0, min_quality=40,
+                 encode_budget_ms=8.0, quality_step=5):
+        self.scale = scale
+        self.max_quality = quality
+        self.quality = quality
+        self.min_quality = min_quality
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.encode_budget_ms = encode_budget_ms
+        self.quality_step = quality_step
+        self.last_encode_time = 0.0
+        self.encoded_frames = 0
+        self.skipped_frames = 0
+
+    def is_due(self, has_clients=True):
+        """True se il prossimo encode() codificherà: l'anteprima va preparata (specchiata, disegnata) solo allora"""
+        return has_clients and time.monotonic() - self.last_encode_time >= self.min_interval
+
+    def encode(self, frame, has_clients=True):
+        """Restituisce i byte JPEG del frame, oppure None se la codifica viene saltata"""
+        now = time.monotonic()
+        if not has_clients or now - self.last_encode_time < self.min_interval:
+            self.skipped_frames += 1
+            return None
+        self.last_encode_time = now
+
+        if self.scale != 1.0:
+            frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ret:
+            return None
+        self.encoded_frames += 1
+        self._adapt_quality((time.monotonic() - now) * 1000.0)
+        return buffer.tobytes()
+
+    def _adapt_quality(self, elapsed_ms):
+        if elapsed_ms > self.encode_budget_ms and self.quality > self.min_quality:
+            self.quality = max(self.min_quality, self.quality - self.quality_step)
+        elif elapsed_ms < self.encode_budget_ms / 2 and self.quality < self.max_quality:
+            self.quality = min(self.max_quality, self.quality + self.quality_step)
+
+    def get_stats(self):
+        return {
+            'quality': self.quality,
+            'scale': self.scale,
+            'encoded': self.encoded_frames,
+            'skipped': self.skipped_frames,
+        }
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import numpy as np
+
+# Fasi del loop di elaborazione di un frame, nell'ordine in cui avvengono
+# ('capture' è la lettura dalla webcam, 'wait' l'attesa del frame nel loop di visione)
+PIPELINE_STAGES = ('capture', 'wait', 'preprocess', 'facemesh', 'landmarks', 'actions', 'events', 'transmit')
+
+
+class StageProfiler:
+    """
+    Tempi per fase del loop (orologio monotono perf_counter) in memoria fissa.
+
+    La profilazione si disattiva non creando il profiler: chi lo usa tiene
+    profiler = None e controlla `if profiler is not None` prima di misurare,
+    così senza profilazione il loop non chiama nemmeno perf_counter.
+
+    Ogni fase ha un ring buffer numpy degli ultimi `window` campioni in
+    millisecondi: i percentili (p50/p95/p99) vengono calcolati solo quando si
+    chiede il riepilogo, mai nel loop. Uso tipico:
+
+        start = profiler.start()
+        results = face_mesh.process(rgb_frame)
+        profiler.record('facemesh', start)
+
+    Può essere condiviso tra thread (il writer del trasmettitore registra
+    'transmit' mentre il loop di visione registra le altre fasi): le scritture
+    nei ring buffer e la lettura del riepilogo sono protette da un lock.
+    """
+    def __init__(self, stages=PIPELINE_STAGES, window=512):
+        self.stages = tuple(stages)
+        self.window = window
+        self.stage_slots = {stage: slot for slot, stage in enumerate(self.stages)}
+        self.samples = np.zeros((len(self.stages), window), dtype=np.float64)
+        self.positions = np.zeros(len(self.stages), dtype=np.intp)
+        self.counts = np.zeros(len(self.stages), dtype=np.int64)
+        self.frame_times = np.zeros(window, dtype=np.float64) # istanti di fine frame
+        self.frame_pos = 0
+        self.frame_count = 0
+        self.cached_summary = None
+        self.cached_summary_time = 0.0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def start():
+        return time.perf_counter()
+
+    def record(self, stage, start):
+        """Registra il tempo trascorso da start per la fase indicata"""
+        self.add_sample(stage, (time.perf_counter() - start) * 1000.0)
+
+    def add_sample(self, stage, elapsed_ms):
+        slot = self.stage_slots[stage]
+        with self.lock:
+            self.samples[slot, self.positions[slot]] = elapsed_ms
+            self.positions[slot] = (self.positions[slot] + 1) % self.window
+            self.counts[slot] += 1
+
+    def frame_done(self):
+        """Segna la fine di un frame (per il calcolo degli FPS)"""
+        self.frame_times[self.frame_pos] = time.perf_counter()
+        self.frame_pos = (self.frame_pos + 1) % self.window
+        self.frame_count += 1
+
+    def get_fps(self):
+        """FPS medi sugli ultimi frame della finestra"""
+        filled = min(self.frame_count, self.window)
+        if filled < 2:
+            return 0.0
+        newest = self.frame_times[(self.frame_pos - 1) % self.window]
+        oldest = self.frame_times[(self.frame_pos - filled) % self.window]
+        return (filled - 1) / (newest - oldest) if newest > oldest else 0.0
+
+    def get_summary(self):
+        """{fase: {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}} più gli FPS"""
+        with self.lock:
+            samples = self.samples.copy()
+            counts = self.counts.copy()
+        summary = {}
+        for stage, slot in self.stage_slots.items():
+            filled = min(int(counts[slot]), self.window)
+            if filled == 0:
+                continue
+            values = samples[slot, :filled]
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            summary[stage] = {
+                'count': int(counts[slot]),
+                'mean_ms': float(values.mean()),
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'p99_ms': float(p99),
+                'max_ms': float(values.max()),
+            }
+        return {'stages': summary, 'fps': self.get_fps(), 'frames': self.frame_count}
+
+    def get_cached_summary(self, max_age=1.0):
+        """Riepilogo ricalcolato al massimo ogni max_age secondi (per overlay e /status)"""
+        now = time.monotonic()
+        if self.cached_summary is None or now - self.cached_summary_time >= max_age:
+            self.cached_summary = self.get_summary()
+            self.cached_summary_time = now
+        return self.cached_summary
+
+    def reset(self):
+        with self.lock:
+            self.positions[:] = 0
+            self.counts[:] = 0
+        self.frame_pos = 0
+        self.frame_count = 0
+        self.cached_summary = None
+
+
+def format_summary(summary):
+    """Tabella testuale del riepilogo per la console"""
+    lines = [f"{'fase':<10} {'n':>7} {'media':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)"]
+    for stage, stats in summary['stages'].items():
+        lines.append(f"{stage:<10} {stats['count']:>7} {stats['mean_ms']:>8.3f} {stats['p50_ms']:>8.3f} "
+                     f"{stats['p95_ms']:>8.3f} {stats['p99_ms']:>8.3f} {stats['max_ms']:>8.3f}")
+    lines.append(f"frame: {summary['frames']} | FPS: {summary['fps']:.1f}")
+    return "\n".join(lines)
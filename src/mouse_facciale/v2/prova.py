@@ -9,11 +9,23 @@ import json
 import os
 from flask import Flask, Response, render_template_string, request, jsonify
 import signal
-import pyautogui
 import atexit
 
+from landmarks import LandmarkAdapter
+from face_roi import FaceRoiTracker
+from frame_broadcaster import FrameBroadcaster
+from command_queue import CommandQueue
+from config_store import ConfigStore
+from pointer_backends import create_backend, best_available_backend
+from async_server import AsyncWebApp, AsyncFanout, mjpeg_stream, run as run_async
+
 # Constants
 CONFIG_FILE = '/tmp/headmouse_config.json'
+# OS pointer output: uinput, xtest, pynput, pyautogui, null (empty = cheapest available)
+POINTER_BACKEND = os.environ.get('HEADMOUSE_POINTER_BACKEND', '')
+# Screen size as WIDTHxHEIGHT (empty = ask the pointer backend)
+SCREEN_SIZE = os.environ.get('HEADMOUSE_SCREEN_SIZE', '')
+DEFAULT_SCREEN_SIZE = (1920, 1080)
 DEFAULT_CONFIG = {
     "sensitivity": 4.0,
     "scroll_sensitivity": 2.0,
@@ -207,16 +219,22 @@ class SwitchModeAction(BaseAction):
 
 class MouseCursorAction(BaseAction):
     """Class to translate nose movement to cursor movement"""
-    def __init__(self, screen_w, screen_h, sensitivity=4.0):
+    def __init__(self, pointer, screen_w, screen_h, sensitivity=4.0):
+        self.pointer = pointer
         self.screen_w = screen_w
         self.screen_h = screen_h
         self.base_sensitivity = sensitivity
         self.position_history = deque(maxlen=5)
+        # Sub-pixel movement not sent yet, carried to the next frame
+        self.residual_x = 0.0
+        self.residual_y = 0.0
         self.mouse_lock = threading.Lock()
     
     def update_position(self, direction, acceleration_factor, effective_distance):
         """Update cursor position"""
         if direction is None:
+            # Inside the deadzone: the leftover fraction must not move the cursor later
+            self.residual_x = self.residual_y = 0.0
             return
 
         movement = direction * self.base_sensitivity * acceleration_factor * effective_distance * 0.1
@@ -229,11 +247,25 @@ class MouseCursorAction(BaseAction):
 
         with self.mouse_lock:
             try:
-                current_pos = np.array(pyautogui.position())
-                new_pos = current_pos + smoothed_movement
-                new_pos[0] = np.clip(new_pos[0], 0, self.screen_w - 1)
-                new_pos[1] = np.clip(new_pos[1], 0, self.screen_h - 1)
-                pyautogui.moveTo(int(new_pos[0]), int(new_pos[1]))
+                # Send the whole pixels, keep the fraction for the next frame
+                self.residual_x += smoothed_movement[0]
+                self.residual_y += smoothed_movement[1]
+                move_x, move_y = int(self.residual_x), int(self.residual_y)
+                self.residual_x -= move_x
+                self.residual_y -= move_y
+                current_pos = self.pointer.position()
+                if current_pos is not None:
+                    # Keep the cursor on screen (uinput has no position, the OS clamps it)
+                    clamped_x = int(np.clip(current_pos[0] + move_x, 0, self.screen_w - 1)) - current_pos[0]
+                    clamped_y = int(np.clip(current_pos[1] + move_y, 0, self.screen_h - 1)) - current_pos[1]
+                    # Against an edge the fraction would only push into it
+                    if clamped_x != move_x:
+                        self.residual_x = 0.0
+                    if clamped_y != move_y:
+                        self.residual_y = 0.0
+                    move_x, move_y = clamped_x, clamped_y
+                if move_x or move_y:
+                    self.pointer.move_relative(move_x, move_y)
             except Exception as e:
                 print(f"Mouse movement error: {e}")
     
@@ -248,7 +280,8 @@ class MouseCursorAction(BaseAction):
 
 class ScrollAction(BaseAction):
     """Class to perform scrolling"""
-    def __init__(self, scroll_cooldown=0.03, sensitivity=2.0):
+    def __init__(self, pointer, scroll_cooldown=0.03, sensitivity=2.0):
+        self.pointer = pointer
         self.scroll_cooldown = scroll_cooldown
         self.last_scroll_time = 0
         self.scroll_lock = threading.Lock()
@@ -269,7 +302,7 @@ class ScrollAction(BaseAction):
                 
                 scroll_value = int(smoothed_scroll)
                 if abs(scroll_value) > 0:
-                    pyautogui.scroll(scroll_value)
+                    self.pointer.scroll(scroll_value)
                     self.last_scroll_time = current_time
                     return True
         except Exception as e:
@@ -339,7 +372,8 @@ class LeftEyeEvent(BaseEvent):
 
 class LeftClickAction(BaseAction):
     """Class to perform left click"""
-    def __init__(self, click_cooldown=0.5):
+    def __init__(self, pointer, click_cooldown=0.5):
+        self.pointer = pointer
         self.click_cooldown = click_cooldown
         self.last_click_time = 0
         self.mouse_lock = threading.Lock()
@@ -352,7 +386,7 @@ class LeftClickAction(BaseAction):
         
         try:
             with self.mouse_lock:
-                pyautogui.click(button='left')
+                self.pointer.click('left')
                 print("LEFT click")
                 self.last_click_time = current_time
                 return True
@@ -418,7 +452,8 @@ class RightEyeEvent(BaseEvent):
 
 class RightClickAction(BaseAction):
     """Class to perform right click"""
-    def __init__(self, click_cooldown=0.5):
+    def __init__(self, pointer, click_cooldown=0.5):
+        self.pointer = pointer
         self.click_cooldown = click_cooldown
         self.last_click_time = 0
         self.mouse_lock = threading.Lock()
@@ -431,7 +466,7 @@ class RightClickAction(BaseAction):
         
         try:
             with self.mouse_lock:
-                pyautogui.click(button='right')
+                self.pointer.click('right')
                 print("RIGHT click")
                 self.last_click_time = current_time
                 return True
@@ -454,19 +489,18 @@ class HeadMouseController:
             min_tracking_confidence=0.8
         )
 
-        # PyAutoGUI setup
-        import pyautogui
-        self.pyautogui = pyautogui
-        pyautogui.FAILSAFE = False
-        self.screen_w, self.screen_h = pyautogui.size()
+        # OS pointer output and screen size (uinput and null need no display library)
+        self.pointer = self.open_pointer_backend(POINTER_BACKEND)
+        self.screen_w, self.screen_h = self.get_screen_size()
         
         # Landmark indices
         self.NOSE_TIP = 4
         self.UPPER_LIP = 13
         self.LOWER_LIP = 14
         
-        # Load configuration
-        self.config = self.load_config()
+        # Load configuration (kept in memory, saved to disk in the background)
+        self.config_store = ConfigStore(CONFIG_FILE, DEFAULT_CONFIG)
+        self.ensure_switch_mode_mapping()
         
         # Initialize components with config values
         self.calibration = CalibrationAction()
@@ -475,11 +509,13 @@ class HeadMouseController:
             max_acceleration_distance=self.config['max_acceleration_distance']
         )
         self.mouse_cursor = MouseCursorAction(
+            self.pointer,
             self.screen_w, 
             self.screen_h,
             sensitivity=self.config['sensitivity']
         )
         self.scroll_action = ScrollAction(
+            self.pointer,
             sensitivity=self.config['scroll_sensitivity']
         )
         self.open_mouth_event = OpenMouthEvent(
@@ -488,10 +524,21 @@ class HeadMouseController:
             threshold=self.config['open_mouth_threshold']
         )
         self.switch_mode_action = SwitchModeAction()
+
+        # Landmark conversion: only nose, lips and eye top/bottom are needed
+        # Frames are not flipped before FaceMesh: the mirror is applied to the landmarks
+        self.landmark_adapter = LandmarkAdapter([
+            self.NOSE_TIP, self.UPPER_LIP, self.LOWER_LIP,
+            159, 145, 386, 374
+        ], mirror=True)
+        # FaceMesh only on the region around the last detected face
+        self.roi_tracker = FaceRoiTracker()
         
         # Event-action mappings
         self.event_action_mappings = []
+        self.event_bindings = []  # (event, [mappings]) evaluated by process_events
         self.setup_event_action_mappings()
+        self.config_store.add_listener(self.on_config_changed)
         
         # Application state
         self.show_window = show_window
@@ -499,80 +546,168 @@ class HeadMouseController:
         self.current_mode = 'pointer'
         self.last_mouse_pos_before_scroll = None
         self.streaming = False
-        self.frame_lock = threading.Lock()
-        self.current_frame = None
-    
-    def load_config(self):
-        """Load configuration from file or create default"""
-        try:
-            if os.path.exists(CONFIG_FILE):
-                with open(CONFIG_FILE, 'r') as f:
-                    config = json.load(f)
-                    # Merge with default to ensure all keys exist
-                    for key, value in DEFAULT_CONFIG.items():
-                        if key not in config:
-                            config[key] = value
-                    return config
-        except Exception as e:
-            print(f"Error loading config: {e}")
-        
-        # Return default if file doesn't exist or error
-        return DEFAULT_CONFIG.copy()
-    
-    def save_config(self):
-        """Save current configuration to file"""
-        try:
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(self.config, f, indent=2)
-            return True
-        except Exception as e:
-            print(f"Error saving config: {e}")
-            return False
+        # Latest encoded frame, shared by every /video_feed client
+        self.broadcaster = FrameBroadcaster()
+        # Web commands, applied by the video loop between two frames
+        self.command_queue = CommandQueue({
+            'pause': self.toggle_pause,
+            'reset_calibration': self.calibration.reset_calibration,
+            'update_config': self.update_config,
+            'update_mapping': self.update_mapping,
+        })
     
+    @staticmethod
+    def open_pointer_backend(kind):
+        """Open the requested pointer backend, falling back to the cheapest available one"""
+        if kind:
+            try:
+                return create_backend(kind)
+            except Exception as e:
+                print(f"Pointer backend {kind} unavailable ({e}), using the best available one")
+        pointer = best_available_backend()
+        print(f"Pointer backend: {pointer.name}")
+        return pointer
+
+    def get_screen_size(self):
+        """Screen size from HEADMOUSE_SCREEN_SIZE, else from the pointer backend, else a default"""
+        if SCREEN_SIZE:
+            width, height = SCREEN_SIZE.lower().split('x')
+            return int(width), int(height)
+        size = self.pointer.screen_size()
+        if size is None:
+            print(f"Pointer backend {self.pointer.name} does not report the screen size, "
+                  f"assuming {DEFAULT_SCREEN_SIZE[0]}x{DEFAULT_SCREEN_SIZE[1]}")
+            return DEFAULT_SCREEN_SIZE
+        return size
+
+    @property
+    def config(self):
+        """Current configuration (read-only snapshot, change it with update_config)"""
+        return self.config_store.snapshot()
+
+    def ensure_switch_mode_mapping(self):
+        """Add the default switch_mode mapping to configs saved before mode switching was mappable"""
+        mappings = self.config['event_action_mappings']
+        if any(mapping['action_type'] == 'switch_mode' for mapping in mappings):
+            return
+        default = next(mapping for mapping in DEFAULT_CONFIG['event_action_mappings']
+                       if mapping['action_type'] == 'switch_mode')
+        print(f"No mode switch mapping in the config, adding {default['event_type']} -> switch_mode")
+        self.config_store.update(event_action_mappings=mappings + [default])
+
+    def on_config_changed(self, changed, config):
+        """Apply only the settings that changed to the live components"""
+        if 'sensitivity' in changed:
+            self.mouse_cursor.base_sensitivity = config['sensitivity']
+        if 'scroll_sensitivity' in changed:
+            self.scroll_action.scroll_sensitivity = config['scroll_sensitivity']
+        if 'deadzone_radius' in changed:
+            self.nose_joystick.deadzone_radius = config['deadzone_radius']
+        if 'max_acceleration_distance' in changed:
+            self.nose_joystick.max_acceleration_distance = config['max_acceleration_distance']
+        if 'open_mouth_threshold' in changed:
+            self.open_mouth_event.open_threshold = config['open_mouth_threshold']
+        if 'event_action_mappings' in changed:
+            self.setup_event_action_mappings()
+        # After the rebuild: reused detectors must get the new threshold too
+        if 'blink_threshold' in changed:
+            for event, _ in self.event_bindings:
+                if isinstance(event, (LeftEyeEvent, RightEyeEvent)):
+                    event.blink_threshold = config['blink_threshold']
+
+    def create_event(self, event_type):
+        """Create the event detector for an event type (None if unknown)"""
+        if event_type == 'left_eye_blink':
+            return LeftEyeEvent(threshold=self.config['blink_threshold'])
+        elif event_type == 'right_eye_blink':
+            return RightEyeEvent(threshold=self.config['blink_threshold'])
+        elif event_type == 'open_mouth':
+            return self.open_mouth_event
+        return None
+
+    def create_action(self, action_type):
+        """Create the action for an action type (None if unknown)"""
+        if action_type == 'left_click':
+            return LeftClickAction(self.pointer)
+        elif action_type == 'right_click':
+            return RightClickAction(self.pointer)
+        elif action_type == 'switch_mode':
+            return self.switch_mode_action
+        return None
+
     def setup_event_action_mappings(self):
-        """Setup event-action mappings based on config"""
-        self.event_action_mappings = []
-        
-        for mapping in self.config['event_action_mappings']:
-            event = None
-            action = None
-            
-            # Create event instance
-            if mapping['event_type'] == 'left_eye_blink':
-                event = LeftEyeEvent(threshold=self.config['blink_threshold'])
-            elif mapping['event_type'] == 'right_eye_blink':
-                event = RightEyeEvent(threshold=self.config['blink_threshold'])
-            elif mapping['event_type'] == 'open_mouth':
-                event = self.open_mouth_event
-            
-            # Create action instance
-            if mapping['action_type'] == 'left_click':
-                action = LeftClickAction()
-            elif mapping['action_type'] == 'right_click':
-                action = RightClickAction()
-            elif mapping['action_type'] == 'switch_mode':
-                action = self.switch_mode_action
-            
+        """Setup event-action mappings based on config, reusing the unchanged ones"""
+        # Current table keyed by (event_type, action_type): entries still in the
+        # config keep their detector, with its history and gesture state
+        current = {}
+        # One detector per event type, shared by every action bound to it
+        detectors = {}
+        for mapping in self.event_action_mappings:
+            current.setdefault((mapping['event_type'], mapping['action_type']), []).append(mapping)
+            detectors.setdefault(mapping['event_type'], mapping['event'])
+
+        mappings = []
+        created = 0
+        for entry in self.config['event_action_mappings']:
+            key = (entry['event_type'], entry['action_type'])
+            if current.get(key):
+                mappings.append(current[key].pop(0))
+                continue
+
+            event = detectors.get(entry['event_type']) or self.create_event(entry['event_type'])
+            action = self.create_action(entry['action_type'])
             if event and action:
-                self.event_action_mappings.append({
+                mappings.append({
                     'event': event,
                     'action': action,
-                    'event_type': mapping['event_type'],
-                    'action_type': mapping['action_type']
+                    'event_type': entry['event_type'],
+                    'action_type': entry['action_type']
                 })
+                detectors.setdefault(entry['event_type'], event)
+                created += 1
+
+        # Group the mappings by detector: each event is evaluated once per frame
+        # and its result fanned out to all its actions
+        bindings = {}
+        for mapping in mappings:
+            bindings.setdefault(mapping['event_type'], (mapping['event'], []))[1].append(mapping)
+
+        # Swap the whole table at once (config changes are applied between frames)
+        self.event_action_mappings = mappings
+        self.event_bindings = list(bindings.values())
+        return created
     
     def update_config(self, new_config):
-        """Update configuration and reload mappings"""
-        self.config.update(new_config)
-        if self.save_config():
-            self.setup_event_action_mappings()
-            return True
-        return False
+        """Update configuration; only the changed settings are applied, the file is saved later"""
+        self.config_store.update(new_config)
+        return True
     
+    def update_mapping(self, index, event_type, action_type):
+        """Change one event-action mapping"""
+        mappings = [dict(mapping) for mapping in self.config['event_action_mappings']]
+        if not 0 <= index < len(mappings):
+            raise ValueError('Invalid mapping index')
+        mappings[index]['event_type'] = event_type
+        mappings[index]['action_type'] = action_type
+        self.config_store.update(event_action_mappings=mappings)
+        return True
+
+    def switch_mode(self):
+        """Switch between pointer and scroll mode (respecting the action cooldown)"""
+        old_mode = self.current_mode
+        new_mode = self.switch_mode_action.execute(self.current_mode)
+        if new_mode != old_mode:
+            self.current_mode = new_mode
+            if self.current_mode == 'scroll':
+                print("Switched to SCROLL mode")
+            elif self.current_mode == 'pointer':
+                print("Switched to POINTER mode")
+
     def toggle_pause(self):
         """Toggle pause state"""
         self.paused = not self.paused
         print(f"Application {'paused' if self.paused else 'resumed'}")
+        return self.paused
     
     def process_nose_movement(self, tracking_point):
         """Process nose movement"""
@@ -594,24 +729,20 @@ class HeadMouseController:
         if self.paused or not self.calibration.center_calculated:
             return
 
-        # Handle mode switching
-        if self.open_mouth_event.check_event(landmarks):
-            old_mode = self.current_mode
-            new_mode = self.switch_mode_action.execute(self.current_mode)
-            if new_mode != old_mode:
-                self.current_mode = new_mode
-                if self.current_mode == 'scroll':
-                    print("Switched to SCROLL mode")
-                elif self.current_mode == 'pointer':
-                    print("Switched to POINTER mode")
-
-        # Process mode-specific events
-        if self.current_mode == 'pointer':
-            for mapping in self.event_action_mappings:
-                if isinstance(mapping['event'], (LeftEyeEvent, RightEyeEvent)):
-                    if mapping['event'].check_event(landmarks):
-                        mapping['action'].execute()
-        elif self.current_mode == 'scroll':
+        # Each distinct event is checked exactly once, in every mode, so its
+        # history and timing state advance one step per frame
+        mode = self.current_mode
+        for event, mappings in self.event_bindings:
+            if not event.check_event(landmarks):
+                continue
+            for mapping in mappings:
+                if mapping['action_type'] == 'switch_mode':
+                    self.switch_mode()
+                elif mode == 'pointer':
+                    # Clicks only in pointer mode
+                    mapping['action'].execute()
+
+        if self.current_mode == 'scroll':
             direction, _, effective_distance = self.nose_joystick.get_movement_vector(
                 tracking_point, self.calibration.center_position
             )
@@ -698,14 +829,20 @@ class HeadMouseController:
                     print("Failed to read frame")
                     continue
 
-                frame = cv2.flip(frame, 1)
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results = self.face_mesh.process(rgb_frame)
+                # Apply web commands at the frame boundary
+                self.command_queue.apply_pending()
+
+                results = self.roi_tracker.process(self.face_mesh, frame)
+                frame_w = frame.shape[1]
+                # The preview is only mirrored when someone sees it (window or stream client)
+                render = self.show_window or self.broadcaster.has_clients()
+                if render:
+                    frame = cv2.flip(frame, 1)
 
                 if results.multi_face_landmarks:
                     face_landmarks = results.multi_face_landmarks[0]
-                    h, w = frame.shape[:2]
-                    landmarks_np = np.array([[lm.x * w, lm.y * h] for lm in face_landmarks.landmark], dtype=np.float64)
+                    x0, y0, region_w, region_h = self.roi_tracker.region
+                    landmarks_np = self.landmark_adapter.update(face_landmarks, region_w, region_h, (x0, y0), frame_w)
 
                     tracking_point = landmarks_np[self.NOSE_TIP]
                     
@@ -721,9 +858,10 @@ class HeadMouseController:
                                     cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
                 
                 # Update frame for streaming
-                with self.frame_lock:
+                if render:
                     ret, jpeg = cv2.imencode('.jpg', frame)
-                    self.current_frame = jpeg.tobytes()
+                    if ret:
+                        self.broadcaster.publish(jpeg.tobytes())
                 
                 if self.show_window:
                     cv2.imshow('Head Mouse Controller', frame)
@@ -736,21 +874,17 @@ class HeadMouseController:
                     elif key == ord('+'):  # +
                         if self.current_mode == 'pointer':
                             self.mouse_cursor.adjust_sensitivity(0.2)
-                            self.config['sensitivity'] = self.mouse_cursor.base_sensitivity
-                            self.save_config()
+                            self.config_store.update(sensitivity=float(self.mouse_cursor.base_sensitivity))
                         else:
                             self.scroll_action.adjust_sensitivity(0.5)
-                            self.config['scroll_sensitivity'] = self.scroll_action.scroll_sensitivity
-                            self.save_config()
+                            self.config_store.update(scroll_sensitivity=float(self.scroll_action.scroll_sensitivity))
                     elif key == ord('-'):  # -
                         if self.current_mode == 'pointer':
                             self.mouse_cursor.adjust_sensitivity(-0.2)
-                            self.config['sensitivity'] = self.mouse_cursor.base_sensitivity
-                            self.save_config()
+                            self.config_store.update(sensitivity=float(self.mouse_cursor.base_sensitivity))
                         else:
                             self.scroll_action.adjust_sensitivity(-0.5)
-                            self.config['scroll_sensitivity'] = self.scroll_action.scroll_sensitivity
-                            self.save_config()
+                            self.config_store.update(scroll_sensitivity=float(self.scroll_action.scroll_sensitivity))
                     elif key == ord('r'):  # R
                         self.calibration.reset_calibration()
                 else:
@@ -765,17 +899,15 @@ class HeadMouseController:
                 cv2.destroyAllWindows()
 
     def generate_frames(self):
-        """Generate frames for web streaming"""
-        while self.streaming:
-            with self.frame_lock:
-                if self.current_frame is not None:
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + self.current_frame + b'\r\n')
-            time.sleep(0.05)
+        """Generate frames for web streaming (woken by each new frame, no polling)"""
+        return self.broadcaster.stream()
 
     def cleanup(self):
         """Clean up resources"""
         self.streaming = False
+        self.broadcaster.close()
+        self.config_store.close()
+        self.pointer.close()
         print("Controller cleaned up")
 
 # Web Server
@@ -895,9 +1027,11 @@ INDEX_TEMPLATE = """
                 },
                 body: JSON.stringify(data)
             })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
+            .then(response => response.json().then(data => ({ pending: response.status === 202, data })))
+            .then(({ pending, data }) => {
+                if (pending) {
+                    alert('Configuration queued, it will be applied on the next frame');
+                } else if (data.success) {
                     alert('Configuration saved successfully!');
                 } else {
                     alert('Error saving configuration: ' + data.message);
@@ -922,9 +1056,11 @@ INDEX_TEMPLATE = """
                 },
                 body: JSON.stringify(mapping)
             })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
+            .then(response => response.json().then(data => ({ pending: response.status === 202, data })))
+            .then(({ pending, data }) => {
+                if (pending) {
+                    alert('Mapping queued, it will be applied on the next frame');
+                } else if (data.success) {
                     alert('Mapping updated successfully!');
                 } else {
                     alert('Error updating mapping: ' + data.message);
@@ -947,17 +1083,36 @@ def video_feed():
     return Response(controller.generate_frames(),
                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
+COMMAND_WAIT = 0.5  # seconds a request waits for the video loop before answering 202
+
+def run_command(name, *args):
+    """Enqueue a command for the video loop; answer with its result, or 202 + command id if not applied yet"""
+    command = controller.command_queue.submit(name, *args)
+    if not command.wait(COMMAND_WAIT):
+        return jsonify(command.to_dict()), 202
+    if command.error is not None:
+        return jsonify({'success': False, **command.to_dict()}), 500
+    if command.result is False:
+        return jsonify({'success': False, 'message': 'Failed to save config'})
+    return jsonify({'success': True, 'command_id': command.command_id})
+
+@app.route('/command/<int:command_id>')
+def command_status(command_id):
+    """Acknowledgement of a previously enqueued command"""
+    command = controller.command_queue.get(command_id)
+    if command is None:
+        return jsonify({'success': False, 'message': 'Unknown command'}), 404
+    return jsonify(command.to_dict())
+
 @app.route('/pause', methods=['POST'])
 def pause():
     """Toggle pause state"""
-    controller.toggle_pause()
-    return jsonify({'success': True})
+    return run_command('pause')
 
 @app.route('/reset_calibration', methods=['POST'])
 def reset_calibration():
     """Reset calibration"""
-    controller.calibration.reset_calibration()
-    return jsonify({'success': True})
+    return run_command('reset_calibration')
 
 @app.route('/update_config', methods=['POST'])
 def update_config():
@@ -970,36 +1125,30 @@ def update_config():
         for field in numeric_fields:
             if field in data:
                 data[field] = float(data[field])
-        
-        if controller.update_config(data):
-            return jsonify({'success': True})
-        else:
-            return jsonify({'success': False, 'message': 'Failed to save config'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
+    return run_command('update_config', data)
 
 @app.route('/update_mapping', methods=['POST'])
 def update_mapping():
     """Update event-action mapping"""
     try:
         data = request.get_json()
-        index = data['index']
-        
-        if 0 <= index < len(controller.config['event_action_mappings']):
-            controller.config['event_action_mappings'][index]['event_type'] = data['event_type']
-            controller.config['event_action_mappings'][index]['action_type'] = data['action_type']
-            
-            if controller.save_config():
-                controller.setup_event_action_mappings()
-                return jsonify({'success': True})
-        
-        return jsonify({'success': False, 'message': 'Invalid mapping index'})
+        args = (int(data['index']), data['event_type'], data['action_type'])
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
+    return run_command('update_mapping', *args)
 
 def run_web_server():
-    """Run Flask web server"""
-    app.run(host='0.0.0.0', port=5002, threaded=True)
+    """Run Flask web server (or the same routes on asyncio with --async)"""
+    if '--async' in sys.argv:
+        asgi_app = AsyncWebApp(app)
+        frame_fanout = AsyncFanout()
+        controller.broadcaster.add_listener(frame_fanout)
+        asgi_app.add_stream('/video_feed', mjpeg_stream, 'multipart/x-mixed-replace; boundary=frame', frame_fanout)
+        run_async(asgi_app, host='0.0.0.0', port=5002)
+    else:
+        app.run(host='0.0.0.0', port=5002, threaded=True)
 
 def cleanup_resources():
     """Clean up resources on exit"""
@@ -0,0 +1,350 @@
+"""
+Registrazione e replay dei landmark per benchmark riproducibili della pipeline.
+
+    python replay.py record sessione.npz [--frames] [--duration 30]
+    python replay.py replay sessione.npz [--realtime] [--facemesh] [--repeat 3] [--screen 1920x1080]
+                                         [--json risultati.json] [--baseline risultati.json]
+
+`record` salva i landmark normalizzati di FaceMesh sul frame non specchiato
+(e con --frames anche il video grezzo della webcam, accanto al file .npz)
+senza avviare il controller. Le registrazioni precedenti, fatte sul frame
+specchiato, vengono riconosciute e riprodotte senza specchiare di nuovo.
+`replay` ricostruisce un HeadMouseController con un trasmettitore su
+MemoryTransport e gli passa i landmark registrati, a velocità massima oppure
+rispettando i tempi originali, misurando ogni fase con StageProfiler:
+
+    capture    lettura del frame registrato (decodifica video con --facemesh)
+    facemesh   conversione colore (buffer riutilizzato) e face_mesh.process,
+               sulla sola regione del viso salvo --no-roi (solo con --facemesh)
+    landmarks  conversione LandmarkAdapter.update
+    actions    process_nose_movement (movimento del cursore)
+    events     process_events (gesti, click, scroll)
+    transmit   codifica e scrittura dei pacchetti (writer thread del trasmettitore)
+
+Nota: i tempi dei gesti (durata del blink, cooldown dei click) usano
+l'orologio reale, quindi a velocità massima scattano meno eventi che dal vivo;
+per confrontare il comportamento e non solo i tempi usare --realtime.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from landmarks import NUM_FACE_LANDMARKS
+from preprocess import RgbConverter
+from profiler import StageProfiler, format_summary
+from filters import FILTER_KINDS, FILTER_ONE_EURO
+from transports import MemoryTransport
+from headmouse_receiver import ReceiverStats, format_report
+
+ReplayLandmark = namedtuple('ReplayLandmark', ['x', 'y'])
+
+
+class ReplayFaceLandmarks:
+    """Sostituto di un risultato FaceMesh: espone .landmark come MediaPipe"""
+    __slots__ = ('landmark',)
+
+    def __init__(self, points):
+        self.landmark = [ReplayLandmark(x, y) for x, y in points.tolist()]
+
+
+def video_path_for(path):
+    return os.path.splitext(path)[0] + '.avi'
+
+
+class LandmarkRecorder:
+    """Accumula i landmark normalizzati (float32) di ogni frame e li salva in un .npz compresso"""
+    def __init__(self, path, save_frames=False, fps=30):
+        self.path = path
+        self.save_frames = save_frames
+        self.fps = fps
+        self.start_time = time.monotonic()
+        self.timestamps = []
+        self.present = []
+        self.landmarks = []
+        self.frame_size = (0, 0)
+        self.writer = None
+        self.empty = np.zeros((NUM_FACE_LANDMARKS, 2), dtype=np.float32)
+
+    def add(self, face_landmarks, frame):
+        """Registra un frame: face_landmarks è None se il viso non è stato rilevato"""
+        h, w = frame.shape[:2]
+        self.frame_size = (w, h)
+        self.timestamps.append(time.monotonic() - self.start_time)
+        if face_landmarks is None:
+            self.present.append(False)
+            self.landmarks.append(self.empty)
+        else:
+            points = np.array([(lm.x, lm.y) for lm in face_landmarks.landmark[:NUM_FACE_LANDMARKS]],
+                              dtype=np.float32)
+            self.present.append(True)
+            self.landmarks.append(points)
+
+        if self.save_frames:
+            if self.writer is None:
+                self.writer = cv2.VideoWriter(video_path_for(self.path), cv2.VideoWriter_fourcc(*'MJPG'),
+                                              self.fps, (w, h))
+            self.writer.write(frame)
+
+    def close(self):
+        np.savez_compressed(
+            self.path,
+            timestamps=np.array(self.timestamps, dtype=np.float64),
+            present=np.array(self.present, dtype=bool),
+            landmarks=np.array(self.landmarks, dtype=np.float32).reshape(-1, NUM_FACE_LANDMARKS, 2),
+            frame_size=np.array(self.frame_size, dtype=np.int32),
+            mirrored=np.array(False),
+        )
+        if self.writer is not None:
+            self.writer.release()
+        print(f"Registrati {len(self.timestamps)} frame in {self.path}")
+
+
+class LandmarkRecording:
+    """Registrazione caricata da LandmarkRecorder"""
+    def __init__(self, path):
+        data = np.load(path)
+        self.path = path
+        self.timestamps = data['timestamps']
+        self.present = data['present']
+        self.landmarks = data['landmarks']
+        self.frame_w, self.frame_h = (int(v) for v in data['frame_size'])
+        # Landmark già specchiati (registrazioni fatte con cv2.flip prima di FaceMesh)
+        self.mirrored = bool(data['mirrored']) if 'mirrored' in data.files else True
+        self.video_path = video_path_for(path) if os.path.exists(video_path_for(path)) else None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def face_landmarks(self, index):
+        if not self.present[index]:
+            return None
+        return ReplayFaceLandmarks(self.landmarks[index])
+
+    def duration(self):
+        return float(self.timestamps[-1] - self.timestamps[0]) if len(self) > 1 else 0.0
+
+
+class ReplayDriver:
+    """Esegue la pipeline del controller sui frame di una registrazione"""
+    def __init__(self, controller, recording, profiler, realtime=False, use_facemesh=False):
+        if use_facemesh and recording.video_path is None:
+            raise ValueError("La registrazione non contiene frame: registrare con --frames")
+        self.controller = controller
+        self.recording = recording
+        self.profiler = profiler
+        self.realtime = realtime
+        self.use_facemesh = use_facemesh
+
+    def run(self):
+        controller = self.controller
+        profiler = self.profiler
+        recording = self.recording
+        video = cv2.VideoCapture(recording.video_path) if self.use_facemesh else None
+        w, h = recording.frame_w, recording.frame_h
+        # Il video è sempre grezzo; i landmark registrati possono essere già specchiati
+        controller.landmark_adapter.set_mirror(self.use_facemesh or not recording.mirrored)
+        replay_start = time.monotonic()
+
+        try:
+            for index in range(len(recording)):
+                if self.realtime:
+                    delay = recording.timestamps[index] - recording.timestamps[0] - (time.monotonic() - replay_start)
+                    if delay > 0:
+                        time.sleep(delay)
+
+                start = profiler.start()
+                if video is not None:
+                    ret, frame = video.read()
+                    if not ret:
+                        break
+                else:
+                    face_landmarks = recording.face_landmarks(index)
+                profiler.record('capture', start)
+
+                if video is not None:
+                    start = profiler.start()
+                    face_landmarks, region = controller.detect_face(frame)
+                    profiler.record('facemesh', start)
+                else:
+                    region = (0, 0, w, h)
+
+                if face_landmarks is not None:
+                    start = profiler.start()
+                    x0, y0, region_w, region_h = region
+                    controller.landmark_adapter.update(face_landmarks, region_w, region_h, (x0, y0), w)
+                    compact_landmarks = controller.landmark_adapter.get_compact()
+                    tracking_point = compact_landmarks[controller.nose_slot]
+                    profiler.record('landmarks', start)
+
+                    start = profiler.start()
+                    controller.process_nose_movement(tracking_point)
+                    profiler.record('actions', start)
+
+                    start = profiler.start()
+                    controller.process_events(tracking_point, compact_landmarks)
+                    profiler.record('events', start)
+
+                profiler.frame_done()
+        finally:
+            if video is not None:
+                video.release()
+        return profiler.get_summary()
+
+
+def record(args):
+    import mediapipe as mp
+
+    face_mesh = mp.solutions.face_mesh.FaceMesh(
+        max_num_faces=1,
+        refine_landmarks=True,
+        min_detection_confidence=0.8,
+        min_tracking_confidence=0.8
+    )
+    cap = cv2.VideoCapture(args.camera)
+    if not cap.isOpened():
+        print("Errore: Webcam non trovata!")
+        return 1
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    cap.set(cv2.CAP_PROP_FPS, 30)
+
+    recorder = LandmarkRecorder(args.path, save_frames=args.frames)
+    converter = RgbConverter()
+    print("Registrazione in corso... (Ctrl+C per terminare)")
+    try:
+        while args.duration is None or time.monotonic() - recorder.start_time < args.duration:
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            # Come nel loop principale FaceMesh lavora sul frame non specchiato:
+            # lo specchio viene applicato ai landmark da LandmarkAdapter nel replay
+            results = face_mesh.process(converter.convert(frame))
+            face_landmarks = results.multi_face_landmarks[0] if results.multi_face_landmarks else None
+            recorder.add(face_landmarks, frame)
+    except KeyboardInterrupt:
+        print("\nInterruzione da tastiera")
+    finally:
+        cap.release()
+        recorder.close()
+    return 0
+
+
+def compare_with_baseline(summary, baseline, tolerance):
+    """Confronta i p95 con un riepilogo precedente; restituisce le fasi peggiorate"""
+    regressions = []
+    for stage, stats in summary['stages'].items():
+        previous = baseline['stages'].get(stage)
+        if previous and stats['p95_ms'] > previous['p95_ms'] * (1.0 + tolerance):
+            regressions.append((stage, previous['p95_ms'], stats['p95_ms']))
+    return regressions
+
+
+def parse_screen_size(value):
+    """'1920x1080' -> (1920, 1080)"""
+    try:
+        width, height = (int(v) for v in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"dimensioni non valide: {value} (atteso LARGHEZZAxALTEZZA)")
+    return width, height
+
+
+def replay(args):
+    from test13 import HeadMouseController, BluetoothTransmitter
+
+    recording = LandmarkRecording(args.path)
+    print(f"Registrazione: {len(recording)} frame, {recording.duration():.1f} s, "
+          f"{recording.frame_w}x{recording.frame_h}")
+
+    user_config = {
+        'left_click': args.left_click,
+        'right_click': args.right_click,
+        'mode_switch': args.mode_switch,
+        'scroll_direction': args.scroll_direction,
+        'face_roi': 'no' if args.no_roi else 'si',
+        'movement_filter': args.filter,
+        'scroll_filter': args.filter,
+        'output_rate_hz': args.output_rate,
+        'screen_size': args.screen, # Niente pyautogui né display: il replay gira anche headless
+    }
+    profiler = StageProfiler(window=max(len(recording) * args.repeat, 1))
+    receiver = ReceiverStats()
+    transmitter = BluetoothTransmitter(transport=MemoryTransport(on_data=receiver.feed), profiler=profiler)
+    controller = HeadMouseController(show_window=False, user_config=user_config,
+                                     bt_transmitter=transmitter, profiler=profiler)
+
+    try:
+        for _ in range(args.repeat):
+            summary = ReplayDriver(controller, recording, profiler, realtime=args.realtime,
+                                   use_facemesh=args.facemesh).run()
+        time.sleep(0.2) # Lascia al writer thread il tempo di svuotare la coda
+    finally:
+        if controller.motion_scheduler is not None:
+            controller.motion_scheduler.close()
+        transmitter.close()
+
+    print(format_summary(summary))
+    print(f"Ricevitore: {format_report(receiver.report())}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Risultati salvati in {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(summary, baseline, args.tolerance)
+        for stage, before, after in regressions:
+            print(f"REGRESSIONE {stage}: p95 {before:.3f} ms -> {after:.3f} ms")
+        if regressions:
+            return 1
+        print("Nessuna regressione rispetto al riferimento")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registrazione e replay dei landmark per benchmark")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help="registra i landmark dalla webcam")
+    record_parser.add_argument('path')
+    record_parser.add_argument('--frames', action='store_true', help="salva anche il video grezzo")
+    record_parser.add_argument('--duration', type=float, help="secondi di registrazione")
+    record_parser.add_argument('--camera', type=int, default=0)
+
+    gestures = ["right eye", "left eye", "mouth open"]
+    replay_parser = commands.add_parser('replay', help="riesegue la pipeline su una registrazione")
+    replay_parser.add_argument('path')
+    replay_parser.add_argument('--realtime', action='store_true', help="rispetta i tempi originali")
+    replay_parser.add_argument('--facemesh', action='store_true', help="riesegue FaceMesh sui frame registrati")
+    replay_parser.add_argument('--no-roi', action='store_true',
+                               help="con --facemesh elabora sempre il frame intero")
+    replay_parser.add_argument('--filter', choices=FILTER_KINDS, default=FILTER_ONE_EURO,
+                               help="filtro di smoothing di movimento e scroll")
+    replay_parser.add_argument('--output-rate', type=int, default=0,
+                               help="movimento interpolato a 60-250 Hz (ha senso con --realtime); 0 = per frame")
+    replay_parser.add_argument('--repeat', type=int, default=1)
+    replay_parser.add_argument('--screen', type=parse_screen_size, default=(1920, 1080),
+                               help="dimensioni dello schermo del ricevitore, LARGHEZZAxALTEZZA")
+    replay_parser.add_argument('--left-click', choices=gestures, default="left eye")
+    replay_parser.add_argument('--right-click', choices=gestures, default="right eye")
+    replay_parser.add_argument('--mode-switch', choices=gestures, default="mouth open")
+    replay_parser.add_argument('--scroll-direction', default="nose up/down",
+                               choices=["nose up/down", "mouth up/down", "eyes up/down (average)"])
+    replay_parser.add_argument('--json', help="salva il riepilogo in formato JSON")
+    replay_parser.add_argument('--baseline', help="riepilogo JSON di riferimento da confrontare")
+    replay_parser.add_argument('--tolerance', type=float, default=0.2,
+                               help="peggioramento del p95 tollerato (0.2 = +20%%)")
+
+    args = parser.parse_args()
+    return record(args) if args.command == 'record' else replay(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import deque
+
+from headmouse_protocol import PACKET_MOVE, PACKET_SCROLL
+
+# Pacchetti che possono essere accorpati o scartati (movimento continuo).
+# Click e cambio modalità (0x03/0x04/0x05) non vengono mai scartati.
+COLLAPSIBLE_PACKETS = (PACKET_MOVE, PACKET_SCROLL)
+
+
+class QueueEntry:
+    """Pacchetto in attesa di invio (codificato solo al momento della spedizione)"""
+    __slots__ = ('packet_type', 'fields', 'merged', 'enqueue_time')
+
+    def __init__(self, packet_type, fields):
+        self.packet_type = packet_type
+        self.fields = fields
+        self.merged = 1
+        self.enqueue_time = time.monotonic()
+
+
+class PacketSendQueue:
+    """
+    Coda di invio limitata tra il loop di visione e il thread di scrittura.
+
+    Chi produce non si blocca mai: un movimento (o scroll) che arriva mentre in
+    coda c'è già un movimento non ancora spedito viene sommato a quello, così in
+    coda resta un solo pacchetto di movimento aggiornato. Se la coda è piena si
+    scartano i pacchetti di movimento più vecchi; click e cambi modalità
+    vengono sempre accodati.
+    """
+    def __init__(self, max_depth=32, latency_samples=200):
+        self.max_depth = max_depth
+        self.condition = threading.Condition()
+        self.entries = deque()
+        self.closed = False
+
+        # Metriche
+        self.enqueued_packets = 0
+        self.sent_packets = 0
+        self.merged_packets = 0
+        self.dropped_packets = 0
+        self.expired_packets = 0 # Scartati perché troppo vecchi dopo una riconnessione
+        self.latencies = deque(maxlen=latency_samples) # secondi tra accodamento e invio
+        self.max_latency = 0.0
+
+    def put_move(self, dx, dy, speed):
+        self._put_collapsible(PACKET_MOVE, dx, dy, speed)
+
+    def put_scroll(self, amount):
+        self._put_collapsible(PACKET_SCROLL, amount)
+
+    def _put_collapsible(self, packet_type, *values):
+        with self.condition:
+            tail = self.entries[-1] if self.entries else None
+            if tail is not None and tail.packet_type == packet_type:
+                # Somma le componenti relative (dx, dy / quantità); la velocità è l'ultima
+                tail.fields[0] += values[0]
+                if packet_type == PACKET_MOVE:
+                    tail.fields[1] += values[1]
+                    tail.fields[2] = values[2]
+                tail.merged += 1
+                self.merged_packets += 1
+                return
+            self._append(QueueEntry(packet_type, list(values)))
+
+    def put(self, packet_type, *fields):
+        """Accoda un pacchetto di controllo (click, cambio modalità)"""
+        with self.condition:
+            self._append(QueueEntry(packet_type, list(fields)))
+
+    def _append(self, entry):
+        if len(self.entries) >= self.max_depth:
+            victim = next((e for e in self.entries if e.packet_type in COLLAPSIBLE_PACKETS), None)
+            if victim is not None:
+                self.entries.remove(victim)
+                self.dropped_packets += 1
+            elif entry.packet_type in COLLAPSIBLE_PACKETS:
+                self.dropped_packets += 1
+                return
+        self.entries.append(entry)
+        self.enqueued_packets += 1
+        self.condition.notify()
+
+    def get(self, timeout=None):
+        """Estrae il prossimo pacchetto (None se scade il timeout o la coda è chiusa)"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.entries or self.closed, timeout):
+                return None
+            if not self.entries:
+                return None
+            return self.entries.popleft()
+
+    def requeue(self, entry):
+        """Rimette in testa un pacchetto di controllo il cui invio è fallito"""
+        with self.condition:
+            self.entries.appendleft(entry)
+            self.condition.notify()
+
+    def discard_older_than(self, max_age):
+        """
+        Scarta i movimenti/scroll accodati da più di max_age secondi; restituisce quanti.
+        Click e cambi modalità restano in coda qualunque sia la loro età.
+        """
+        limit = time.monotonic() - max_age
+        with self.condition:
+            kept = deque(entry for entry in self.entries
+                         if entry.enqueue_time >= limit or entry.packet_type not in COLLAPSIBLE_PACKETS)
+            expired = len(self.entries) - len(kept)
+            self.entries = kept
+            self.expired_packets += expired
+            return expired
+
+    def has_pending(self, packet_type):
+        """True se in coda c'è un pacchetto del tipo indicato non ancora spedito"""
+        with self.condition:
+            return any(entry.packet_type == packet_type for entry in self.entries)
+
+    def record_sent(self, entry):
+        latency = time.monotonic() - entry.enqueue_time
+        with self.condition:
+            self.sent_packets += 1
+            self.latencies.append(latency)
+            self.max_latency = max(self.max_latency, latency)
+
+    def depth(self):
+        return len(self.entries)
+
+    def get_metrics(self):
+        """Profondità della coda, contatori e latenza di invio (ms)"""
+        with self.condition:
+            latencies = list(self.latencies)
+            return {
+                'depth': len(self.entries),
+                'enqueued': self.enqueued_packets,
+                'sent': self.sent_packets,
+                'merged': self.merged_packets,
+                'dropped': self.dropped_packets,
+                'expired': self.expired_packets,
+                'avg_latency_ms': 1000.0 * sum(latencies) / len(latencies) if latencies else 0.0,
+                'max_latency_ms': 1000.0 * self.max_latency,
+            }
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
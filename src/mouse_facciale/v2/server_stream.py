@@ -2,11 +2,22 @@ from flask import Flask, Response, render_template_string, request, jsonify
 import cv2
 import numpy as np
 import threading
+import sys
 from test10 import HeadMouseController  # Assicurati che test10.py sia nella stessa cartella
+from landmarks import LandmarkAdapter
+from face_roi import FaceRoiTracker
+from frame_broadcaster import FrameBroadcaster
+from preview_encoder import PreviewEncoder
+from command_queue import CommandQueue
+from async_server import AsyncWebApp, AsyncFanout, mjpeg_stream, run as run_async
 
 app = Flask(__name__)
 controller = HeadMouseController(show_window=False)
-lock = threading.Lock()
+broadcaster = FrameBroadcaster() # Un solo thread elabora i frame, i client leggono l'ultimo
+preview_encoder = PreviewEncoder(scale=0.5, quality=70, max_fps=15) # Anteprima ridotta e limitata
+# Il frame non viene specchiato prima di FaceMesh: lo specchio è applicato ai landmark
+landmark_adapter = LandmarkAdapter([controller.NOSE_TIP, controller.UPPER_LIP, controller.LOWER_LIP], mirror=True)
+roi_tracker = FaceRoiTracker() # FaceMesh solo sulla regione attorno al viso
 
 cap = cv2.VideoCapture(0)
 cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
@@ -44,9 +55,10 @@ HTML_PAGE = '''
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ command: cmd })
-            }).then(res => res.json()).then(data => {
-                console.log('Risposta:', data.message);
-            });
+            }).then(res => res.json().then(data => {
+                // 202: comando accodato, non ancora applicato dal loop di visione
+                console.log('Risposta:', res.status === 202 ? 'comando in coda (' + data.command_id + ')' : data.message);
+            }));
         }
     </script>
 </body>
@@ -62,67 +74,104 @@ def video_feed():
     return Response(generate_frames(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+# I comandi vengono applicati dal loop di visione tra un frame e l'altro:
+# le richieste HTTP non condividono nessun lock con l'elaborazione dei frame
+def comando_toggle():
+    controller.toggle_pause()
+    return f"{'Pausa' if controller.paused else 'Avvio'} attivata"
+
+def comando_sensibilita(amount):
+    if controller.current_mode == 'pointer':
+        controller.mouse_cursor.adjust_sensitivity(amount)
+    else:
+        controller.scroll_action.adjust_sensitivity(amount * 2.5)
+    return "Sensibilità aumentata" if amount > 0 else "Sensibilità diminuita"
+
+def comando_reset():
+    controller.calibration.reset_calibration()
+    controller.nose_joystick.reset_outside_timer()
+    roi_tracker.reset()
+    controller.reset_mouse_position()
+    return "Calibrazione resettata"
+
+command_queue = CommandQueue({
+    'toggle': comando_toggle,
+    'sensitivity_up': lambda: comando_sensibilita(0.2),
+    'sensitivity_down': lambda: comando_sensibilita(-0.2),
+    'reset': comando_reset,
+})
+
 @app.route('/control', methods=['POST'])
 def control():
     data = request.get_json()
     command = data.get('command')
 
-    with lock:
-        if command == 'toggle':
-            controller.toggle_pause()
-            return jsonify(message=f"{'Pausa' if controller.paused else 'Avvio'} attivata")
-        elif command == 'sensitivity_up':
-            if controller.current_mode == 'pointer':
-                controller.mouse_cursor.adjust_sensitivity(0.2)
-            else:
-                controller.scroll_action.adjust_sensitivity(0.5)
-            return jsonify(message="Sensibilità aumentata")
-        elif command == 'sensitivity_down':
-            if controller.current_mode == 'pointer':
-                controller.mouse_cursor.adjust_sensitivity(-0.2)
-            else:
-                controller.scroll_action.adjust_sensitivity(-0.5)
-            return jsonify(message="Sensibilità diminuita")
-        elif command == 'reset':
-            controller.calibration.reset_calibration()
-            controller.nose_joystick.reset_outside_timer()
-            controller.reset_mouse_position()
-            return jsonify(message="Calibrazione resettata")
-        else:
-            return jsonify(message="Comando sconosciuto"), 400
-
-def generate_frames():
+    if command not in command_queue.handlers:
+        return jsonify(message="Comando sconosciuto"), 400
+    queued = command_queue.submit(command)
+    # Conferma asincrona: se il loop non l'ha ancora applicato si risponde 202 con l'id
+    if not queued.wait(0.5):
+        return jsonify(queued.to_dict()), 202
+    if queued.error is not None:
+        return jsonify(queued.to_dict()), 500
+    return jsonify(message=queued.result, command_id=queued.command_id)
+
+@app.route('/command/<int:command_id>')
+def command_status(command_id):
+    queued = command_queue.get(command_id)
+    if queued is None:
+        return jsonify(message="Comando sconosciuto"), 404
+    return jsonify(queued.to_dict())
+
+def vision_loop():
     while True:
         success, frame = cap.read()
         if not success:
             continue
 
-        frame = cv2.flip(frame, 1)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = controller.face_mesh.process(rgb_frame)
+        command_queue.apply_pending()
+
+        results = roi_tracker.process(controller.face_mesh, frame)
+        frame_w = frame.shape[1]
+        # Anteprima (specchiata e disegnata) solo se verrà codificata
+        render = preview_encoder.is_due(broadcaster.has_clients())
+        if render:
+            frame = cv2.flip(frame, 1)
 
         if results.multi_face_landmarks:
             face_landmarks = results.multi_face_landmarks[0]
-            h, w = frame.shape[:2]
-            landmarks_np = np.array([[lm.x * w, lm.y * h] for lm in face_landmarks.landmark], dtype=np.float64)
+            x0, y0, region_w, region_h = roi_tracker.region
+            landmarks_np = landmark_adapter.update(face_landmarks, region_w, region_h, (x0, y0), frame_w)
 
             tracking_point = landmarks_np[controller.NOSE_TIP]
 
-            with lock:
-                if not controller.paused:
-                    controller.process_nose_movement(tracking_point)
-                    controller.process_events(tracking_point, landmarks_np)
+            if not controller.paused:
+                controller.process_nose_movement(tracking_point)
+                controller.process_events(tracking_point, landmarks_np)
+            if render:
                 controller.draw_interface(frame, tracking_point, landmarks_np)
-        else:
+        elif render:
             cv2.putText(frame, "VISO NON RILEVATO", (20, 50), 
                         cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
 
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
+        if not render:
+            continue
+        jpeg_bytes = preview_encoder.encode(frame)
+        if jpeg_bytes is not None:
+            broadcaster.publish(jpeg_bytes)
 
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+def generate_frames():
+    return broadcaster.stream()
 
 if __name__ == '__main__':
     print("Server avviato su http://localhost:5000")
-    app.run(host='0.0.0.0', port=5000, threaded=True)
+    threading.Thread(target=vision_loop, daemon=True).start()
+    if '--async' in sys.argv:
+        # Modalità asincrona: lo stream video è un task asyncio, /control resta la view Flask
+        asgi_app = AsyncWebApp(app)
+        frame_fanout = AsyncFanout()
+        broadcaster.add_listener(frame_fanout)
+        asgi_app.add_stream('/video_feed', mjpeg_stream, 'multipart/x-mixed-replace; boundary=frame', frame_fanout)
+        run_async(asgi_app, host='0.0.0.0', port=5000)
+    else:
+        app.run(host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,70 @@
+import json
+import threading
+import time
+
+
+class StatusChannel:
+    """
+    Stato dell'applicazione spinto ai client con Server-Sent Events.
+
+    Il thread di visione chiama update() ad ogni frame, ma lo stato cambia
+    (e i client vengono svegliati) solo se qualche valore è diverso. Ogni
+    client riceve al massimo max_rate messaggi al secondo: i cambiamenti
+    arrivati nel frattempo vengono accorpati e si invia solo l'ultimo stato.
+    Senza cambiamenti parte un commento di keepalive ogni keepalive secondi.
+    """
+    def __init__(self, initial=None, max_rate=10.0, keepalive=15.0):
+        self.condition = threading.Condition()
+        self.state = dict(initial or {})
+        self.version = 0
+        self.min_interval = 1.0 / max_rate
+        self.keepalive = keepalive
+        self.closed = False
+        self.listeners = [] # Altri consumatori (es. AsyncFanout) con publish(stato)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def update(self, **fields):
+        """Aggiorna i campi indicati; notifica i client solo se qualcosa è cambiato"""
+        state = self.state
+        changed = {key: value for key, value in fields.items() if state.get(key) != value}
+        if not changed:
+            return False
+        with self.condition:
+            # Nuovo dict ad ogni cambio: chi ha letto uno snapshot non lo vede mutare
+            self.state = {**self.state, **changed}
+            self.version += 1
+            self.condition.notify_all()
+        for listener in self.listeners:
+            listener.publish(self.state)
+        return True
+
+    def snapshot(self):
+        return self.state
+
+    def stream(self):
+        """Generatore SSE per un client: il primo messaggio è lo stato completo"""
+        last_version = -1
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.version != last_version or self.closed, self.keepalive)
+                if self.closed:
+                    return
+                if self.version == last_version:
+                    payload = None
+                else:
+                    last_version = self.version
+                    payload = self.state
+            if payload is None:
+                yield ": keepalive\n\n"
+                continue
+
+            yield f"data: {json.dumps(payload)}\n\n"
+            # Limite di frequenza: i cambi arrivati durante l'attesa vengono accorpati
+            time.sleep(self.min_interval)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
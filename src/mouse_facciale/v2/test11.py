@@ -1,11 +1,13 @@
 import cv2
 import mediapipe as mp
 import numpy as np
-import pynput.mouse as mouse  # Changed pyautogui to pynput.mouse
 import time
 import sys
 from collections import deque
 import threading
+from pointer_backends import best_available_backend
+
+DEFAULT_SCREEN_SIZE = (1920, 1080) # Se il backend non conosce lo schermo
 
 
 class BaseEvent:
@@ -238,16 +240,15 @@ class SwitchMode_action(BaseAction):
 
 class MouseCursor_action(BaseAction):
     """Classe per tradurre il movimento del naso in movimento del cursore"""
-    def __init__(self, screen_w, screen_h):
+    def __init__(self, pointer, screen_w, screen_h):
+        self.pointer = pointer # Solo movimenti relativi: va bene qualunque backend
         self.screen_w = screen_w
         self.screen_h = screen_h
         self.current_mouse_pos = np.array([screen_w // 2, screen_h // 2], dtype=float)
         self.position_history = deque(maxlen=5) # Usato per lo smoothing del movimento
         self.mouse_lock = threading.Lock() # Lock per thread safety
         self.base_sensitivity = 4.0
-        
-        self.mouse_controller = mouse.Controller() # Initialize pynput controller
-        self.mouse_controller.position = (self.current_mouse_pos[0], self.current_mouse_pos[1])
+        self.set_position(self.current_mouse_pos)
 
     def update_position(self, direction, acceleration_factor, effective_distance):
         """Aggiorna la posizione del cursore"""
@@ -266,26 +267,36 @@ class MouseCursor_action(BaseAction):
         else:
             smoothed_movement = np.array([movement_x, movement_y])
 
-        # Applica movimento relativo con pynput
+        # Applica movimento relativo tramite il backend
         with self.mouse_lock:
+            dx, dy = int(smoothed_movement[0]), int(smoothed_movement[1])
             try:
-                self.mouse_controller.move(int(smoothed_movement[0]), int(smoothed_movement[1]))
+                self.pointer.move_relative(dx, dy)
             except Exception as e:
                 print(f"Errore movimento: {e}")
+                return
+            # Posizione stimata, usata quando il backend non sa leggere quella reale
+            self.current_mouse_pos[0] = np.clip(self.current_mouse_pos[0] + dx, 0, self.screen_w - 1)
+            self.current_mouse_pos[1] = np.clip(self.current_mouse_pos[1] + dy, 0, self.screen_h - 1)
+
+    def _sync_position(self):
+        """Allinea la posizione interna a quella reale del sistema, se il backend la conosce"""
+        system_pos = self.pointer.position()
+        if system_pos is not None:
+            self.current_mouse_pos = np.array([system_pos[0], system_pos[1]], dtype=float)
 
     def freeze_position(self):
         """Blocca la posizione corrente del cursore"""
         with self.mouse_lock:
             # Sincronizza la posizione interna con quella reale del sistema
-            system_pos = self.mouse_controller.position
-            self.current_mouse_pos = np.array([system_pos[0], system_pos[1]], dtype=float)
+            self._sync_position()
 
     def set_position(self, new_position):
         """Imposta direttamente una nuova posizione"""
         with self.mouse_lock:
             self.current_mouse_pos = new_position.copy()
             try:
-                self.mouse_controller.position = (int(new_position[0]), int(new_position[1]))
+                self._move_to_current()
             except Exception as e:
                 print(f"Errore set posizione: {e}")
 
@@ -293,10 +304,20 @@ class MouseCursor_action(BaseAction):
         """Mantiene forzatamente la posizione corrente"""
         with self.mouse_lock:
             try:
-                self.mouse_controller.position = (int(self.current_mouse_pos[0]), int(self.current_mouse_pos[1]))
+                self._move_to_current()
             except Exception as e:
                 print(f"Errore enforcement posizione: {e}")
 
+    def _move_to_current(self):
+        """Porta il cursore su current_mouse_pos (con uinput solo per spostamento relativo)"""
+        x, y = int(self.current_mouse_pos[0]), int(self.current_mouse_pos[1])
+        try:
+            self.pointer.move_to(x, y)
+        except NotImplementedError:
+            system_pos = self.pointer.position()
+            if system_pos is not None:
+                self.pointer.move_relative(x - system_pos[0], y - system_pos[1])
+
     def adjust_sensitivity(self, amount):
         """Modifica la sensibilità"""
         self.base_sensitivity = np.clip(self.base_sensitivity + amount, 0.5, 5.0)
@@ -305,9 +326,8 @@ class MouseCursor_action(BaseAction):
     def get_current_position(self):
         """Restituisce la posizione attuale del cursore"""
         with self.mouse_lock:
-            # Ottiene la posizione in tempo reale dal controller di pynput
-            system_pos = self.mouse_controller.position
-            self.current_mouse_pos = np.array([system_pos[0], system_pos[1]], dtype=float)
+            # Ottiene la posizione in tempo reale dal backend (se la conosce)
+            self._sync_position()
             return self.current_mouse_pos.copy()
 
     def execute(self, direction, acceleration_factor, effective_distance):
@@ -317,13 +337,13 @@ class MouseCursor_action(BaseAction):
 
 class Scroll_action(BaseAction):
     """Classe per eseguire lo scrolling"""
-    def __init__(self, scroll_cooldown=0.03):
+    def __init__(self, pointer, scroll_cooldown=0.03):
+        self.pointer = pointer
         self.scroll_cooldown = scroll_cooldown
         self.last_scroll_time = 0
         self.scroll_lock = threading.Lock()
         self.scroll_sensitivity = 2.0
         self.scroll_history = deque(maxlen=3)
-        self.mouse_controller = mouse.Controller() # Initialize pynput controller
     
     def perform_scroll(self, direction, effective_distance):
         """Esegue lo scrolling"""
@@ -341,7 +361,7 @@ class Scroll_action(BaseAction):
                 
                 scroll_value = int(smoothed_scroll)
                 if abs(scroll_value) > 0:  # Solo se c'è movimento significativo
-                    self.mouse_controller.scroll(0, scroll_value) # x, y for scroll
+                    self.pointer.scroll(scroll_value)
                     self.last_scroll_time = current_time
                     return True
         except Exception as e:
@@ -422,11 +442,11 @@ class LeftEye_event(BaseEvent):
 
 class LeftClick_action(BaseAction):
     """Classe per eseguire click sinistro"""
-    def __init__(self, click_cooldown=0.5):
+    def __init__(self, pointer, click_cooldown=0.5):
+        self.pointer = pointer
         self.click_cooldown = click_cooldown
         self.last_click_time = 0
         self.mouse_lock = threading.Lock()
-        self.mouse_controller = mouse.Controller() # Initialize pynput controller
     
     def perform_click(self, mouse_position):
         """Esegue click sinistro"""
@@ -436,8 +456,8 @@ class LeftClick_action(BaseAction):
         
         try:
             with self.mouse_lock:
-                # pynput performs click at the current system cursor position
-                self.mouse_controller.click(mouse.Button.left)
+                # Il click avviene nella posizione attuale del cursore di sistema
+                self.pointer.click('left')
             print(f"Click SINISTRO")
             self.last_click_time = current_time
             return True
@@ -514,11 +534,11 @@ class RightEye_event(BaseEvent):
 
 class RightClick_action(BaseAction):
     """Classe per eseguire click destro"""
-    def __init__(self, click_cooldown=0.5):
+    def __init__(self, pointer, click_cooldown=0.5):
+        self.pointer = pointer
         self.click_cooldown = click_cooldown
         self.last_click_time = 0
         self.mouse_lock = threading.Lock()
-        self.mouse_controller = mouse.Controller() # Initialize pynput controller
     
     def perform_click(self, mouse_position):
         """Esegue click destro"""
@@ -528,7 +548,7 @@ class RightClick_action(BaseAction):
         
         try:
             with self.mouse_lock:
-                self.mouse_controller.click(mouse.Button.right)
+                self.pointer.click('right')
             print(f"Click DESTRO")
             self.last_click_time = current_time
             return True
@@ -541,7 +561,7 @@ class RightClick_action(BaseAction):
         return self.perform_click(mouse_position)
 
 class HeadMouseController:
-    def __init__(self, show_window=True, user_config=None):
+    def __init__(self, show_window=True, user_config=None, pointer=None):
         # MediaPipe setup
         self.mp_face_mesh = mp.solutions.face_mesh
         self.face_mesh = self.mp_face_mesh.FaceMesh(
@@ -551,11 +571,10 @@ class HeadMouseController:
             min_tracking_confidence=0.8
         )
 
-        # PyAutoGUI size for screen dimensions
-        # Note: pyautogui.size() is used only to get screen dimensions, pynput handles control
-        import pyautogui 
-        self.screen_w, self.screen_h = pyautogui.size() 
-        del pyautogui # remove pyautogui after getting screen size
+        # Uscita verso il puntatore: movimenti relativi, anche con uinput
+        self.pointer = pointer if pointer is not None else best_available_backend()
+        print(f"Backend puntatore: {self.pointer.name}")
+        self.screen_w, self.screen_h = self.pointer.screen_size() or DEFAULT_SCREEN_SIZE
 
         # Landmark indices
         self.NOSE_TIP = 4
@@ -565,14 +584,14 @@ class HeadMouseController:
         # Inizializzazione delle classi
         self.calibration = Calibration_action()
         self.nose_joystick = NoseJoystick_event()
-        self.mouse_cursor = MouseCursor_action(self.screen_w, self.screen_h)
-        self.scroll_action = Scroll_action()
+        self.mouse_cursor = MouseCursor_action(self.pointer, self.screen_w, self.screen_h)
+        self.scroll_action = Scroll_action(self.pointer)
         self.open_mouth_event = OpenMouth_event(self.UPPER_LIP, self.LOWER_LIP)
         self.switch_mode_action = SwitchMode_action()
         self.left_eye_event = LeftEye_event()
         self.right_eye_event = RightEye_event()
-        self.left_click_action = LeftClick_action()
-        self.right_click_action = RightClick_action()
+        self.left_click_action = LeftClick_action(self.pointer)
+        self.right_click_action = RightClick_action(self.pointer)
         
         # User configuration
         self.user_config = user_config if user_config else {}
@@ -1002,6 +1021,7 @@ def main():
     finally:
         cap.release()
         cv2.destroyAllWindows()
+        controller.pointer.close()
         print("Controller chiuso")
 
 
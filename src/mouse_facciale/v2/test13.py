@@ -3,15 +3,22 @@ import mediapipe as mp
 import numpy as np
 import time
 import sys
-from collections import deque
 import threading
 import subprocess
 import platform
+import random
 
-# Importare pybluez - Assicurati di averlo installato: pip install pybluez
-# Potrebbe richiedere: sudo apt-get install python3-dev libbluetooth-dev (su Debian/Ubuntu)
-# O equivalenti per la tua distribuzione Linux.
-import bluetooth
+from frame_capture import FrameCapture
+from landmarks import LandmarkAdapter
+from face_roi import FaceRoiTracker
+from event_engine import GestureEngine
+from headmouse_protocol import (PacketEncoder, PACKET_MOVE, PACKET_SCROLL, PACKET_LEFT_CLICK,
+                                PACKET_RIGHT_CLICK, PACKET_MODE_SWITCH, MODE_POINTER, MODE_SCROLL)
+from send_queue import PacketSendQueue, COLLAPSIBLE_PACKETS
+from profiler import StageProfiler, format_summary
+from filters import create_filter, FILTER_ONE_EURO, FILTER_KINDS
+from motion_scheduler import MotionScheduler
+from transports import RfcommTransport, create_transport, TRANSPORT_RFCOMM, TRANSPORT_TCP, TRANSPORT_UNIX
 
 
 # --- Utility function to disable system mouse acceleration on Linux ---
@@ -71,110 +78,201 @@ def disable_system_mouse_acceleration():
         print("System is not Linux, skipping system mouse acceleration disabling.")
 
 
+# Stati della connessione notificati dal supervisore
+STATE_DISCONNECTED = 'disconnected'
+STATE_CONNECTING = 'connecting'
+STATE_CONNECTED = 'connected'
+STATE_CLOSED = 'closed'
+
+
 class BluetoothTransmitter:
-    def __init__(self, target_address=None, port=1, is_server=True):
-        self.target_address = target_address
-        self.port = port
-        self.is_server = is_server
-        self.sock = None
-        self.client_sock = None
+    """
+    Invia i pacchetti del protocollo v2 al ricevitore. Il collegamento vero e
+    proprio è delegato a un trasporto (transports.py): RFCOMM di default,
+    oppure TCP / socket UNIX / memoria per i test di carico senza adattatore.
+    """
+    def __init__(self, target_address=None, port=1, is_server=True, transport=None,
+                 initial_backoff=0.5, max_backoff=30.0, reconnect_buffer_age=2.0, profiler=None,
+                 wide_moves=True):
+        if transport is None:
+            if not is_server and not target_address:
+                raise ValueError("Must specify either target_address (for client) or is_server=True (for server).")
+            transport = RfcommTransport(target_address=target_address, port=port, is_server=is_server)
+        self.transport = transport
         self.connected = False
-        self.uuid = "94f39d29-7d6d-437d-973b-fba39e49d4ee" # Un UUID standard per SPP
-        self.connection_thread = None
-        self.lock = threading.Lock() # Lock per la scrittura sulla socket
-
-        if is_server and not target_address:
-            print(f"Bluetooth Transmitter: Avvio come server su porta {self.port} con UUID {self.uuid}")
-            self.connection_thread = threading.Thread(target=self._start_server)
-        elif target_address and not is_server:
-            print(f"Bluetooth Transmitter: Avvio come client, tentativo di connessione a {self.target_address}:{self.port}")
-            self.connection_thread = threading.Thread(target=self._start_client)
-        else:
-            raise ValueError("Must specify either target_address (for client) or is_server=True (for server).")
-        
+
+        # Supervisore della connessione: un solo thread, backoff esponenziale con jitter
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.reconnect_buffer_age = reconnect_buffer_age # Pacchetti più vecchi scartati alla riconnessione
+        self.state = STATE_DISCONNECTED
+        self.state_listeners = []
+        self.connection_lost = threading.Event()
+        self.stop_event = threading.Event()
+        self.reconnect_count = 0
+        self.last_mode = None # Ultima modalità inviata, ripetuta dopo ogni riconnessione
+
+        # Protocollo v2: pacchetti struct con sequenza e timestamp
+        # (wide_moves: spostamenti oltre ±127 in un pacchetto 0x06 invece di tagliarli)
+        self.encoder = PacketEncoder(wide_moves=wide_moves)
+        # Coda di invio svuotata dal writer thread: il loop di visione non si blocca mai sull'I/O
+        self.send_queue = PacketSendQueue()
+        self.profiler = profiler # Se presente misura codifica + scrittura come fase 'transmit'
+        self.running = True
+        self.writer_thread = threading.Thread(target=self._writer_loop)
+        self.writer_thread.daemon = True
+
+        role = "server" if self.transport.is_server else "client"
+        print(f"Bluetooth Transmitter: Avvio come {role} su {self.transport.describe()}")
+
+        self.connection_thread = threading.Thread(target=self._supervise_connection)
         self.connection_thread.daemon = True # Il thread si chiuderà con il programma principale
         self.connection_thread.start()
+        self.writer_thread.start()
 
-    def _start_server(self):
-        try:
-            self.sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
-            self.sock.bind(("", self.port))
-            self.sock.listen(1) # Ascolta una singola connessione
-
-            bluetooth.advertise_service(
-                self.sock, "HeadMouseService",
-                service_id = self.uuid,
-                service_classes = [ self.uuid, bluetooth.SERIAL_PORT_CLASS ],
-                profiles = [ bluetooth.SERIAL_PORT_PROFILE ],
-                # Do not set protocols to avoid issues with some clients
-            )
-
-            print("In attesa di connessioni Bluetooth sul servizio HeadMouseService...")
-            self.client_sock, client_info = self.sock.accept()
-            print(f"Accettata connessione da {client_info}")
-            self.connected = True
-        except bluetooth.BluetoothError as e:
-            print(f"Errore Bluetooth come server: {e}")
-            self.connected = False
-        except Exception as e:
-            print(f"Errore generico in _start_server: {e}")
-            self.connected = False
+    def add_state_listener(self, callback):
+        """Registra una funzione chiamata con il nuovo stato ad ogni cambio di connessione"""
+        self.state_listeners.append(callback)
 
-    def _start_client(self):
-        try:
-            self.sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
-            self.sock.connect((self.target_address, self.port))
-            print(f"Connesso al dispositivo Bluetooth: {self.target_address}")
-            self.client_sock = self.sock # Client uses the main socket for sending
-            self.connected = True
-        except bluetooth.BluetoothError as e:
-            print(f"Errore Bluetooth come client: {e}")
-            self.connected = False
-            print("Tentativo di riconnessione in 5 secondi...")
-            time.sleep(5)
-            self._start_client() # Tentativo di riconnessione
-        except Exception as e:
-            print(f"Errore generico in _start_client: {e}")
-            self.connected = False
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        self.connected = state == STATE_CONNECTED
+        print(f"Stato Bluetooth: {state}")
+        for callback in self.state_listeners:
+            try:
+                callback(state)
+            except Exception as e:
+                print(f"Errore listener stato Bluetooth: {e}")
+
+    def _supervise_connection(self):
+        """
+        Unico thread di lunga durata che apre la connessione, attende che cada e la
+        riapre. I tentativi falliti aspettano un backoff esponenziale con jitter.
+        """
+        backoff = self.initial_backoff
+        while self.running:
+            self._set_state(STATE_CONNECTING)
+            try:
+                self.transport.connect()
+            except Exception as e:
+                if not self.running:
+                    break
+                print(f"Errore connessione Bluetooth: {e}")
+                self.transport.close() # Al prossimo tentativo la socket viene ricreata
+                self._set_state(STATE_DISCONNECTED)
+                delay = backoff * random.uniform(0.5, 1.0)
+                print(f"Nuovo tentativo di connessione tra {delay:.1f} secondi...")
+                self.stop_event.wait(delay)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            backoff = self.initial_backoff
+            self.connection_lost.clear()
+            # I pacchetti rimasti in coda durante la disconnessione partono solo se recenti
+            expired = self.send_queue.discard_older_than(self.reconnect_buffer_age)
+            if expired:
+                print(f"Scartati {expired} pacchetti troppo vecchi dopo la riconnessione")
+            # Il ricevitore potrebbe aver perso (o azzerato) la modalità durante l'interruzione
+            if self.last_mode is not None and not self.send_queue.has_pending(PACKET_MODE_SWITCH):
+                self.send_queue.put(PACKET_MODE_SWITCH, self.last_mode)
+            self._set_state(STATE_CONNECTED)
+
+            # Attende la perdita della connessione (segnalata da send_data) o la chiusura
+            while self.running and not self.connection_lost.wait(0.5):
+                pass
+            self.transport.disconnect()
+            if self.running:
+                self.reconnect_count += 1
+                self._set_state(STATE_DISCONNECTED)
+                print("Connessione Bluetooth persa. Riconnessione in corso...")
+
+        self._set_state(STATE_CLOSED)
 
     def send_data(self, data):
-        """Invia dati binari attraverso la connessione Bluetooth."""
-        if self.connected and self.client_sock:
+        """Invia dati binari attraverso il trasporto."""
+        if self.connected:
             try:
-                with self.lock:
-                    self.client_sock.sendall(data)
+                self.transport.send(data) # Solo il writer thread scrive sul trasporto
                 return True
-            except bluetooth.BluetoothError as e:
-                print(f"Errore invio dati Bluetooth: {e}")
-                self.connected = False # Segnaliamo la disconnessione
-                self.client_sock.close()
-                self.client_sock = None
-                print("Connessione Bluetooth persa. Riavvio tentativo di connessione...")
-                if self.is_server:
-                    self.connection_thread = threading.Thread(target=self._start_server)
-                else:
-                    self.connection_thread = threading.Thread(target=self._start_client)
-                self.connection_thread.daemon = True
-                self.connection_thread.start()
-                return False
             except Exception as e:
-                print(f"Errore generico invio dati: {e}")
+                print(f"Errore invio dati Bluetooth: {e}")
+                self.connected = False # Segnaliamo la disconnessione al supervisore
+                self.connection_lost.set()
                 return False
         return False
 
+    def _writer_loop(self):
+        """Svuota la coda di invio; se la connessione non c'è i pacchetti restano in coda"""
+        while self.running:
+            if not self.connected:
+                time.sleep(0.05)
+                continue
+            entry = self.send_queue.get(timeout=0.1)
+            if entry is None:
+                continue
+
+            profiler = self.profiler
+            if profiler is not None:
+                start = profiler.start()
+            sequence = self.encoder.sequence
+            if entry.packet_type == PACKET_MOVE:
+                packet = self.encoder.move(*entry.fields, merged=entry.merged)
+            elif entry.packet_type == PACKET_SCROLL:
+                packet = self.encoder.scroll(*entry.fields)
+            else:
+                packet = self.encoder.encode(entry.packet_type, *entry.fields)
+
+            sent = self.send_data(packet)
+            if profiler is not None:
+                profiler.record('transmit', start)
+            if sent:
+                self.send_queue.record_sent(entry)
+                continue
+            # Il pacchetto non è partito: il numero di sequenza torna libero, così il
+            # ricevitore non conta come perso un pacchetto mai trasmesso
+            self.encoder.sequence = sequence
+            if entry.packet_type not in COLLAPSIBLE_PACKETS:
+                self.send_queue.requeue(entry) # Click e cambi modalità non vanno persi
+
+    def send_move(self, dx, dy, speed):
+        """Accoda un movimento del cursore (accorpato con quello in attesa, se presente)"""
+        self.send_queue.put_move(dx, dy, speed)
+        return True
+
+    def send_scroll(self, amount):
+        self.send_queue.put_scroll(amount)
+        return True
+
+    def send_left_click(self):
+        self.send_queue.put(PACKET_LEFT_CLICK)
+        return True
+
+    def send_right_click(self):
+        self.send_queue.put(PACKET_RIGHT_CLICK)
+        return True
+
+    def send_mode_switch(self, mode):
+        self.last_mode = mode
+        self.send_queue.put(PACKET_MODE_SWITCH, mode)
+        return True
+
+    def get_queue_metrics(self):
+        """Metriche della coda di invio (profondità, latenza, pacchetti accorpati/scartati)"""
+        return self.send_queue.get_metrics()
+
     def close(self):
         """Chiude le connessioni Bluetooth."""
-        if self.client_sock:
-            try:
-                self.client_sock.close()
-            except Exception as e:
-                print(f"Errore chiusura client_sock: {e}")
-        if self.sock:
-            try:
-                self.sock.close()
-            except Exception as e:
-                print(f"Errore chiusura sock: {e}")
-        self.connected = False
+        self.running = False
+        self.stop_event.set()
+        self.connection_lost.set()
+        self.send_queue.close()
+        if self.writer_thread.is_alive():
+            self.writer_thread.join(timeout=1.0)
+        print(f"Coda di invio: {self.get_queue_metrics()}")
+        self.transport.close() # Sblocca anche un eventuale accept() in corso
+        self._set_state(STATE_CLOSED)
         print("Connessioni Bluetooth chiuse.")
 
 
@@ -184,6 +282,17 @@ class BaseEvent:
         """Metodo astratto per verificare se l'evento è attivo"""
         raise NotImplementedError
 
+    def get_landmark_indices(self):
+        """Restituisce gli indici dei landmark (0-477) usati dall'evento"""
+        return ()
+
+    def bind_landmarks(self, slot_map):
+        """
+        Riceve dal controller la mappa indice landmark -> riga dell'array compatto.
+        Dopo il binding check_event legge l'array compatto invece della mesh completa.
+        """
+        pass
+
 
 class BaseAction:
     """Classe base per tutte le azioni"""
@@ -229,7 +338,8 @@ class Calibration_action:
 
 class NoseJoystick_event(BaseEvent):
     """Classe per rilevare gli eventi del joystick del naso"""
-    def __init__(self, deadzone_radius=15.0, max_acceleration_distance=200.0):
+    def __init__(self, deadzone_radius=15.0, max_acceleration_distance=200.0, tracking_index=4):
+        self.TRACKING_POINT = tracking_index
         self.deadzone_radius = deadzone_radius
         self.max_acceleration_distance = max_acceleration_distance
         self.outside_deadzone_start_time = None
@@ -300,39 +410,75 @@ class NoseJoystick_event(BaseEvent):
         self.outside_deadzone_start_time = None
         self.edge_time_start = None
     
+    def get_landmark_indices(self):
+        """Il joystick usa solo il punto di tracking (punta del naso)"""
+        return (self.TRACKING_POINT,)
+
     def check_event(self, tracking_point, center_position):
         """Implementazione del metodo base per verificare l'evento"""
         return self.is_outside_deadzone(tracking_point, center_position)
 
 
-class OpenMouth_event(BaseEvent):
+class Gesture_event(BaseEvent):
+    """
+    Classe base per i gesti a soglia (occhi, bocca).
+    Il rapporto è la distanza verticale tra due landmark normalizzata; smoothing e
+    macchina a stati soglia/durata sono calcolati per tutti i gesti dal GestureEngine.
+    """
+    def __init__(self, top_index, bottom_index, threshold, duration, active_below):
+        self.top_index = top_index
+        self.bottom_index = bottom_index
+        # Righe lette dall'engine (indici globali finché non c'è un binding)
+        self.top_slot = top_index
+        self.bottom_slot = bottom_index
+        self.threshold = threshold
+        self.duration_required = duration
+        self.active_below = active_below # True: gesto attivo sotto soglia (occhi)
+        self.engine = None
+        self.engine_slot = None
+
+    def get_landmark_indices(self):
+        return (self.top_index, self.bottom_index)
+
+    def bind_landmarks(self, slot_map):
+        self.top_slot = slot_map[self.top_index]
+        self.bottom_slot = slot_map[self.bottom_index]
+
+    def attach_engine(self, engine, slot):
+        """Collega l'evento alla sua riga nel GestureEngine"""
+        self.engine = engine
+        self.engine_slot = slot
+
+    def is_engaged(self):
+        """True se il gesto è in corso (occhio chiuso / bocca aperta)"""
+        return self.engine is not None and self.engine.is_engaged(self.engine_slot)
+
+    def on_release(self):
+        """Chiamato dall'engine quando il gesto viene rilasciato"""
+        pass
+
+    def check_event(self, landmarks):
+        """Restituisce il risultato calcolato dal GestureEngine per il frame corrente"""
+        return self.engine is not None and self.engine.has_fired(self.engine_slot)
+
+
+class OpenMouth_event(Gesture_event):
     """Classe per rilevare l'apertura della bocca"""
     def __init__(self, upper_lip_index=13, lower_lip_index=14, threshold=0.15, duration=0.5):
+        super().__init__(upper_lip_index, lower_lip_index, threshold, duration, active_below=False)
         self.UPPER_LIP = upper_lip_index
         self.LOWER_LIP = lower_lip_index
-        self.open_threshold = threshold
-        self.open_duration_required = duration
-        self.open_start_time = None
-        self.mouth_open = False
-        self.event_detected = False
-        self.mouth_history = deque(maxlen=3)
         self.neutral_mouth_y = None # Used for potential vertical scrolling
-    
-    def calculate_mouth_openness(self, landmarks):
-        """Calcola l'apertura della bocca"""
-        try:
-            upper_lip = landmarks[self.UPPER_LIP]
-            lower_lip = landmarks[self.LOWER_LIP]
-            openness = abs(upper_lip[1] - lower_lip[1]) / 25.0 # Normalized by an approximate face size
-            return openness
-        except:
-            return 0.0
-            
+
+    @property
+    def mouth_open(self):
+        return self.is_engaged()
+
     def get_vertical_offset(self, landmarks):
         """Calcola l'offset verticale del centro della bocca rispetto a una posizione neutra"""
         try:
-            upper_lip_y = landmarks[self.UPPER_LIP][1]
-            lower_lip_y = landmarks[self.LOWER_LIP][1]
+            upper_lip_y = landmarks[self.top_slot][1]
+            lower_lip_y = landmarks[self.bottom_slot][1]
             current_mouth_center_y = (upper_lip_y + lower_lip_y) / 2
             
             # Calibrate neutral position only once when mouth is considered closed/neutral
@@ -344,45 +490,13 @@ class OpenMouth_event(BaseEvent):
         except:
             return 0.0
 
-    def detect_open_mouth(self, landmarks):
-        """Rileva apertura bocca solo se mantenuta per il tempo richiesto"""
-        openness = self.calculate_mouth_openness(landmarks)
-        self.mouth_history.append(openness)
-        
-        # Stabilizza con media mobile
-        stable_openness = np.mean(list(self.mouth_history)) if self.mouth_history else openness
-        current_time = time.time()
-        
-        # Se la bocca è aperta (sopra la soglia)
-        if stable_openness > self.open_threshold:
-            if not self.mouth_open and not self.event_detected:
-                # Inizia l'apertura
-                self.mouth_open = True
-                self.open_start_time = current_time
-            elif (self.mouth_open and 
-                  not self.event_detected and 
-                  self.open_start_time is not None and 
-                  current_time - self.open_start_time >= self.open_duration_required):
-                # Bocca aperta abbastanza a lungo - registra l'evento
-                self.event_detected = True
-                return True
-        else:
-            # Bocca chiusa - resetta lo stato
-            if self.mouth_open:
-                self.mouth_open = False
-                self.open_start_time = None
-                self.event_detected = False  # Reset per permettere nuovo rilevamento
-                self.neutral_mouth_y = None # Reset neutral position on close
-        
-        return False
+    def on_release(self):
+        """Bocca chiusa: resetta la posizione neutra"""
+        self.neutral_mouth_y = None
     
     def is_mouth_open(self):
         """Restituisce se la bocca è attualmente aperta"""
         return self.mouth_open
-    
-    def check_event(self, landmarks):
-        """Implementazione del metodo base per verificare l'evento"""
-        return self.detect_open_mouth(landmarks)
 
 
 class SwitchMode_action(BaseAction):
@@ -409,72 +523,77 @@ class SwitchMode_action(BaseAction):
 
 class MouseCursor_action(BaseAction):
     """Classe per calcolare il movimento direzionale e inviarlo via Bluetooth."""
-    def __init__(self, screen_w, screen_h, bt_transmitter):
+    def __init__(self, screen_w, screen_h, bt_transmitter, filter_kind=FILTER_ONE_EURO, filter_params=None,
+                 scheduler=None):
         self.screen_w = screen_w
         self.screen_h = screen_h
         # current_mouse_pos will be a virtual position for display only
         self.current_mouse_pos = np.array([screen_w // 2, screen_h // 2], dtype=float) 
-        self.position_history = deque(maxlen=5) # Usato per lo smoothing del movimento
+        # Smoothing del movimento: un filtro scalare per asse (vedi filters.py)
+        self.filter_x = create_filter(filter_kind, **(filter_params or {}))
+        self.filter_y = create_filter(filter_kind, **(filter_params or {}))
+        # MotionScheduler opzionale: interpola i movimenti tra i frame (None = un pacchetto per frame)
+        self.scheduler = scheduler
+        # Resti frazionari per asse: i movimenti lenti (< 1 unità per frame) si sommano invece di perdersi
+        self.residual_x = 0.0
+        self.residual_y = 0.0
         self.base_sensitivity = 4.0
         self.bt_transmitter = bt_transmitter # Riferimento al trasmettitore Bluetooth
 
     def send_directional_movement(self, direction, acceleration_factor, effective_distance):
         """
-        Invia la direzione e il fattore di velocità al dispositivo Bluetooth.
-        Il formato del pacchetto è:
-        [Byte 0: Tipo di pacchetto (0x01 per movimento)]
-        [Byte 1: Segno X (0 per negativo, 1 per positivo)]
-        [Byte 2: Valore assoluto X (0-255)]
-        [Byte 3: Segno Y (0 per negativo, 1 per positivo)]
-        [Byte 4: Valore assoluto Y (0-255)]
-        [Byte 5: Fattore Velocità (0-255)]
+        Invia la direzione e il fattore di velocità al dispositivo Bluetooth
+        come pacchetto di movimento del protocollo v2: dx e dy con segno
+        (0x01 fino a ±127, 0x06 a 16 bit oltre), fattore velocità (0-255) e
+        numero di movimenti accorpati (vedi headmouse_protocol). La parte
+        frazionaria dello spostamento resta nell'accumulatore per il frame dopo.
         """
         if direction is None:
+            # Nella zona morta il movimento si ferma subito: il filtro riparte da zero
+            self.stop()
             return
 
         # Calcola movimento relativo
         # Questi valori sono ora utilizzati per SCALARE l'input direzionale
         # Non sono più pixel di movimento, ma l'intensità del movimento
-        raw_movement_x = direction[0] * self.base_sensitivity * acceleration_factor * effective_distance * 0.1
-        raw_movement_y = direction[1] * self.base_sensitivity * acceleration_factor * effective_distance * 0.1
+        scale = self.base_sensitivity * acceleration_factor * effective_distance * 0.1
+        now = time.monotonic()
 
-        # Smoothing
-        self.position_history.append(np.array([raw_movement_x, raw_movement_y]))
-        smoothed_movement = np.mean(self.position_history, axis=0) if self.position_history else np.array([0.0, 0.0])
+        # Smoothing (solo float, nessun array allocato per frame)
+        smoothed_x = self.filter_x.filter(float(direction[0]) * scale, now)
+        smoothed_y = self.filter_y.filter(float(direction[1]) * scale, now)
 
-        # Normalizza la direzione per l'invio
-        # Limita i valori a un range accettabile (e.g., -127 a 127)
-        max_val = 100.0 # Valore massimo per il componente direzionale
-        move_x = int(np.clip(smoothed_movement[0], -max_val, max_val))
-        move_y = int(np.clip(smoothed_movement[1], -max_val, max_val))
-
-        # Codifica per l'invio Bluetooth
-        packet_type = 0x01 # Movimento cursore
-        
-        sign_x = 1 if move_x >= 0 else 0
-        abs_x = abs(move_x)
-
-        sign_y = 1 if move_y >= 0 else 0
-        abs_y = abs(move_y)
+        # Limita i valori al range del pacchetto esteso (int16)
+        max_val = 32767.0
+        smoothed_x = min(max(smoothed_x, -max_val), max_val)
+        smoothed_y = min(max(smoothed_y, -max_val), max_val)
 
         # Il fattore velocità potrebbe essere un valore separato o derivato da acceleration_factor
-        # Per ora, usiamo una scala semplice per acceleration_factor da 1 a 4 (0-255)
-        # Assicurati che acceleration_factor sia sempre positivo
-        # speed_factor = int(np.clip((acceleration_factor - 1.0) / 3.0 * 255, 0, 255))
         # Utilizziamo effective_distance come base per la velocità, scalato
-        speed_factor = int(np.clip(effective_distance * self.base_sensitivity * 0.5, 0, 255)) # Scale effective_distance
-
-        # Esempio di pacchetto (6 byte)
-        data_to_send = bytearray([
-            packet_type,
-            sign_x,
-            abs_x & 0xFF, # Assicurati che sia un byte
-            sign_y,
-            abs_y & 0xFF, # Assicurati che sia un byte
-            speed_factor & 0xFF # Assicurati che sia un byte
-        ])
-        
-        self.bt_transmitter.send_data(data_to_send)
+        speed_factor = int(min(max(effective_distance * self.base_sensitivity * 0.5, 0), 255)) # Scale effective_distance
+
+        if self.scheduler is not None:
+            # Il thread del MotionScheduler distribuisce lo spostamento fino al prossimo frame
+            # (e accumula lui i resti frazionari)
+            self.scheduler.set_motion(smoothed_x, smoothed_y, speed_factor)
+            return
+
+        self.residual_x += smoothed_x
+        self.residual_y += smoothed_y
+        move_x = int(self.residual_x)
+        move_y = int(self.residual_y)
+        self.residual_x -= move_x
+        self.residual_y -= move_y
+        if move_x or move_y:
+            self.bt_transmitter.send_move(move_x, move_y, speed_factor)
+
+    def stop(self):
+        """Ferma il movimento (zona morta, pausa, cambio modalità)"""
+        self.filter_x.reset()
+        self.filter_y.reset()
+        self.residual_x = self.residual_y = 0.0
+        if self.scheduler is not None:
+            self.scheduler.stop()
 
     def freeze_position(self):
         # Questo è ora puramente visivo per la finestra della webcam
@@ -504,55 +623,37 @@ class MouseCursor_action(BaseAction):
 
 class Scroll_action(BaseAction):
     """Classe per eseguire lo scrolling inviando comandi via Bluetooth."""
-    def __init__(self, bt_transmitter, scroll_cooldown=0.03):
+    def __init__(self, bt_transmitter, scroll_cooldown=0.03, filter_kind=FILTER_ONE_EURO, filter_params=None):
         self.scroll_cooldown = scroll_cooldown
         self.last_scroll_time = 0
         self.scroll_sensitivity = 2.0
-        self.scroll_history = deque(maxlen=3)
+        self.scroll_filter = create_filter(filter_kind, **(filter_params or {}))
         self.bt_transmitter = bt_transmitter # Riferimento al trasmettitore Bluetooth
     
     def perform_scroll(self, direction, effective_distance):
         """
-        Esegue lo scrolling inviando la direzione e l'intensità dello scroll via Bluetooth.
-        Formato del pacchetto:
-        [Byte 0: Tipo di pacchetto (0x02 per scroll)]
-        [Byte 1: Segno Scroll Y (0 per up, 1 per down)]
-        [Byte 2: Valore assoluto Scroll Y (0-255)]
-        [Byte 3-5: Riservato/Padding]
+        Esegue lo scrolling inviando la direzione e l'intensità dello scroll via Bluetooth
+        come pacchetto di scroll (0x02) del protocollo v2: quantità con segno
+        (positiva = giù), limitata a -255..255.
         """
         current_time = time.time()
         if current_time - self.last_scroll_time < self.scroll_cooldown:
             return False
         
         if direction is None:
+            self.scroll_filter.reset()
             return False
 
         # direction[1] per scroll verticale (Y-axis)
-        raw_scroll_amount = -direction[1] * effective_distance * 0.1 * self.scroll_sensitivity
-        self.scroll_history.append(raw_scroll_amount)
-        smoothed_scroll = np.mean(self.scroll_history) if self.scroll_history else raw_scroll_amount
+        raw_scroll_amount = -float(direction[1]) * effective_distance * 0.1 * self.scroll_sensitivity
+        smoothed_scroll = self.scroll_filter.filter(raw_scroll_amount, time.monotonic())
         
         scroll_value = int(smoothed_scroll)
         
         if abs(scroll_value) > 0:
-            packet_type = 0x02 # Scroll
-            
-            sign_y = 1 if scroll_value > 0 else 0 # 1 for down (positive y), 0 for up (negative y)
-            abs_y = abs(scroll_value)
-            
-            # Limita il valore dello scroll a un byte
-            abs_y = min(abs_y, 255)
-
-            data_to_send = bytearray([
-                packet_type,
-                sign_y,
-                abs_y & 0xFF,
-                0x00, # Padding
-                0x00, # Padding
-                0x00  # Padding
-            ])
-            
-            self.bt_transmitter.send_data(data_to_send)
+            # Limita il valore dello scroll come nel vecchio formato a un byte
+            scroll_value = min(max(scroll_value, -255), 255)
+            self.bt_transmitter.send_scroll(scroll_value)
             self.last_scroll_time = current_time
             return True
         return False
@@ -567,66 +668,20 @@ class Scroll_action(BaseAction):
         return self.perform_scroll(direction, effective_distance)
 
 
-class LeftEye_event(BaseEvent):
+class LeftEye_event(Gesture_event):
     """Classe per rilevare la chiusura dell'occhio sinistro"""
-    def __init__(self, top_index=159, bottom_index=145, blink_duration=0.3):
+    def __init__(self, top_index=159, bottom_index=145, blink_duration=0.3, threshold=0.10):
+        super().__init__(top_index, bottom_index, threshold, blink_duration, active_below=True)
         self.LEFT_EYE_TOP = top_index
         self.LEFT_EYE_BOTTOM = bottom_index
-        self.blink_threshold = 0.10
-        self.blink_duration_required = blink_duration
-        self.blink_start_time = None
-        self.eye_closed = False
-        self.blink_detected = False
-        self.ear_history = deque(maxlen=3)
-    
-    def calculate_eye_aspect_ratio(self, landmarks):
-        """Calcola EAR per l'occhio sinistro"""
-        try:
-            top = landmarks[self.LEFT_EYE_TOP]
-            bottom = landmarks[self.LEFT_EYE_BOTTOM]
-            ear = abs(top[1] - bottom[1]) / 25.0
-            return ear
-        except:
-            return 0.2  # Valore default sicuro
-    
-    def detect_blink(self, landmarks):
-        """Rileva blink dell'occhio sinistro solo se chiuso per il tempo richiesto"""
-        ear = self.calculate_eye_aspect_ratio(landmarks)
-        self.ear_history.append(ear)
-        
-        # Stabilizza con media mobile
-        stable_ear = np.mean(list(self.ear_history)) if self.ear_history else ear
-        current_time = time.time()
-        
-        # Se l'occhio è chiuso (sotto la soglia)
-        if stable_ear < self.blink_threshold:
-            if not self.eye_closed and not self.blink_detected:
-                # Inizia il blink
-                self.eye_closed = True
-                self.blink_start_time = current_time
-            elif (self.eye_closed and 
-                  not self.blink_detected and 
-                  self.open_start_time is not None and # Changed from self.open_start_time to self.blink_start_time
-                  current_time - self.blink_start_time >= self.blink_duration_required):
-                # Occhio chiuso abbastanza a lungo - registra il blink
-                self.blink_detected = True
-                return True
-        else:
-            # Occhio aperto - resetta lo stato
-            if self.eye_closed:
-                self.eye_closed = False
-                self.blink_start_time = None
-                self.blink_detected = False  # Reset per permettere nuovo rilevamento
-        
-        return False
+
+    @property
+    def eye_closed(self):
+        return self.is_engaged()
     
     def is_eye_closed(self):
         """Restituisce se l'occhio è attualmente chiuso"""
         return self.eye_closed
-    
-    def check_event(self, landmarks):
-        """Implementazione del metodo base per verificare l'evento"""
-        return self.detect_blink(landmarks)
 
 
 class LeftClick_action(BaseAction):
@@ -638,19 +693,15 @@ class LeftClick_action(BaseAction):
     
     def perform_click(self):
         """
-        Esegue click sinistro inviando un comando via Bluetooth.
-        Formato del pacchetto:
-        [Byte 0: Tipo di pacchetto (0x03 per click sinistro)]
-        [Byte 1-5: Riservato/Padding]
+        Esegue click sinistro inviando un comando via Bluetooth
+        (pacchetto 0x03 del protocollo v2, senza payload).
         """
         current_time = time.time()
         if current_time - self.last_click_time < self.click_cooldown:
             return False
         
         try:
-            packet_type = 0x03 # Click sinistro
-            data_to_send = bytearray([packet_type, 0x00, 0x00, 0x00, 0x00, 0x00])
-            self.bt_transmitter.send_data(data_to_send)
+            self.bt_transmitter.send_left_click()
             print(f"Click SINISTRO (via Bluetooth)")
             self.last_click_time = current_time
             return True
@@ -658,71 +709,25 @@ class LeftClick_action(BaseAction):
             print(f"Errore click sinistro (Bluetooth): {e}")
             return False
     
-    def execute(self, mouse_position): # mouse_position non è più usato direttamente
+    def execute(self, mouse_position=None): # mouse_position non è più usato direttamente
         """Implementazione del metodo base per eseguire l'azione."""
         return self.perform_click()
 
 
-class RightEye_event(BaseEvent):
+class RightEye_event(Gesture_event):
     """Classe per rilevare la chiusura dell'occhio destro"""
-    def __init__(self, top_index=386, bottom_index=374, blink_duration=0.3):
+    def __init__(self, top_index=386, bottom_index=374, blink_duration=0.3, threshold=0.10):
+        super().__init__(top_index, bottom_index, threshold, blink_duration, active_below=True)
         self.RIGHT_EYE_TOP = top_index
         self.RIGHT_EYE_BOTTOM = bottom_index
-        self.blink_threshold = 0.10
-        self.blink_duration_required = blink_duration
-        self.blink_start_time = None
-        self.eye_closed = False
-        self.blink_detected = False
-        self.ear_history = deque(maxlen=3)
-    
-    def calculate_eye_aspect_ratio(self, landmarks):
-        """Calcola EAR per l'occhio destro"""
-        try:
-            top = landmarks[self.RIGHT_EYE_TOP]
-            bottom = landmarks[self.RIGHT_EYE_BOTTOM]
-            ear = abs(top[1] - bottom[1]) / 25.0
-            return ear
-        except:
-            return 0.2  # Valore default sicuro
-    
-    def detect_blink(self, landmarks):
-        """Rileva blink dell'occhio destro solo se chiuso per il tempo richiesto"""
-        ear = self.calculate_eye_aspect_ratio(landmarks)
-        self.ear_history.append(ear)
-        
-        # Stabilizza con media mobile
-        stable_ear = np.mean(list(self.ear_history)) if self.ear_history else ear
-        current_time = time.time()
-        
-        # Se l'occhio è chiuso (sotto la soglia)
-        if stable_ear < self.blink_threshold:
-            if not self.eye_closed and not self.blink_detected:
-                # Inizia il blink
-                self.eye_closed = True
-                self.blink_start_time = current_time
-            elif (self.eye_closed and 
-                  not self.blink_detected and 
-                  self.blink_start_time is not None and 
-                  current_time - self.blink_start_time >= self.blink_duration_required):
-                # Occhio chiuso abbastanza a lungo - registra il blink
-                self.blink_detected = True
-                return True
-        else:
-            # Occhio aperto - resetta lo stato
-            if self.eye_closed:
-                self.eye_closed = False
-                self.blink_start_time = None
-                self.blink_detected = False  # Reset per permettere nuovo rilevamento
-        
-        return False
+
+    @property
+    def eye_closed(self):
+        return self.is_engaged()
     
     def is_eye_closed(self):
         """Restituisce se l'occhio è attualmente chiuso"""
         return self.eye_closed
-    
-    def check_event(self, landmarks):
-        """Implementazione del metodo base per verificare l'evento"""
-        return self.detect_blink(landmarks)
 
 
 class RightClick_action(BaseAction):
@@ -734,19 +739,15 @@ class RightClick_action(BaseAction):
     
     def perform_click(self):
         """
-        Esegue click destro inviando un comando via Bluetooth.
-        Formato del pacchetto:
-        [Byte 0: Tipo di pacchetto (0x04 per click destro)]
-        [Byte 1-5: Riservato/Padding]
+        Esegue click destro inviando un comando via Bluetooth
+        (pacchetto 0x04 del protocollo v2, senza payload).
         """
         current_time = time.time()
         if current_time - self.last_click_time < self.click_cooldown:
             return False
         
         try:
-            packet_type = 0x04 # Click destro
-            data_to_send = bytearray([packet_type, 0x00, 0x00, 0x00, 0x00, 0x00])
-            self.bt_transmitter.send_data(data_to_send)
+            self.bt_transmitter.send_right_click()
             print(f"Click DESTRO (via Bluetooth)")
             self.last_click_time = current_time
             return True
@@ -754,12 +755,26 @@ class RightClick_action(BaseAction):
             print(f"Errore click destro (Bluetooth): {e}")
             return False
     
-    def execute(self, mouse_position): # mouse_position non è più usato direttamente
+    def execute(self, mouse_position=None): # mouse_position non è più usato direttamente
         """Implementazione del metodo base per eseguire l'azione."""
         return self.perform_click()
 
+class EventActionMapping:
+    """
+    Mappatura evento-azione compilata: handler è una funzione senza argomenti
+    (gli argomenti dell'azione sono già legati), None per gli eventi continui
+    gestiti altrove (joystick del naso).
+    """
+    __slots__ = ('event', 'action', 'handler', 'modes')
+
+    def __init__(self, event, action, handler, modes):
+        self.event = event
+        self.action = action
+        self.handler = handler
+        self.modes = modes # Modalità in cui l'azione è attiva
+
 class HeadMouseController:
-    def __init__(self, show_window=True, user_config=None, bt_transmitter=None):
+    def __init__(self, show_window=True, user_config=None, bt_transmitter=None, profiler=None):
         # MediaPipe setup
         self.mp_face_mesh = mp.solutions.face_mesh
         self.face_mesh = self.mp_face_mesh.FaceMesh(
@@ -769,11 +784,14 @@ class HeadMouseController:
             min_tracking_confidence=0.8
         )
 
-        # Get screen dimensions using pyautogui (only for screen size, then remove it)
-        # These dimensions are now primarily for virtual cursor display and calibration logic
-        import pyautogui 
-        self.screen_w, self.screen_h = pyautogui.size() 
-        del pyautogui # Remove pyautogui from memory after getting screen size
+        # Dimensioni dello schermo per il cursore virtuale e la ricalibrazione:
+        # user_config['screen_size'] (es. replay senza display), altrimenti chieste a pyautogui
+        screen_size = (user_config or {}).get('screen_size')
+        if screen_size is None:
+            import pyautogui
+            screen_size = pyautogui.size()
+            del pyautogui # Serve solo per le dimensioni dello schermo
+        self.screen_w, self.screen_h = (int(v) for v in screen_size)
 
         # Landmark indices
         self.NOSE_TIP = 4
@@ -781,92 +799,172 @@ class HeadMouseController:
         self.LOWER_LIP = 14
         
         self.bt_transmitter = bt_transmitter # Assegnazione del trasmettitore Bluetooth
+        self.profiler = profiler # StageProfiler opzionale (None = profilazione disattivata)
+
+        # User configuration
+        self.user_config = user_config if user_config else {}
 
         # Inizializzazione delle classi degli eventi e delle azioni
         self.calibration = Calibration_action()
-        self.nose_joystick = NoseJoystick_event()
+        self.nose_joystick = NoseJoystick_event(tracking_index=self.NOSE_TIP)
         # Passiamo il trasmettitore Bluetooth alle azioni che lo useranno
-        self.mouse_cursor = MouseCursor_action(self.screen_w, self.screen_h, self.bt_transmitter)
-        self.scroll_action = Scroll_action(self.bt_transmitter)
+        # Movimento interpolato a 'output_rate_hz' (60-250) tra i frame; 0 = un pacchetto per frame
+        output_rate_hz = self.user_config.get('output_rate_hz', 0)
+        self.motion_scheduler = (MotionScheduler(self.bt_transmitter.send_move, rate_hz=output_rate_hz)
+                                 if output_rate_hz else None)
+        # Filtri di smoothing scelti in user_config ('movement_filter' / 'scroll_filter' + '_params')
+        self.mouse_cursor = MouseCursor_action(
+            self.screen_w, self.screen_h, self.bt_transmitter,
+            filter_kind=self.user_config.get('movement_filter', FILTER_ONE_EURO),
+            filter_params=self.user_config.get('movement_filter_params'),
+            scheduler=self.motion_scheduler)
+        self.scroll_action = Scroll_action(
+            self.bt_transmitter,
+            filter_kind=self.user_config.get('scroll_filter', FILTER_ONE_EURO),
+            filter_params=self.user_config.get('scroll_filter_params'))
         self.open_mouth_event = OpenMouth_event(self.UPPER_LIP, self.LOWER_LIP)
         self.switch_mode_action = SwitchMode_action()
         self.left_eye_event = LeftEye_event()
         self.right_eye_event = RightEye_event()
         self.left_click_action = LeftClick_action(self.bt_transmitter)
         self.right_click_action = RightClick_action(self.bt_transmitter)
+
+        # Conversione landmark: gli indici vengono scelti in setup_event_action_mappings.
+        # Il frame non viene specchiato: l'effetto specchio è applicato ai landmark
+        self.landmark_adapter = LandmarkAdapter(mirror=True)
+        self.gesture_engine = GestureEngine()
+        self.nose_slot = self.NOSE_TIP
         
-        # User configuration
-        self.user_config = user_config if user_config else {}
         self.scroll_direction_source = self.user_config.get('scroll_direction', 'nose up/down')
+        self.show_window = show_window
+        # FaceMesh solo sulla regione attorno al viso del frame precedente
+        self.roi_tracker = FaceRoiTracker(enabled=self.user_config.get('face_roi', 'si') == 'si')
 
-        # Dizionario per le associazioni evento-azione
+        # Associazioni evento-azione e piano di dispatch compilato da esse
         self.event_action_mappings = []
+        self.dispatch_plan = {}
         self.setup_event_action_mappings() # Setup mappings based on user config
         
         # Stato applicazione
-        self.show_window = show_window
         self.paused = False
         self.current_mode = 'pointer'  # 'pointer' o 'scroll'
         self.last_mouse_pos_before_scroll = None # Ora una posizione VIRTUAL
 
-    def add_event_action_mapping(self, event, action, event_args_mapper, action_args_mapper):
+    def add_event_action_mapping(self, event, action, handler, modes=('pointer', 'scroll')):
         """Aggiunge una mappatura evento-azione"""
-        self.event_action_mappings.append({
-            'event': event,
-            'action': action,
-            'event_args_mapper': event_args_mapper,
-            'action_args_mapper': action_args_mapper
-        })
+        self.event_action_mappings.append(EventActionMapping(event, action, handler, modes))
+
+    def add_gesture_mapping(self, choice, action):
+        """Collega l'azione al gesto scelto dall'utente ('left eye', 'right eye', 'mouth open')"""
+        event = {
+            'left eye': self.left_eye_event,
+            'right eye': self.right_eye_event,
+            'mouth open': self.open_mouth_event,
+        }.get(choice)
+        if event is None:
+            return
+        if action is self.switch_mode_action:
+            # Il cambio modalità è attivo in entrambe le modalità
+            self.add_event_action_mapping(event, action, self.switch_mode)
+        else:
+            # I click solo in modalità pointer
+            self.add_event_action_mapping(event, action, action.perform_click, modes=('pointer',))
 
     def setup_event_action_mappings(self):
         """Configura le mappature evento-azione in base alla configurazione utente"""
         self.event_action_mappings = [] # Reset existing mappings
 
-        # Always add nose joystick mapping for cursor movement
-        self.add_event_action_mapping(
-            event=self.nose_joystick,
-            action=self.mouse_cursor,
-            event_args_mapper=lambda tp, lm, mp: (tp, self.calibration.center_position),
-            action_args_mapper=lambda tp, lm, mp: self.nose_joystick.get_movement_vector(tp, self.calibration.center_position)
-        )
+        # Il joystick del naso muove il cursore in process_nose_movement (evento continuo)
+        self.add_event_action_mapping(self.nose_joystick, self.mouse_cursor, None)
 
-        # Left Click mapping
-        if self.user_config.get('left_click') == 'right eye':
-            self.add_event_action_mapping(self.right_eye_event, self.left_click_action, 
-                                          lambda tp, lm, mp: (lm,), lambda tp, lm, mp: ()) # No mouse pos for action
-        elif self.user_config.get('left_click') == 'left eye':
-            self.add_event_action_mapping(self.left_eye_event, self.left_click_action, 
-                                          lambda tp, lm, mp: (lm,), lambda tp, lm, mp: ())
-        elif self.user_config.get('left_click') == 'mouth open':
-            self.add_event_action_mapping(self.open_mouth_event, self.left_click_action, 
-                                          lambda tp, lm, mp: (lm,), lambda tp, lm, mp: ())
-
-        # Right Click mapping
-        if self.user_config.get('right_click') == 'right eye':
-            self.add_event_action_mapping(self.right_eye_event, self.right_click_action, 
-                                          lambda tp, lm, mp: (lm,), lambda tp, lm, mp: ())
-        elif self.user_config.get('right_click') == 'left eye':
-            self.add_event_action_mapping(self.left_eye_event, self.right_click_action, 
-                                          lambda tp, lm, mp: (lm,), lambda tp, lm, mp: ())
-        elif self.user_config.get('right_click') == 'mouth open':
-            self.add_event_action_mapping(self.open_mouth_event, self.right_click_action, 
-                                          lambda tp, lm, mp: (lm,), lambda tp, lm, mp: ())
-        
-        # Mode Switch mapping
-        if self.user_config.get('mode_switch') == 'right eye':
-            self.add_event_action_mapping(self.right_eye_event, self.switch_mode_action,
-                                          lambda tp, lm, mp: (lm,), lambda tp, lm, mp: (self.current_mode,))
-        elif self.user_config.get('mode_switch') == 'left eye':
-            self.add_event_action_mapping(self.left_eye_event, self.switch_mode_action,
-                                          lambda tp, lm, mp: (lm,), lambda tp, lm, mp: (self.current_mode,))
-        elif self.user_config.get('mode_switch') == 'mouth open':
-            self.add_event_action_mapping(self.open_mouth_event, self.switch_mode_action,
-                                          lambda tp, lm, mp: (lm,), lambda tp, lm, mp: (self.current_mode,))
+        self.add_gesture_mapping(self.user_config.get('left_click'), self.left_click_action)
+        self.add_gesture_mapping(self.user_config.get('right_click'), self.right_click_action)
+        self.add_gesture_mapping(self.user_config.get('mode_switch'), self.switch_mode_action)
+
+        self.setup_landmark_subset()
+        self.compile_dispatch_plan()
+
+    def compile_dispatch_plan(self):
+        """
+        Compila le mappature in un piano di dispatch per modalità:
+        {modalità: {riga del GestureEngine: [handler, ...]}}. Da ricalcolare ad
+        ogni cambio di configurazione (dopo setup_landmark_subset); ad ogni frame
+        si scorrono solo i gesti scattati, non tutte le mappature.
+        """
+        plan = {'pointer': {}, 'scroll': {}}
+        for mapping in self.event_action_mappings:
+            if mapping.handler is None:
+                continue
+            for mode in mapping.modes:
+                plan[mode].setdefault(mapping.event.engine_slot, []).append(mapping.handler)
+        self.dispatch_plan = plan
+
+    def setup_landmark_subset(self):
+        """
+        Calcola una sola volta l'unione degli indici richiesti dagli eventi attivi,
+        configura il LandmarkAdapter e collega ogni evento alle righe dell'array compatto.
+        """
+        active_events = [mapping.event for mapping in self.event_action_mappings]
+        if self.scroll_direction_source == 'mouth up/down':
+            active_events.append(self.open_mouth_event)
+        if self.show_window:
+            # L'interfaccia disegna occhi e bocca anche se non sono mappati
+            active_events += [self.left_eye_event, self.right_eye_event, self.open_mouth_event]
+
+        indices = {self.NOSE_TIP}
+        for event in active_events:
+            indices.update(event.get_landmark_indices())
+
+        self.landmark_adapter.set_indices(indices)
+        slot_map = self.landmark_adapter.slot_map
+        gesture_events = []
+        for event in active_events:
+            if event in gesture_events or event is self.nose_joystick:
+                continue
+            event.bind_landmarks(slot_map)
+            if isinstance(event, Gesture_event):
+                gesture_events.append(event)
+        self.nose_slot = slot_map[self.NOSE_TIP]
+
+        # Tutti i gesti a soglia vengono valutati insieme dal GestureEngine
+        self.gesture_engine.setup(gesture_events)
 
 
+    def switch_mode(self):
+        """Handler del gesto di cambio modalità pointer/scroll"""
+        old_mode = self.current_mode
+        new_mode = self.switch_mode_action.execute(self.current_mode)
+        if new_mode == old_mode:
+            return
+        self.current_mode = new_mode
+        if self.current_mode == 'scroll':
+            print("Passaggio a modalità SCROLL")
+            self.mouse_cursor.stop()
+            self.last_mouse_pos_before_scroll = self.mouse_cursor.get_current_position()
+            # Invia comando al BT per indicare cambio modalità se necessario per l'embedded
+            self.bt_transmitter.send_mode_switch(MODE_SCROLL)
+        elif self.current_mode == 'pointer':
+            print("Passaggio a modalità POINTER")
+            if self.last_mouse_pos_before_scroll is not None:
+                self.mouse_cursor.set_position(self.last_mouse_pos_before_scroll)
+            # Reset mouth neutral position for consistent scrolling
+            self.open_mouth_event.neutral_mouth_y = None
+            self.bt_transmitter.send_mode_switch(MODE_POINTER)
+
+    def detect_face(self, frame):
+        """
+        Esegue FaceMesh sul frame BGR della webcam, non specchiato (o solo sulla regione del viso).
+        Restituisce (face_landmarks o None, regione (x0, y0, w, h) a cui sono relativi).
+        """
+        results = self.roi_tracker.process(self.face_mesh, frame)
+        face_landmarks = results.multi_face_landmarks[0] if results.multi_face_landmarks else None
+        return face_landmarks, self.roi_tracker.region
+
     def toggle_pause(self):
         """Attiva/disattiva la pausa."""
         self.paused = not self.paused
+        if self.paused:
+            self.mouse_cursor.stop()
         print(f"Applicazione {'in pausa' if self.paused else 'ripresa'}")
 
     def reset_mouse_position(self):
@@ -889,6 +987,7 @@ class HeadMouseController:
         current_virtual_mouse_pos = self.mouse_cursor.get_current_position()
         if self.nose_joystick.should_recalibrate(current_virtual_mouse_pos, self.screen_w, self.screen_h):
             print("Auto-ricalibrazione attivata - cursore virtuale sul bordo per 5 secondi")
+            self.mouse_cursor.stop()
             self.calibration.set_new_center(tracking_point)
             self.nose_joystick.reset_outside_timer()
             self.reset_mouse_position() # Resetta la posizione virtuale
@@ -921,44 +1020,16 @@ class HeadMouseController:
         """Processa tutti gli eventi registrati."""
         if self.paused or not self.calibration.center_calculated:
             return
-        current_virtual_mouse_pos = self.mouse_cursor.get_current_position()
 
-        # Iterate through all configured event-action mappings
-        for mapping in self.event_action_mappings:
-            event_instance = mapping['event']
-            action_instance = mapping['action']
-            
-            # Special handling for nose joystick, as it's continuous movement
-            if isinstance(event_instance, NoseJoystick_event):
-                continue # Handled in process_nose_movement
+        # Un solo passo vettoriale per tutti i gesti (occhi, bocca)
+        fired = self.gesture_engine.step(landmarks)
 
-            event_args = mapping['event_args_mapper'](tracking_point, landmarks, current_virtual_mouse_pos)
-            
-            # Check for event activation
-            if event_instance.check_event(*event_args):
-                if isinstance(action_instance, SwitchMode_action):
-                    old_mode = self.current_mode
-                    new_mode = action_instance.execute(self.current_mode)
-                    if new_mode != old_mode:
-                        self.current_mode = new_mode
-                        if self.current_mode == 'scroll':
-                            print("Passaggio a modalità SCROLL")
-                            self.last_mouse_pos_before_scroll = current_virtual_mouse_pos.copy()
-                            # Invia comando al BT per indicare cambio modalità se necessario per l'embedded
-                            self.bt_transmitter.send_data(bytearray([0x05, 0x01, 0x00, 0x00, 0x00, 0x00])) # 0x05 = Mode Switch, 0x01 = Scroll
-                        elif self.current_mode == 'pointer':
-                            print("Passaggio a modalità POINTER")
-                            if self.last_mouse_pos_before_scroll is not None:
-                                self.mouse_cursor.set_position(self.last_mouse_pos_before_scroll)
-                            # Reset mouth neutral position for consistent scrolling
-                            if isinstance(self.open_mouth_event, OpenMouth_event):
-                                self.open_mouth_event.neutral_mouth_y = None
-                            self.bt_transmitter.send_data(bytearray([0x05, 0x00, 0x00, 0x00, 0x00, 0x00])) # 0x05 = Mode Switch, 0x00 = Pointer
-                elif self.current_mode == 'pointer':
-                    # Only execute click actions in pointer mode
-                    if isinstance(action_instance, (LeftClick_action, RightClick_action)):
-                        # action_args_mapper for clicks now returns empty tuple, as mouse position is not needed
-                        action_instance.execute()
+        # Solo i gesti scattati in questo frame, con gli handler della modalità di inizio frame
+        if fired.any():
+            handlers_by_slot = self.dispatch_plan[self.current_mode]
+            for slot in np.flatnonzero(fired):
+                for handler in handlers_by_slot.get(slot, ()):
+                    handler()
         
         # Handle scrolling based on the selected source
         if self.current_mode == 'scroll':
@@ -990,7 +1061,19 @@ class HeadMouseController:
             
             if scroll_direction_vector is not None and effective_distance_for_scroll > 0:
                 self.scroll_action.execute(scroll_direction_vector, effective_distance_for_scroll)
+            else:
+                self.scroll_action.scroll_filter.reset() # Scroll fermo: niente residui del filtro
+
 
+    def draw_timings(self, frame):
+        """Mostra p50/p95/p99 di ogni fase (riepilogo aggiornato una volta al secondo)"""
+        summary = self.profiler.get_cached_summary()
+        x = frame.shape[1] - 260
+        cv2.putText(frame, f"FPS: {summary['fps']:.1f}  (ms p50/p95/p99)", (x, 55),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 0), 1)
+        for i, (stage, stats) in enumerate(summary['stages'].items()):
+            cv2.putText(frame, f"{stage}: {stats['p50_ms']:.1f}/{stats['p95_ms']:.1f}/{stats['p99_ms']:.1f}",
+                        (x, 75 + i * 18), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
 
     def draw_interface(self, frame, tracking_point, landmarks=None):
         """Disegna interfaccia utente."""
@@ -1077,6 +1160,9 @@ class HeadMouseController:
                 cv2.putText(frame, f"Scroll Source: {self.scroll_direction_source.capitalize()}", 
                            (20, 150), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
 
+        if self.profiler is not None:
+            self.draw_timings(frame)
+
         # Controlli
         controls = [
             "=== CONTROLLI ===",
@@ -1085,7 +1171,7 @@ class HeadMouseController:
             "R = Reset calibrazione",
             "ESC = Esci",
             "Auto-ricalibrazioni dopo 5s sul bordo",
-            f"Stato BT: {'Connesso' if self.bt_transmitter.connected else 'Disconnesso'}"
+            f"Stato BT: {'Connesso' if self.bt_transmitter.connected else 'Disconnesso'} | Coda: {self.bt_transmitter.send_queue.depth()}"
         ]
         
         y_start = h - len(controls) * 20 - 10
@@ -1122,18 +1208,29 @@ def main():
     # Attempt to disable system mouse acceleration on Linux at startup
     disable_system_mouse_acceleration()
 
+    # Trasporto: Bluetooth reale oppure socket locale per test di carico (vedi headmouse_receiver.py)
+    transport_options = {
+        "Bluetooth (RFCOMM)": TRANSPORT_RFCOMM,
+        "TCP locale (test)": TRANSPORT_TCP,
+        "Socket UNIX (test)": TRANSPORT_UNIX,
+    }
+    transport_kind = transport_options[get_user_choice("Scegli il trasporto:", list(transport_options))]
+
     # Bluetooth Configuration
     bt_mode = get_user_choice("Configurazione Bluetooth: Server (attendi connessione) o Client (connettiti a un dispositivo)?", ["Server", "Client"])
     bt_address = None
-    if bt_mode == "Client":
+    if transport_kind == TRANSPORT_RFCOMM and bt_mode == "Client":
         bt_address = input("Inserisci l'indirizzo MAC Bluetooth del dispositivo (es. 00:11:22:33:44:55): ").strip()
         if not bt_address:
             print("Indirizzo MAC non fornito. Verrà tentato un client senza indirizzo specifico (potrebbe non funzionare).")
     
+    # Profilazione per fase: se disattivata il profiler non esiste e il loop non misura nulla
+    profiler = StageProfiler() if input("Abilitare la profilazione delle fasi? (s/n): ").lower().strip() == 's' else None
+
     # Initialize Bluetooth Transmitter
     bt_transmitter = BluetoothTransmitter(
-        target_address=bt_address if bt_mode == "Client" else None,
-        is_server=(bt_mode == "Server")
+        transport=create_transport(transport_kind, is_server=(bt_mode == "Server"), address=bt_address),
+        profiler=profiler
     )
     
     # Give some time for Bluetooth connection to establish
@@ -1159,6 +1256,13 @@ def main():
     user_config['right_click'] = get_user_choice("Scegli la gesto per il Click DESTRO:", gesture_options)
     user_config['mode_switch'] = get_user_choice("Scegli la gesto per il CAMBIO MODALITA' (Puntatore/Scroll):", gesture_options)
 
+    user_config['movement_filter'] = get_user_choice("Scegli il filtro di smoothing del movimento:", list(FILTER_KINDS))
+    user_config['scroll_filter'] = user_config['movement_filter']
+    output_rate = get_user_choice("Frequenza di invio del movimento (Hz, 'frame' = un pacchetto per frame):",
+                                  ["frame", "60", "120", "250"])
+    user_config['output_rate_hz'] = 0 if output_rate == "frame" else int(output_rate)
+    user_config['face_roi'] = get_user_choice("Elaborare solo la regione attorno al viso? (più FPS su CPU lente, es. Raspberry Pi)", ["si", "no"])
+
     # Determine available scroll directions
     scroll_direction_options_all = ["nose up/down", "mouth up/down", "eyes up/down (average)"]
     scroll_direction_options_filtered = [opt for opt in scroll_direction_options_all if 
@@ -1176,7 +1280,8 @@ def main():
     print("\n--- ATTENZIONE: La modalità di scroll 'bocca su/giù' o 'occhi su/giù' richiede una calibrazione manuale/visiva per una corretta interpreatazione del movimento verticale. ---")
     user_config['scroll_direction'] = get_user_choice("Scegli la direzione di SCROLL (se la gesto scelta per il cambio modalità è 'bocca aperta' o 'occhi', le opzioni relative potrebbero essere limitate):", scroll_direction_options_filtered)
 
-    controller = HeadMouseController(show_window=show_window, user_config=user_config, bt_transmitter=bt_transmitter)
+    controller = HeadMouseController(show_window=show_window, user_config=user_config,
+                                     bt_transmitter=bt_transmitter, profiler=profiler)
     
     # Setup webcam
     cap = cv2.VideoCapture(0)
@@ -1187,6 +1292,9 @@ def main():
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
     cap.set(cv2.CAP_PROP_FPS, 30)
+
+    # Acquisizione su un thread dedicato: il loop elabora sempre il frame più recente
+    capture = FrameCapture(cap, profiler=profiler).start()
     
     print("\n🎮 CONTROLLI:")
     print("SPAZIO = Pausa/Riprendi | +/- = Sensibilità (puntatore/scroll)")
@@ -1199,25 +1307,50 @@ def main():
     
     try:
         while True:
-            ret, frame = cap.read()
+            if profiler is not None:
+                start = profiler.start()
+            ret, frame = capture.read()
             if not ret:
                 print("Impossibile leggere il frame.")
                 continue
-
-            frame = cv2.flip(frame, 1)
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = controller.face_mesh.process(rgb_frame)
-
-            if results.multi_face_landmarks:
-                face_landmarks = results.multi_face_landmarks[0]
-                h, w = frame.shape[:2]
-                landmarks_np = np.array([[lm.x * w, lm.y * h] for lm in face_landmarks.landmark], dtype=np.float64)
-
-                tracking_point = landmarks_np[controller.NOSE_TIP]
+            if profiler is not None:
+                profiler.record('wait', start) # Attesa del frame: la lettura è misurata dal thread di acquisizione
+                start = profiler.start()
+
+            # Conversione RGB in buffer riutilizzato e FaceMesh (solo sulla regione del viso se attiva)
+            face_landmarks, (x0, y0, region_w, region_h) = controller.detect_face(frame)
+            if profiler is not None:
+                profiler.record('facemesh', start)
+                start = profiler.start()
+            frame_w = frame.shape[1]
+            if controller.show_window:
+                # L'immagine si specchia solo per l'anteprima (i landmark sono già specchiati)
+                frame = cv2.flip(frame, 1)
+            if profiler is not None:
+                profiler.record('preprocess', start)
+
+            if face_landmarks is not None:
+                if profiler is not None:
+                    start = profiler.start()
+                landmarks_np = controller.landmark_adapter.update(face_landmarks, region_w, region_h, (x0, y0), frame_w)
+                # Gli eventi lavorano solo sull'array compatto degli indici richiesti
+                compact_landmarks = controller.landmark_adapter.get_compact()
+
+                tracking_point = compact_landmarks[controller.nose_slot]
+                if profiler is not None:
+                    profiler.record('landmarks', start)
                 
                 if not controller.paused:
-                    controller.process_nose_movement(tracking_point)
-                    controller.process_events(tracking_point, landmarks_np)
+                    if profiler is None:
+                        controller.process_nose_movement(tracking_point)
+                        controller.process_events(tracking_point, compact_landmarks)
+                    else:
+                        start = profiler.start()
+                        controller.process_nose_movement(tracking_point)
+                        profiler.record('actions', start)
+                        start = profiler.start()
+                        controller.process_events(tracking_point, compact_landmarks)
+                        profiler.record('events', start)
 
                 if controller.show_window:
                     controller.draw_interface(frame, tracking_point, landmarks_np)
@@ -1226,7 +1359,12 @@ def main():
                     cv2.putText(frame, "VISO NON RILEVATO", (20, 50), 
                                 cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
             
+            if profiler is not None:
+                profiler.frame_done()
+
             if controller.show_window:
+                cv2.putText(frame, f"Frame scartati: {capture.dropped_frames}", (frame.shape[1] - 200, 30),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
                 key = cv2.waitKey(1) & 0xFF
                 cv2.imshow('Head Mouse Controller', frame)
                 
@@ -1247,6 +1385,8 @@ def main():
                 elif key == ord('r'):  # R
                     controller.calibration.reset_calibration()
                     controller.nose_joystick.reset_outside_timer()
+                    controller.roi_tracker.reset()
+                    controller.mouse_cursor.stop()
                     controller.reset_mouse_position()
                     if isinstance(controller.open_mouth_event, OpenMouth_event):
                         controller.open_mouth_event.neutral_mouth_y = None
@@ -1259,9 +1399,17 @@ def main():
     except KeyboardInterrupt:
         print("\nInterruzione da tastiera")
     finally:
+        capture.stop()
+        stats = capture.get_stats()
+        print(f"Acquisizione fermata: {stats['captured_frames']} frame acquisiti, {stats['dropped_frames']} scartati")
         cap.release()
         cv2.destroyAllWindows()
+        if controller.motion_scheduler is not None:
+            controller.motion_scheduler.close()
+            print(f"Invio movimento: {controller.motion_scheduler.get_stats()}")
         bt_transmitter.close() # Ensure Bluetooth connection is closed
+        if profiler is not None:
+            print(format_summary(profiler.get_summary()))
         print("Controller chiuso")
 
 
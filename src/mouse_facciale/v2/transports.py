@@ -0,0 +1,282 @@
+"""
+Trasporti intercambiabili per BluetoothTransmitter.
+
+Il trasmettitore non parla più direttamente con pybluez: usa un oggetto
+trasporto con quattro metodi
+    connect()     blocca finché il collegamento non è stabilito
+                  (server: accept, client: connect)
+    send(data)    invia tutti i byte, solleva un'eccezione se il link è caduto
+    recv(size)    (solo socket) riceve byte, b'' se il link è stato chiuso
+    disconnect()  chiude il collegamento corrente (il server resta in ascolto)
+    close()       chiude tutto
+così lo stesso controller può girare su RFCOMM oppure, per test di carico e
+benchmark su qualsiasi macchina Linux, su TCP, socket UNIX o in memoria.
+"""
+import os
+import socket
+import threading
+from collections import deque
+
+# UUID del servizio SPP pubblicizzato dal server RFCOMM
+HEADMOUSE_SERVICE_UUID = "94f39d29-7d6d-437d-973b-fba39e49d4ee"
+
+TRANSPORT_RFCOMM = 'rfcomm'
+TRANSPORT_TCP = 'tcp'
+TRANSPORT_UNIX = 'unix'
+TRANSPORT_MEMORY = 'memory'
+
+DEFAULT_TCP_PORT = 5555
+DEFAULT_UNIX_PATH = '/tmp/headmouse.sock'
+
+
+class BaseTransport:
+    """Interfaccia comune a tutti i trasporti"""
+    name = 'base'
+
+    def __init__(self, is_server=True):
+        self.is_server = is_server
+
+    def describe(self):
+        return self.name
+
+    def connect(self):
+        raise NotImplementedError
+
+    def send(self, data):
+        raise NotImplementedError
+
+    def disconnect(self):
+        pass
+
+    def close(self):
+        self.disconnect()
+
+
+class SocketTransport(BaseTransport):
+    """
+    Base per i trasporti a socket stream. Le sottoclassi creano solo le socket
+    (_create_listener / _create_connection), il ciclo accept/connect/chiusura
+    è condiviso.
+    """
+    def __init__(self, is_server=True):
+        super().__init__(is_server)
+        self.sock = None         # Socket in ascolto (server)
+        self.client_sock = None  # Socket del collegamento corrente
+
+    def _create_listener(self):
+        raise NotImplementedError
+
+    def _create_connection(self):
+        raise NotImplementedError
+
+    def connect(self):
+        if not self.is_server:
+            self.client_sock = self._create_connection()
+            print(f"Connesso a {self.describe()}")
+            return
+        if self.sock is None:
+            self.sock = self._create_listener()
+        print(f"In attesa di connessioni su {self.describe()}...")
+        self.client_sock, client_info = self.sock.accept()
+        print(f"Accettata connessione da {client_info or self.describe()}")
+
+    def send(self, data):
+        client_sock = self.client_sock
+        if client_sock is None:
+            raise ConnectionError("Nessun collegamento attivo")
+        client_sock.sendall(data)
+
+    def recv(self, size=4096):
+        """Usato dal lato ricevitore (headmouse_receiver.py)"""
+        client_sock = self.client_sock
+        if client_sock is None:
+            raise ConnectionError("Nessun collegamento attivo")
+        return client_sock.recv(size)
+
+    def disconnect(self):
+        client_sock, self.client_sock = self.client_sock, None
+        if client_sock is not None:
+            try:
+                client_sock.close()
+            except Exception as e:
+                print(f"Errore chiusura client_sock: {e}")
+
+    def close(self):
+        self.disconnect()
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            try:
+                sock.close() # Sblocca anche un eventuale accept() in corso
+            except Exception as e:
+                print(f"Errore chiusura sock: {e}")
+
+
+class RfcommTransport(SocketTransport):
+    """Bluetooth RFCOMM tramite pybluez (importato solo quando serve)"""
+    name = TRANSPORT_RFCOMM
+
+    def __init__(self, target_address=None, port=1, is_server=True, uuid=HEADMOUSE_SERVICE_UUID):
+        super().__init__(is_server)
+        # Importare pybluez - Assicurati di averlo installato: pip install pybluez
+        # Potrebbe richiedere: sudo apt-get install python3-dev libbluetooth-dev (su Debian/Ubuntu)
+        import bluetooth
+        self.bluetooth = bluetooth
+        self.target_address = target_address
+        self.port = port
+        self.uuid = uuid
+
+    def describe(self):
+        if self.is_server:
+            return f"RFCOMM porta {self.port} (HeadMouseService)"
+        return f"RFCOMM {self.target_address}:{self.port}"
+
+    def _create_listener(self):
+        bluetooth = self.bluetooth
+        sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+        try:
+            sock.bind(("", self.port))
+            sock.listen(1) # Ascolta una singola connessione
+            bluetooth.advertise_service(
+                sock, "HeadMouseService",
+                service_id = self.uuid,
+                service_classes = [ self.uuid, bluetooth.SERIAL_PORT_CLASS ],
+                profiles = [ bluetooth.SERIAL_PORT_PROFILE ],
+                # Do not set protocols to avoid issues with some clients
+            )
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _create_connection(self):
+        sock = self.bluetooth.BluetoothSocket(self.bluetooth.RFCOMM)
+        try:
+            sock.connect((self.target_address, self.port))
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+
+class TcpTransport(SocketTransport):
+    """TCP (anche in loopback) con Nagle disattivato: ogni pacchetto parte subito"""
+    name = TRANSPORT_TCP
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_TCP_PORT, is_server=True):
+        super().__init__(is_server)
+        self.host = host
+        self.port = port
+
+    def describe(self):
+        return f"TCP {self.host}:{self.port}"
+
+    def _create_listener(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((self.host, self.port))
+            sock.listen(1)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _create_connection(self):
+        return socket.create_connection((self.host, self.port))
+
+    def connect(self):
+        super().connect()
+        self.client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class UnixSocketTransport(SocketTransport):
+    """Socket UNIX stream: il trasporto locale con meno overhead del kernel"""
+    name = TRANSPORT_UNIX
+
+    def __init__(self, path=DEFAULT_UNIX_PATH, is_server=True):
+        super().__init__(is_server)
+        self.path = path
+
+    def describe(self):
+        return f"UNIX {self.path}"
+
+    def _create_listener(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path) # Socket rimasta da un'esecuzione precedente
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.path)
+            sock.listen(1)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _create_connection(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def close(self):
+        had_listener = self.sock is not None
+        super().close()
+        if had_listener and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class MemoryTransport(BaseTransport):
+    """
+    Trasporto in memoria per benchmark senza I/O: i byte inviati vengono
+    passati a on_data (ad esempio PacketDecoder.feed) oppure accumulati in
+    self.chunks. fail_after simula la caduta del link dopo N invii.
+    """
+    name = TRANSPORT_MEMORY
+
+    def __init__(self, on_data=None, max_chunks=10000, fail_after=None):
+        super().__init__(is_server=True)
+        self.on_data = on_data
+        self.chunks = deque(maxlen=max_chunks)
+        self.fail_after = fail_after
+        self.connected = threading.Event()
+        self.sent_chunks = 0
+        self.sent_bytes = 0
+
+    def connect(self):
+        self.connected.set()
+
+    def send(self, data):
+        if not self.connected.is_set():
+            raise ConnectionError("Trasporto in memoria non connesso")
+        if self.fail_after is not None and self.sent_chunks >= self.fail_after:
+            self.fail_after = None # Una sola caduta simulata
+            self.connected.clear()
+            raise ConnectionError("Caduta del collegamento simulata")
+        self.sent_chunks += 1
+        self.sent_bytes += len(data)
+        if self.on_data is not None:
+            self.on_data(data)
+        else:
+            self.chunks.append(bytes(data))
+
+    def disconnect(self):
+        self.connected.clear()
+
+
+def create_transport(kind, is_server=True, address=None, port=None):
+    """
+    Crea un trasporto per nome (rfcomm, tcp, unix, memory). address è il MAC
+    (rfcomm), l'host (tcp) o il percorso della socket (unix).
+    """
+    if kind == TRANSPORT_RFCOMM:
+        return RfcommTransport(target_address=address, port=port or 1, is_server=is_server)
+    if kind == TRANSPORT_TCP:
+        return TcpTransport(host=address or '127.0.0.1', port=port or DEFAULT_TCP_PORT, is_server=is_server)
+    if kind == TRANSPORT_UNIX:
+        return UnixSocketTransport(path=address or DEFAULT_UNIX_PATH, is_server=is_server)
+    if kind == TRANSPORT_MEMORY:
+        return MemoryTransport()
+    raise ValueError(f"Unknown transport: {kind}")